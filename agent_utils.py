@@ -0,0 +1,544 @@
+# agent_utils.py
+import hmac
+import json
+import os
+import queue
+import secrets
+import socket
+import socketserver
+import stat
+import sys
+import threading
+import time
+import uuid
+
+import path_utils
+
+DEFAULT_ADDRESS = "127.0.0.1:8765"
+TOKEN_ENV = "SYSOPT_AGENT_TOKEN"
+TOKEN_FILE = "agent_token"
+MAX_WORKERS = 2
+MAX_QUEUED = 32
+MAX_REQUEST_BYTES = 1024 * 1024
+# Cleaners report progress per file; a job forwards counter updates at most this often per task.
+PROGRESS_INTERVAL_S = 0.25
+# Running jobs report at least this often, so a controller can tell a quiet job from a hung agent.
+HEARTBEAT_S = 15
+# Controllers give up on an agent that has sent nothing for this long.
+IDLE_TIMEOUT_S = 4 * HEARTBEAT_S
+# Events that end a request; everything before them is progress.
+TERMINAL_EVENTS = {"result", "error", "rejected", "reply"}
+
+
+def parse_address(address):
+    """"unix:/path/to/agent.sock" or "host:port" -> (socket family, address)."""
+    if address.startswith("unix:"):
+        if not hasattr(socket, "AF_UNIX"):
+            raise ValueError("Unix sockets are not available on this platform; use host:port")
+        return socket.AF_UNIX, address[len("unix:"):]
+    host, _, port = address.rpartition(":")
+    if not host or not port.isdigit():
+        raise ValueError(f"Invalid agent address '{address}': use host:port or unix:/path")
+    return socket.AF_INET, (host, int(port))
+
+
+def load_token(create=False):
+    """The shared secret every request must carry: SYSOPT_AGENT_TOKEN, else the agent_token file in
+    the data folder. With create, a random token is written there (readable only by its owner) on first use."""
+    token = os.getenv(TOKEN_ENV)
+    if token:
+        return token
+    path = path_utils.data_file(TOKEN_FILE)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            token = f.read().strip()
+    except FileNotFoundError:
+        token = None
+    if token or not create:
+        return token or None
+    token = secrets.token_hex(32)
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.write(token)
+    return token
+
+
+def encode(message):
+    return (json.dumps(message, separators=(",", ":"), default=str) + "\n").encode("utf-8")
+
+
+def job_key(keys, policy, dry_run):
+    """Identical requests share one job: same tasks in any order, same policy, same mode."""
+    return json.dumps([sorted(keys), policy, bool(dry_run)], sort_keys=True)
+
+
+class Job:
+    """One batch of optimizations and every connection waiting for its outcome."""
+
+    def __init__(self, keys, policy=None, dry_run=False):
+        self.id = uuid.uuid4().hex
+        self.keys = list(keys)
+        self.policy = policy
+        self.dry_run = bool(dry_run)
+        self.key = job_key(self.keys, policy, dry_run)
+        self.state = "queued"
+        self.cancel_event = threading.Event()
+        self._subscribers = []
+        self._lock = threading.Lock()
+
+    def subscribe(self, send, request_id, duplicate=False):
+        with self._lock:
+            send({"id": request_id, "event": "accepted", "job": self.id, "duplicate": duplicate, "state": self.state})
+            self._subscribers.append((send, request_id))
+
+    def emit(self, event, **fields):
+        """Sends an event to every subscriber; subscribers whose connection closed are dropped."""
+        with self._lock:
+            self._subscribers = [(send, request_id) for send, request_id in self._subscribers
+                                 if send({"id": request_id, "event": event, "job": self.id, **fields})]
+
+
+class _JobProgress:
+    """progress_callback for a job run: forwards messages, and counters at most every PROGRESS_INTERVAL_S per task."""
+
+    def __init__(self, job):
+        self.job = job
+        self._last = {}
+
+    def __call__(self, message):
+        import progress_utils
+        self.publish(progress_utils.current_task(), message)
+
+    def publish(self, task, message=None, items_done=None, items_total=None, bytes_done=None):
+        now = time.monotonic()
+        if message is None and now - self._last.get(task, 0.0) < PROGRESS_INTERVAL_S:
+            return
+        self._last[task] = now
+        self.job.emit("progress", task=task, message=message, items_done=items_done, items_total=items_total, bytes_done=bytes_done)
+
+
+def run_job(job):
+    """Runs a job through system_utils on the calling worker thread; returns the fields of its result event."""
+    import policy_utils
+    import system_utils
+
+    policy = policy_utils.Policy.from_dict(job.policy) if job.policy is not None else None
+    progress = _JobProgress(job)
+    selected = {system_utils.OPTIMIZATIONS[key][0]: system_utils.OPTIMIZATIONS[key][1] for key in job.keys}
+    if job.cancel_event.is_set():
+        return {"cancelled": True, "results": {}}
+
+    if job.dry_run:
+        results = {}
+        with policy_utils.policy_scope(policy):
+            for label, func in selected.items():
+                if job.cancel_event.is_set():
+                    break
+                scanner = system_utils.SCANNERS.get(func)
+                if scanner is None:
+                    results[label] = None
+                    continue
+                try:
+                    results[label] = scanner(on_progress=lambda items, num_bytes, label=label: progress.publish(label, None, items, None, num_bytes))
+                except Exception as e:
+                    results[label] = {"error": str(e)}
+        return {"cancelled": job.cancel_event.is_set(), "results": results}
+
+    outcome = {}
+
+    def on_complete(before, after, results):
+        # Rendered now: some results (the locked-file report) change as time passes.
+        outcome.update(before=before, after=after, results={name: None if result is None else str(result) for name, result in results.items()})
+
+    thread = system_utils.run_optimizations(selected, progress, on_complete, cancel_event=job.cancel_event, policy=policy)
+    thread.join()
+    if not outcome:
+        raise RuntimeError("the run failed before completing; see the agent's log")
+    return {"cancelled": job.cancel_event.is_set(), **outcome}
+
+
+class Agent:
+    """Accepts jobs from any number of connections and runs them on max_workers threads.
+
+    A request identical to a queued or running job joins that job instead of starting another.
+    At most max_queued jobs wait; beyond that requests are rejected so a controller can retry
+    elsewhere. Two jobs sharing a task never run at once (dry runs only read, so they may).
+    Every request must carry token; anything else closes the connection.
+    """
+
+    def __init__(self, tasks, token, runner=run_job, max_workers=MAX_WORKERS, max_queued=MAX_QUEUED):
+        if not token:
+            raise ValueError("the agent needs a token")
+        self.tasks = tasks
+        self.runner = runner
+        self.max_queued = max_queued
+        self.token = token
+        self.stats = {"accepted": 0, "deduplicated": 0, "rejected": 0, "completed": 0, "failed": 0}
+        self._condition = threading.Condition()
+        self._queued = []
+        self._jobs = {}
+        self._by_key = {}
+        self._busy_tasks = set()
+        self._closed = False
+        self._workers = [threading.Thread(target=self._work, name=f"AgentWorker-{i}", daemon=True) for i in range(max_workers)]
+        for worker in self._workers:
+            worker.start()
+        threading.Thread(target=self._heartbeat, name="AgentHeartbeat", daemon=True).start()
+
+    def submit(self, keys, send, request_id, policy=None, dry_run=False):
+        key = job_key(keys, policy, dry_run)
+        with self._condition:
+            job = self._by_key.get(key)
+            if job is not None:
+                self.stats["deduplicated"] += 1
+                job.subscribe(send, request_id, duplicate=True)
+                return job
+            if self._closed or len(self._queued) >= self.max_queued:
+                self.stats["rejected"] += 1
+                send({"id": request_id, "event": "rejected", "error": "the agent is busy"})
+                return None
+            job = Job(keys, policy, dry_run)
+            self.stats["accepted"] += 1
+            job.subscribe(send, request_id)
+            self._queued.append(job)
+            self._jobs[job.id] = job
+            self._by_key[key] = job
+            self._condition.notify()
+        return job
+
+    def cancel(self, job_id):
+        with self._condition:
+            job = self._jobs.get(job_id)
+        if job is None:
+            return False
+        job.cancel_event.set()
+        return True
+
+    def status(self):
+        with self._condition:
+            return {"jobs": [{"job": job.id, "tasks": job.keys, "dry_run": job.dry_run, "state": job.state} for job in self._jobs.values()],
+                    "stats": dict(self.stats)}
+
+    def close(self):
+        """Stops taking jobs and cancels the ones queued or running."""
+        with self._condition:
+            self._closed = True
+            jobs = list(self._jobs.values())
+            self._condition.notify_all()
+        for job in jobs:
+            job.cancel_event.set()
+
+    def _next_job(self):
+        for index, job in enumerate(self._queued):
+            if job.dry_run or job.cancel_event.is_set() or not self._busy_tasks.intersection(job.keys):
+                return self._queued.pop(index)
+        return None
+
+    def _heartbeat(self):
+        while not self._closed:
+            time.sleep(HEARTBEAT_S)
+            with self._condition:
+                running = [job for job in self._jobs.values() if job.state == "running"]
+            for job in running:
+                job.emit("heartbeat")
+
+    def _work(self):
+        while True:
+            with self._condition:
+                job = self._next_job()
+                while job is None:
+                    if self._closed and not self._queued:
+                        return
+                    self._condition.wait(1)
+                    job = self._next_job()
+                job.state = "running"
+                if not job.dry_run:
+                    self._busy_tasks.update(job.keys)
+            job.emit("started")
+            try:
+                outcome, error = self.runner(job), None
+            except Exception as e:
+                outcome, error = None, str(e)
+            with self._condition:
+                # Unlisted before the result goes out: a request arriving after it starts a new job.
+                self._jobs.pop(job.id, None)
+                self._by_key.pop(job.key, None)
+                if not job.dry_run:
+                    self._busy_tasks.difference_update(job.keys)
+                self.stats["completed" if error is None else "failed"] += 1
+                job.state = "done"
+                self._condition.notify_all()
+            if error is None:
+                job.emit("result", **outcome)
+            else:
+                job.emit("error", error=error)
+
+    def handle(self, line, send):
+        """Answers one request line; replies and job events go to send(message).
+
+        Returns False when the connection must be closed: the line is not a JSON request (an HTTP
+        request from a web page, say) or lacks the token.
+        """
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError("a request must be a JSON object")
+        except ValueError as e:
+            send({"id": None, "event": "error", "error": f"Invalid request: {e}"})
+            return False
+        request_id = request.get("id")
+        if not hmac.compare_digest(str(request.get("token", "")).encode("utf-8"), self.token.encode("utf-8")):
+            send({"id": request_id, "event": "error", "error": "Invalid or missing token."})
+            return False
+
+        op = request.get("op", "run")
+        if op == "ping":
+            send({"id": request_id, "event": "reply", "host": socket.gethostname(), **self.status()})
+        elif op == "list":
+            send({"id": request_id, "event": "reply", "tasks": self.tasks})
+        elif op == "status":
+            send({"id": request_id, "event": "reply", **self.status()})
+        elif op == "cancel":
+            send({"id": request_id, "event": "reply", "cancelled": self.cancel(request.get("job"))})
+        elif op == "run":
+            import cli_utils
+            tasks = request.get("tasks")
+            policy = request.get("policy")
+            try:
+                keys = cli_utils.parse_task_keys(tasks if isinstance(tasks, str) else ",".join(tasks or ()), self.tasks)
+                if not keys:
+                    raise ValueError("No tasks given.")
+                if policy is not None and not isinstance(policy, dict):
+                    raise ValueError("The policy must be a JSON object.")
+            except (TypeError, ValueError) as e:
+                send({"id": request_id, "event": "error", "error": str(e)})
+                return True
+            self.submit(keys, send, request_id, policy=policy, dry_run=request.get("dry_run", False))
+        else:
+            send({"id": request_id, "event": "error", "error": f"Unknown op '{op}'."})
+        return True
+
+
+class _Connection:
+    """Outgoing side of a client connection: send() only queues, so job threads never block on a slow client."""
+
+    def __init__(self, wfile):
+        self.wfile = wfile
+        self.open = True
+        self._queue = queue.Queue()
+        self._writer = threading.Thread(target=self._write, name="AgentWriter", daemon=True)
+        self._writer.start()
+
+    def send(self, message):
+        if not self.open:
+            return False
+        self._queue.put(message)
+        return True
+
+    def _write(self):
+        while True:
+            message = self._queue.get()
+            if message is None:
+                return
+            try:
+                self.wfile.write(encode(message))
+            except OSError:
+                self.open = False
+                return
+
+    def close(self):
+        self.open = False
+        self._queue.put(None)
+        self._writer.join(5)
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    """Reads newline-delimited JSON requests until the client disconnects; jobs outlive the connection."""
+
+    def handle(self):
+        connection = _Connection(self.wfile)
+        try:
+            while True:
+                line = self.rfile.readline(MAX_REQUEST_BYTES + 1)
+                if not line:
+                    break
+                if len(line) > MAX_REQUEST_BYTES:
+                    connection.send({"id": None, "event": "error", "error": "Request too large."})
+                    break
+                if line.strip() and not self.server.agent.handle(line, connection.send):
+                    break
+        except OSError:
+            pass
+        finally:
+            connection.close()
+
+
+class _TCPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def server_bind(self):
+        self.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        super().server_bind()
+
+
+if hasattr(socketserver, "ThreadingUnixStreamServer"):
+    class _UnixServer(socketserver.ThreadingUnixStreamServer):
+        daemon_threads = True
+
+
+def make_server(address, agent):
+    family, bind_address = parse_address(address)
+    if family == socket.AF_INET:
+        server = _TCPServer(bind_address, _RequestHandler)
+    else:
+        try:
+            if stat.S_ISSOCK(os.stat(bind_address).st_mode):
+                # Left behind by an agent that did not shut down cleanly.
+                os.unlink(bind_address)
+        except FileNotFoundError:
+            pass
+        server = _UnixServer(bind_address, _RequestHandler)
+        os.chmod(bind_address, 0o600)
+    server.agent = agent
+    return server
+
+
+def format_address(server):
+    if isinstance(server.server_address, tuple):
+        return "%s:%d" % server.server_address[:2]
+    return f"unix:{server.server_address}"
+
+
+class AgentClient:
+    """One persistent connection to an agent, shared by any number of concurrent requests.
+
+    Replies are matched to requests by id. The connection is opened on first use and reopened
+    by the next request after it drops; requests in flight when it drops fail with an error event.
+    """
+
+    def __init__(self, address, token, connect_timeout=10):
+        self.address = address
+        self.token = token
+        self.connect_timeout = connect_timeout
+        self.connects = 0
+        self._sock = None
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        family, address = parse_address(self.address)
+        sock = socket.socket(family, socket.SOCK_STREAM)
+        try:
+            sock.settimeout(self.connect_timeout)
+            sock.connect(address)
+            sock.settimeout(None)
+            if family == socket.AF_INET:
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        except OSError:
+            sock.close()
+            raise
+        self.connects += 1
+        threading.Thread(target=self._read, args=(sock,), name=f"AgentClient-{self.address}", daemon=True).start()
+        return sock
+
+    def _read(self, sock):
+        try:
+            with sock.makefile("rb") as f:
+                for line in f:
+                    try:
+                        message = json.loads(line)
+                    except ValueError:
+                        continue
+                    with self._lock:
+                        pending = self._pending.get(message.get("id"))
+                    if pending is not None:
+                        pending[0].put(message)
+        except OSError:
+            pass
+        with self._lock:
+            if self._sock is sock:
+                self._sock = None
+            lost = [events for events, owner in self._pending.values() if owner is sock]
+        sock.close()
+        for events in lost:
+            events.put({"event": "error", "error": "Connection to the agent was lost."})
+
+    def request(self, message, on_event=None, timeout=IDLE_TIMEOUT_S):
+        """Sends one request and returns its final event; earlier (progress) events go to on_event.
+        Raises TimeoutError when the agent sends nothing for timeout seconds (None waits forever)."""
+        request_id = uuid.uuid4().hex
+        message = dict(message, id=request_id)
+        message["token"] = self.token
+        events = queue.Queue()
+        with self._lock:
+            if self._sock is None:
+                self._sock = self._connect()
+            self._pending[request_id] = (events, self._sock)
+            try:
+                self._sock.sendall(encode(message))
+            except OSError:
+                self._pending.pop(request_id, None)
+                self._sock.close()
+                self._sock = None
+                raise
+        try:
+            while True:
+                event = events.get(timeout=timeout)
+                if event["event"] in TERMINAL_EVENTS:
+                    return event
+                if on_event is not None:
+                    on_event(event)
+        except queue.Empty:
+            raise TimeoutError(f"Nothing heard from {self.address} for {timeout}s") from None
+        finally:
+            with self._lock:
+                self._pending.pop(request_id, None)
+
+    def close(self):
+        with self._lock:
+            sock, self._sock = self._sock, None
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            sock.close()
+
+
+def main(address=None, workers=MAX_WORKERS):
+    """Entry point for `main.py --agent`; serves jobs until interrupted."""
+    import system_utils
+
+    address = address or os.getenv("SYSOPT_AGENT_ADDRESS", DEFAULT_ADDRESS)
+    try:
+        token = load_token(create=True)
+    except OSError as e:
+        print(f"Could not create the agent token: {e}", file=sys.stderr)
+        return 1
+    system_utils.load_plugins()
+    agent = Agent({key: label for key, (label, _) in system_utils.OPTIMIZATIONS.items()}, token, max_workers=workers)
+    try:
+        server = make_server(address, agent)
+    except (OSError, ValueError) as e:
+        print(f"Could not listen on {address}: {e}", file=sys.stderr)
+        return 1
+    system_utils.resume_locked_file_retries()
+    print(f"Agent listening on {format_address(server)} with {workers} worker(s); press Ctrl+C to stop.", flush=True)
+    thread = threading.Thread(target=server.serve_forever, name="Agent", daemon=True)
+    thread.start()
+    try:
+        while thread.is_alive():
+            thread.join(0.5)
+    except KeyboardInterrupt:
+        print("Stopping...", file=sys.stderr, flush=True)
+    finally:
+        agent.close()
+        server.shutdown()
+        server.server_close()
+        if not isinstance(server.server_address, tuple):
+            try:
+                os.unlink(server.server_address)
+            except OSError:
+                pass
+    return 0
@@ -1,63 +1,269 @@
 # backup_utils.py
-import winreg
 import json
 import os
+import re
+import subprocess
+import threading
+import time
+import uuid
 
-BACKUP_FILE = os.path.join(os.getenv('APPDATA'), "SystemOptimizer_backup.json")
+import path_utils
 
-SETTINGS_TO_BACKUP = {
-    "VisualEffects": {
-        "key": winreg.HKEY_CURRENT_USER,
-        "path": r"Software\Microsoft\Windows\CurrentVersion\Explorer\VisualEffects",
-        "value_name": "VisualFxSetting"
-    }
+JOURNAL_FILE = "settings_journal.jsonl"
+LEGACY_BACKUP_FILE = "SystemOptimizer_backup.json"
+
+VISUAL_EFFECTS_KEY = r"Software\Microsoft\Windows\CurrentVersion\Explorer\VisualEffects"
+BACKGROUND_APPS_KEY = r"Software\Microsoft\Windows\CurrentVersion\BackgroundAccessApplications"
+UPDATE_SERVICE = "wuauserv"
+COMMAND_TIMEOUT = 30
+
+# Setting name -> (registry path under HKCU, value name); None means the value is absent.
+REGISTRY_SETTINGS = {
+    "visual_effects": (VISUAL_EFFECTS_KEY, "VisualFxSetting"),
+    "background_apps": (BACKGROUND_APPS_KEY, "GlobalUserDisabled"),
 }
+SETTINGS = ("visual_effects", "background_apps", "power_plan", "update_service")
+
+# psutil start types -> `sc config start=` values
+SERVICE_START_TYPES = {"automatic": "auto", "manual": "demand", "disabled": "disabled"}
+
+
+class WindowsSettingsBackend:
+    """Reads and writes the backed-up settings on the live system."""
+
+    def read(self, setting):
+        if setting in REGISTRY_SETTINGS:
+            import winreg
+            path, value_name = REGISTRY_SETTINGS[setting]
+            try:
+                with winreg.OpenKey(winreg.HKEY_CURRENT_USER, path, 0, winreg.KEY_READ) as reg_key:
+                    return winreg.QueryValueEx(reg_key, value_name)[0]
+            except FileNotFoundError:
+                return None
+        if setting == "power_plan":
+            output = self._run(['powercfg', '/getactivescheme']).stdout
+            match = re.search(r"[0-9a-fA-F]{8}-(?:[0-9a-fA-F]{4}-){3}[0-9a-fA-F]{12}", output)
+            return match.group(0) if match else None
+        if setting == "update_service":
+            import psutil
+            return psutil.win_service_get(UPDATE_SERVICE).start_type()
+        raise KeyError(setting)
+
+    def write(self, setting, value):
+        if setting in REGISTRY_SETTINGS:
+            import ctypes
+            import winreg
+            path, value_name = REGISTRY_SETTINGS[setting]
+            with winreg.CreateKey(winreg.HKEY_CURRENT_USER, path) as reg_key:
+                if value is None:
+                    try:
+                        winreg.DeleteValue(reg_key, value_name)
+                    except FileNotFoundError:
+                        pass
+                else:
+                    winreg.SetValueEx(reg_key, value_name, 0, winreg.REG_DWORD, value)
+            if setting == "visual_effects":
+                ctypes.windll.user32.SystemParametersInfoW(0x0057, 0, 0, 0x0002)
+        elif setting == "power_plan":
+            if value is not None:
+                self._run(['powercfg', '/s', value])
+        elif setting == "update_service":
+            if value in SERVICE_START_TYPES:
+                self._run(['sc', 'config', UPDATE_SERVICE, 'start=', SERVICE_START_TYPES[value]])
+        else:
+            raise KeyError(setting)
+
+    def _run(self, args):
+        import command_utils
+        return command_utils.run_command(args, check=True, timeout=COMMAND_TIMEOUT, cancellable=False,
+                                         creationflags=subprocess.CREATE_NO_WINDOW)
+
+
+class MemoryBackend:
+    """In-memory stand-in for the live system, for exercising the store off Windows."""
+
+    def __init__(self, values=None):
+        self.values = dict(values or {})
+        self.writes = []
+
+    def read(self, setting):
+        return self.values.get(setting)
+
+    def write(self, setting, value):
+        self.writes.append((setting, value))
+        if value is None:
+            self.values.pop(setting, None)
+        else:
+            self.values[setting] = value
+
+
+class SnapshotStore:
+    """Append-only JSON-lines journal of setting snapshots and changes.
+
+    Each run records a "snapshot" entry (the values before it started) as soon as it begins,
+    so a run that crashes or is killed still leaves its restore point, and one "change" entry
+    per setting it modified when it commits. Every append is a single write and fsync; a torn
+    last line from a crash is ignored when reading and never glued to the next entry.
+    """
+
+    def __init__(self, path=None, backend=None, settings=SETTINGS):
+        self.path = path or path_utils.data_file(JOURNAL_FILE)
+        self.backend = backend or WindowsSettingsBackend()
+        self.settings = settings
+        self._lock = threading.Lock()
+
+    def read_all(self):
+        settings = {}
+        for setting in self.settings:
+            try:
+                settings[setting] = self.backend.read(setting)
+            except Exception as e:
+                print(f"Could not read setting {setting}: {e}")
+        return settings
+
+    def entries(self):
+        return path_utils.read_json_lines(self.path)
+
+    def append(self, entries):
+        with self._lock:
+            path_utils.append_json_lines(self.path, entries)
+
+    def begin_run(self, run_id=None):
+        return SnapshotRun(self, run_id or uuid.uuid4().hex)
+
+    def runs(self):
+        """Returns [{"run_id", "timestamp", "values", "changes"}], oldest first."""
+        runs = {}
+        for entry in self.entries():
+            if entry.get("type") == "snapshot":
+                runs[entry["run_id"]] = {"run_id": entry["run_id"], "timestamp": entry["timestamp"],
+                                         "values": entry["values"], "changes": []}
+            elif entry.get("type") == "change" and entry.get("run_id") in runs:
+                runs[entry["run_id"]]["changes"].append(entry)
+        return list(runs.values())
 
-def backup_critical_settings():
-    backup_data = {}
-    
+    def state_at(self, timestamp):
+        """Replays the journal up to timestamp; returns the last known value of each setting."""
+        state = {}
+        for entry in self.entries():
+            if entry["timestamp"] > timestamp:
+                continue
+            if entry.get("type") == "snapshot":
+                state.update(entry["values"])
+            elif entry.get("type") == "change":
+                state[entry["setting"]] = entry["new"]
+        return state
+
+    def restore(self, run_id=None, timestamp=None):
+        """Restores the values from before run_id, as of timestamp, or from before the latest
+        run. The restore is journaled as a run of its own, so it can be undone too."""
+        if timestamp is not None:
+            target = self.state_at(timestamp)
+        else:
+            runs = self.runs()
+            if run_id is not None:
+                runs = [run for run in runs if run["run_id"] == run_id]
+            else:
+                runs = [run for run in runs if not run["run_id"].startswith("restore-")]
+            if not runs:
+                print("No backup found.")
+                return False
+            target = runs[-1]["values"]
+        if not target:
+            print("No backup found.")
+            return False
+
+        run = self.begin_run(f"restore-{uuid.uuid4().hex}")
+        ok = True
+        for setting, value in target.items():
+            if setting not in self.settings or run.before.get(setting) == value:
+                continue
+            try:
+                self.backend.write(setting, value)
+            except Exception as e:
+                print(f"Could not restore {setting}: {e}")
+                ok = False
+        run.commit()
+        return ok
+
+
+class SnapshotRun:
+    """Journals the settings when a run starts and what changed when it commits."""
+
+    def __init__(self, store, run_id):
+        self.store = store
+        self.run_id = run_id
+        self.timestamp = time.time()
+        self.before = store.read_all()
+        try:
+            store.append([{"type": "snapshot", "run_id": run_id, "timestamp": self.timestamp, "values": self.before}])
+        except OSError as e:
+            print(f"Failed to write settings journal: {e}")
+
+    def commit(self):
+        after = self.store.read_all()
+        now = time.time()
+        entries = []
+        for setting, new in after.items():
+            if setting in self.before and self.before[setting] != new:
+                entries.append({"type": "change", "run_id": self.run_id, "timestamp": now,
+                                "setting": setting, "old": self.before[setting], "new": new})
+        if not entries:
+            return True
+        try:
+            self.store.append(entries)
+            return True
+        except OSError as e:
+            print(f"Failed to write settings journal: {e}")
+            return False
+
+
+def _import_legacy_backup(store):
+    """Keeps the restore point of the old single-file backup as the first journal entry."""
+    legacy_path = os.path.join(os.getenv('APPDATA') or "", LEGACY_BACKUP_FILE)
+    if os.path.exists(store.path) or not os.path.exists(legacy_path):
+        return
     try:
-        setting = SETTINGS_TO_BACKUP["VisualEffects"]
-        with winreg.OpenKey(setting["key"], setting["path"], 0, winreg.KEY_READ) as reg_key:
-            value, reg_type = winreg.QueryValueEx(reg_key, setting["value_name"])
-            backup_data["VisualEffects"] = value
-    except FileNotFoundError:
-        print("Visual Effects setting not found in registry. Skipping backup for this item.")
-        backup_data["VisualEffects"] = 1 
-    except Exception as e:
-        print(f"An unexpected error occurred during Visual Effects backup: {e}")
+        with open(legacy_path, "r") as f:
+            data = json.load(f)
+        timestamp = os.path.getmtime(legacy_path)
+        store.append([{"type": "snapshot", "run_id": "legacy", "timestamp": timestamp,
+                       "values": {"visual_effects": data["VisualEffects"]}}])
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Could not import legacy backup: {e}")
+
+
+_store = None
+
 
+def get_store():
+    global _store
+    if _store is None:
+        _store = SnapshotStore()
+        _import_legacy_backup(_store)
+    return _store
+
+
+def backup_critical_settings(run_id=None):
+    """Snapshots the settings before a run; commit() the returned run once it finishes."""
+    run = get_store().begin_run(run_id)
     print("Settings backed up.")
-    try:
-        with open(BACKUP_FILE, "w") as f:
-            json.dump(backup_data, f)
-        return True
-    except Exception as e:
-        print(f"Failed to write backup file: {e}")
-        return False
-
-def restore_critical_settings():
-    if not os.path.exists(BACKUP_FILE):
-        print("No backup file found.")
-        return False
-    
-    try:
-        with open(BACKUP_FILE, "r") as f:
-            backup_data = json.load(f)
-    except Exception as e:
-        print(f"Could not read backup file: {e}")
-        return False
+    return run
 
-    try:
-        if "VisualEffects" in backup_data:
-            setting = SETTINGS_TO_BACKUP["VisualEffects"]
-            with winreg.CreateKey(setting["key"], setting["path"]) as reg_key:
-                winreg.SetValueEx(reg_key, setting["value_name"], 0, winreg.REG_DWORD, backup_data["VisualEffects"])
-            import ctypes
-            ctypes.windll.user32.SystemParametersInfoW(0x0057, 0, 0, 0x0002)
-    except Exception as e:
-        print(f"Could not restore Visual Effects: {e}")
-        return False
-        
-    print("Settings restored.")
-    return True
\ No newline at end of file
+
+def restore_points():
+    """The runs that can be undone, newest first: [{"run_id", "timestamp", "values", "changes"}]."""
+    return [run for run in reversed(get_store().runs()) if not run["run_id"].startswith("restore-")]
+
+
+def describe_restore_point(run):
+    when = time.strftime("%Y-%m-%d %H:%M", time.localtime(run["timestamp"]))
+    changed = ", ".join(sorted({change["setting"] for change in run["changes"]})) or "no changes recorded"
+    return f"{when}  ({changed})"
+
+
+def restore_critical_settings(run_id=None, timestamp=None):
+    ok = get_store().restore(run_id=run_id, timestamp=timestamp)
+    if ok:
+        print("Settings restored.")
+    return ok
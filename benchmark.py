@@ -0,0 +1,1435 @@
+# benchmark.py
+import argparse
+import contextlib
+import json
+import math
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+
+def _summarize(samples):
+    samples = sorted(samples)
+    return {
+        "runs": len(samples),
+        "mean_ms": statistics.fmean(samples) * 1000,
+        "p50_ms": samples[len(samples) // 2] * 1000,
+        "p99_ms": samples[min(len(samples) - 1, int(len(samples) * 0.99))] * 1000,
+        "max_ms": samples[-1] * 1000,
+    }
+
+
+def _check(results, ok, message):
+    """Records a failed correctness or latency check; main() reports it and exits non-zero."""
+    if not ok:
+        results.setdefault("failures", []).append(message)
+    return ok
+
+
+def _time_calls(func, runs):
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return _summarize(samples)
+
+
+class _HeadlessDisplay:
+    """Starts an Xvfb server when there is no display on Linux, so the Tk measurements can run on CI."""
+
+    def __init__(self):
+        self.process = None
+        self.previous = os.environ.get("DISPLAY")
+
+    def __enter__(self):
+        if self.previous or not sys.platform.startswith("linux") or not shutil.which("Xvfb"):
+            return self
+        for number in range(99, 120):
+            if not os.path.exists(f"/tmp/.X11-unix/X{number}"):
+                break
+        self.process = subprocess.Popen(["Xvfb", f":{number}", "-nolisten", "tcp", "-screen", "0", "1280x800x24"],
+                                        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        deadline = time.monotonic() + 5
+        while not os.path.exists(f"/tmp/.X11-unix/X{number}") and time.monotonic() < deadline:
+            time.sleep(0.05)
+        os.environ["DISPLAY"] = f":{number}"
+        return self
+
+    def __exit__(self, *exc):
+        if self.process is not None:
+            self.process.terminate()
+            self.process.wait()
+            del os.environ["DISPLAY"]
+
+
+# One frame at 60 Hz.
+TK_FRAME_BUDGET_MS = 16
+
+
+class _FakeWidget:
+    """Takes the calls the dashboard makes on its widgets, for driving it without a display."""
+
+    def __init__(self):
+        self.options = {}
+        self.items = []
+
+    def set(self, value):
+        self.options["value"] = value
+
+    def get(self):
+        return self.options.get("value")
+
+    def configure(self, **options):
+        self.options.update(options)
+
+    def delete(self, *tags):
+        self.items = []
+
+    def create_line(self, *coords, **options):
+        self.items.append(coords)
+
+    def winfo_width(self):
+        return 600
+
+
+def _dashboard(ui_main, sampler, history, root=None):
+    """An object running the App's own dashboard methods against real widgets under root, or
+    fake ones without it; the App itself needs Windows for its system info."""
+    import customtkinter as ctk
+
+    class Dashboard:
+        update_realtime_stats = ui_main.App.update_realtime_stats
+        format_io = ui_main.App.format_io
+        draw_history = ui_main.App.draw_history
+        update_live_scan = ui_main.App.update_live_scan
+
+        def after(self, ms, callback):
+            self.scheduled = (ms, callback)
+
+    dashboard = Dashboard()
+    dashboard.sampler = sampler
+    dashboard.history = history
+    dashboard.history_drawn_at = 0
+    dashboard.temp_watcher = None
+    dashboard.scheduled = None
+    labels = ("cpu_label", "ram_label", "disk_label", "io_label", "health_label", "top_processes_label")
+    bars = ("cpu_progress", "ram_progress", "disk_progress")
+    if root is None:
+        for name in labels + bars + ("history_canvas", "history_range"):
+            setattr(dashboard, name, _FakeWidget())
+        dashboard.history_range.set("5 min")
+        return dashboard
+    for name in labels:
+        setattr(dashboard, name, ctk.CTkLabel(root, text=""))
+    for name in bars:
+        setattr(dashboard, name, ctk.CTkProgressBar(root))
+    dashboard.history_canvas = ctk.CTkCanvas(root, width=600, height=ui_main.SPARKLINE_HEIGHT)
+    dashboard.history_range = ctk.StringVar(root, value="5 min")
+    for name in labels + bars + ("history_canvas",):
+        getattr(dashboard, name).pack()
+    return dashboard
+
+
+def _time_dashboard_tick(runs):
+    """Latency of App.update_realtime_stats, the dashboard's per-second callback, with a full
+    5 minute history to draw. Under a display (or Xvfb) it runs in Tk's after() loop on real
+    widgets and includes the redraw it causes; otherwise it runs against fake widgets."""
+    import tempfile
+
+    try:
+        import customtkinter as ctk
+        import ui_main
+    except ImportError as e:
+        return f"skipped ({e})"
+    import monitor_utils
+    import process_utils
+    import timeseries_utils
+
+    with tempfile.TemporaryDirectory() as directory:
+        history = timeseries_utils.TimeSeriesStore(directory)
+        now = time.time()
+        for i in range(300):
+            history.add({"timestamp": now - 300 + i, "cpu_usage": i % 100, "ram_usage": 50.0, "disk_usage": 40.0,
+                         "partitions": {monitor_utils.SYSTEM_ROOT: 40.0}})
+        sampler = monitor_utils.MetricsSampler(interval=0.05, processes=process_utils.ProcessSampler())
+        sampler.start()
+        deadline = time.monotonic() + 5
+        while (sampler.latest() is None or sampler.top_processes() is None) and time.monotonic() < deadline:
+            time.sleep(0.05)
+        try:
+            try:
+                root = ctk.CTk()
+            except Exception:
+                root = None
+            dashboard = _dashboard(ui_main, sampler, history, root)
+            samples = []
+
+            def tick():
+                start = time.perf_counter()
+                dashboard.update_realtime_stats()
+                if root is not None:
+                    # The redraw the callback caused is part of the frame it costs.
+                    root.update_idletasks()
+                samples.append(time.perf_counter() - start)
+
+            if root is None:
+                for _ in range(runs):
+                    tick()
+            else:
+                def loop():
+                    tick()
+                    if len(samples) < runs:
+                        root.after(1, loop)
+                    else:
+                        root.quit()
+
+                root.after(1, loop)
+                root.mainloop()
+                root.destroy()
+        finally:
+            sampler.stop()
+            history.close()
+
+    results = _summarize(samples)
+    results["widgets"] = "fake" if root is None else "tk"
+    results["rescheduled_ms"] = dashboard.scheduled[0] if dashboard.scheduled else None
+    _check(results, dashboard.scheduled == (ui_main.REFRESH_INTERVAL_MS, dashboard.update_realtime_stats),
+           "update_realtime_stats did not reschedule itself")
+    _check(results, results["p99_ms"] <= TK_FRAME_BUDGET_MS,
+           f"dashboard tick takes {results['p99_ms']:.1f} ms at p99 (budget {TK_FRAME_BUDGET_MS} ms)")
+    return results
+
+
+def bench_sampler(args):
+    """Times one sampler tick and the UI-side latest() read, plus the dashboard's update callback
+    (see _time_dashboard_tick), which fails the run when it exceeds TK_FRAME_BUDGET_MS."""
+    import monitor_utils
+
+    sampler = monitor_utils.MetricsSampler(interval=0.05)
+    sampler.start()
+    time.sleep(0.2)
+    results = {
+        "tick": _time_calls(sampler.sample, args.runs),
+        "latest": _time_calls(sampler.latest, args.runs),
+    }
+
+    sampler.stop()
+
+    with _HeadlessDisplay():
+        results["ui_callback"] = _time_dashboard_tick(args.runs)
+    if isinstance(results["ui_callback"], dict) and "failures" in results["ui_callback"]:
+        results["failures"] = results["ui_callback"].pop("failures")
+    return results
+
+
+LOCKED_DIR = "locked"
+SIZE_DISTRIBUTIONS = ("fixed", "lognormal")
+
+
+def _file_sizes(count, file_size, distribution, rng):
+    if distribution == "fixed":
+        return [file_size] * count
+    # Many small files and a long tail of large ones, median file_size, capped at 64 MiB.
+    return [min(64 * 1024 * 1024, int(rng.lognormvariate(math.log(file_size), 1.5))) for _ in range(count)]
+
+
+def _make_tree(base, files, files_per_dir=200, file_size=512, depth=2, distribution="fixed", unremovable=0.0, seed=0):
+    """Writes a reproducible synthetic temp tree; returns (total bytes, number of unremovable files).
+
+    Directories nest `depth` levels deep. A share `unremovable` of the files is placed in
+    "locked" subfolders, which _LockedEntries makes undeletable.
+    """
+    import random
+
+    rng = random.Random(seed)
+    sizes = _file_sizes(files, file_size, distribution, rng)
+    payload = b"x" * max(sizes, default=0)
+    locked = set(rng.sample(range(files), int(files * unremovable)))
+    directory = base
+    for i, size in enumerate(sizes):
+        if i % files_per_dir == 0:
+            dir_id = i // files_per_dir
+            parts = [f"d{(dir_id // 10 ** level) % 10}" for level in range(depth - 1, 0, -1)]
+            directory = os.path.join(base, *parts, f"s{dir_id}")
+            os.makedirs(os.path.join(directory, LOCKED_DIR), exist_ok=True)
+        target = os.path.join(directory, LOCKED_DIR) if i in locked else directory
+        with open(os.path.join(target, f"f{i}.tmp"), "wb") as f:
+            f.write(payload[:size])
+    return sum(sizes), len(locked)
+
+
+class _LockedEntries:
+    """Makes the files in "locked" folders undeletable for the duration of the block.
+
+    Without admin rights a read-only folder does it. Root ignores folder permissions, so
+    there the unlink itself is made to fail for those paths, the way a sharing violation would.
+    """
+
+    def __init__(self, base):
+        self.base = base
+        self.simulated = hasattr(os, "geteuid") and os.geteuid() == 0 or sys.platform == "win32"
+        self._unlink = os.unlink
+
+    def _locked_dirs(self):
+        for dirpath, dirnames, _ in os.walk(self.base):
+            if os.path.basename(dirpath) == LOCKED_DIR:
+                yield dirpath
+
+    def __enter__(self):
+        if self.simulated:
+            marker = os.sep + LOCKED_DIR + os.sep
+            unlink = self._unlink
+
+            def locked_unlink(path, *args, **kwargs):
+                if marker in os.fspath(path):
+                    raise PermissionError(13, "simulated lock", path)
+                return unlink(path, *args, **kwargs)
+
+            os.unlink = locked_unlink
+        else:
+            for path in list(self._locked_dirs()):
+                os.chmod(path, 0o555)
+        return self
+
+    def __exit__(self, *exc):
+        if self.simulated:
+            os.unlink = self._unlink
+        else:
+            for path in self._locked_dirs():
+                os.chmod(path, 0o755)
+
+
+def _legacy_clean(root):
+    """The original listdir + isfile/islink/isdir + serial rmtree loop, kept for comparison."""
+    for item in os.listdir(root):
+        item_path = os.path.join(root, item)
+        if os.path.isfile(item_path) or os.path.islink(item_path):
+            os.unlink(item_path)
+        elif os.path.isdir(item_path):
+            shutil.rmtree(item_path)
+
+
+def _tree_args(args):
+    return dict(files_per_dir=args.files_per_dir, file_size=args.file_size, depth=args.depth,
+                distribution=args.size_dist, unremovable=args.unremovable, seed=args.seed)
+
+
+def bench_cleanup(args):
+    """Scans and deletes a synthetic temp tree with cleanup_utils, and with the legacy loop when
+    every file is removable. Locked files are counted through the retry-queue hook."""
+    import cleanup_utils
+
+    results = {"files": args.files}
+    base = tempfile.mkdtemp(prefix="sysopt-bench-")
+    try:
+        if not args.unremovable:
+            _make_tree(base, args.files, **_tree_args(args))
+            start = time.perf_counter()
+            _legacy_clean(base)
+            results["legacy_s"] = time.perf_counter() - start
+
+        results["bytes"], results["unremovable"] = _make_tree(base, args.files, **_tree_args(args))
+        start = time.perf_counter()
+        scan = cleanup_utils.scan_roots([base])
+        results["scan_s"] = time.perf_counter() - start
+        results["scan_items"] = scan["items"]
+
+        queued = []
+        with _LockedEntries(base) as locks:
+            start = time.perf_counter()
+            report = cleanup_utils.clean_roots([base], on_failure=lambda path, size, mtime=None: queued.append(path))[base]
+            results["scandir_pool_s"] = time.perf_counter() - start
+        results["locks"] = "simulated" if locks.simulated else "read-only folders"
+        results["queued_for_retry"] = len(queued)
+        results["report"] = report
+    finally:
+        for dirpath, _, _ in os.walk(base):
+            os.chmod(dirpath, 0o755)
+        shutil.rmtree(base, ignore_errors=True)
+    return results
+
+
+def _tree_files(base):
+    return {os.path.join(dirpath, name) for dirpath, _, names in os.walk(base) for name in names}
+
+
+def bench_quarantine(args):
+    """Quarantines two synthetic trees in a row, one per top-level entry and one through a policy,
+    with the quarantine folder inside the cleaned root (as on a drive root or a tmpfs /tmp), then
+    restores both runs and checks that every file comes back."""
+    import cleanup_utils
+    import policy_utils
+    import quarantine_utils
+
+    files = min(args.files, 2000)
+    results = {"files": files}
+    base = tempfile.mkdtemp(prefix="sysopt-bench-")
+    volume_root = quarantine_utils._volume_root
+    quarantine_utils._volume_root = lambda path: base
+    try:
+        with _data_dir():
+            expected = set()
+            for run_id, policy in (("bench-run1", None), ("bench-run2", policy_utils.Policy())):
+                _make_tree(os.path.join(base, run_id), files, seed=len(expected))
+                expected |= _tree_files(os.path.join(base, run_id))
+                quarantine = quarantine_utils.Quarantine(run_id)
+                start = time.perf_counter()
+                cleanup_utils.clean_roots([base], policy=policy, quarantine=quarantine)
+                quarantine.commit()
+                results[f"{run_id}_quarantine_s"] = time.perf_counter() - start
+            _check(results, not _tree_files(base) & expected, "quarantined files were left in the cleaned root")
+
+            for run_id in ("bench-run2", "bench-run1"):
+                start = time.perf_counter()
+                totals = quarantine_utils.restore_run(run_id)
+                results[f"{run_id}_restore_s"] = time.perf_counter() - start
+                results[f"{run_id}_restore"] = totals
+                _check(results, totals is not None and not totals["conflicts"] and not totals["failures"],
+                       f"restoring {run_id} reported {totals}")
+            missing = expected - _tree_files(base)
+            _check(results, not missing, f"{len(missing)} quarantined files were not restored")
+            _check(results, not quarantine_utils.list_runs(), "restored runs are still listed")
+    finally:
+        quarantine_utils._volume_root = volume_root
+        shutil.rmtree(base, ignore_errors=True)
+    return results
+
+
+def _wait_for(predicate, timeout):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def bench_watcher(args):
+    """Indexes a synthetic tree with TempWatcher and times latest(), the read the dashboard does
+    every tick. Checks that the background totals match the tree and pick up new files."""
+    import watch_utils
+
+    files = min(args.files, 5000)
+    results = {"files": files}
+    base = tempfile.mkdtemp(prefix="sysopt-bench-")
+    watcher = watch_utils.TempWatcher([base])
+    try:
+        _make_tree(base, files, files_per_dir=args.files_per_dir)
+        start = time.perf_counter()
+        if not watcher.start():
+            results["skipped"] = "no change notification backend on this platform"
+            return results
+        ready = _wait_for(lambda: watcher.latest() is not None, 30)
+        results["first_totals_s"] = time.perf_counter() - start
+        _check(results, ready, "the watcher never published totals")
+        if not ready:
+            return results
+        _check(results, watcher.latest()["items"] == files, f"the watcher counted {watcher.latest()['items']} of {files} files")
+        results["latest"] = _time_calls(watcher.latest, args.runs)
+        _check(results, results["latest"]["p50_ms"] <= TK_FRAME_BUDGET_MS,
+               f"latest() p50 {results['latest']['p50_ms']:.2f} ms is over the {TK_FRAME_BUDGET_MS} ms frame budget")
+
+        with open(os.path.join(base, "new.tmp"), "wb") as f:
+            f.write(b"x")
+        start = time.perf_counter()
+        refreshed = _wait_for(lambda: watcher.latest()["items"] == files + 1, watch_utils.RECLAIMABLE_REFRESH_SECONDS * 3)
+        results["refresh_s"] = time.perf_counter() - start
+        _check(results, refreshed, "the background totals did not pick up a new file")
+    finally:
+        watcher.stop()
+        shutil.rmtree(base, ignore_errors=True)
+    return results
+
+
+@contextlib.contextmanager
+def _data_dir():
+    """Points SYSOPT_DATA_DIR at a throwaway folder for the duration of a benchmark."""
+    previous = os.environ.get("SYSOPT_DATA_DIR")
+    with tempfile.TemporaryDirectory(prefix="sysopt-bench-") as data_dir:
+        os.environ["SYSOPT_DATA_DIR"] = data_dir
+        try:
+            yield data_dir
+        finally:
+            if previous is None:
+                del os.environ["SYSOPT_DATA_DIR"]
+            else:
+                os.environ["SYSOPT_DATA_DIR"] = previous
+
+
+def bench_static_info(args):
+    """Static system info: the cached path every start takes, and the full collection where it can run.
+    Also checks that only lasting changes mark the cache stale and that concurrent cache writes are safe."""
+    import cache_utils
+    import system_utils
+
+    results = {
+        "fingerprint": _time_calls(cache_utils.static_info_fingerprint, max(1, args.runs // 10)),
+    }
+    fingerprint = cache_utils.static_info_fingerprint()
+    try:
+        start = time.perf_counter()
+        data = system_utils.get_static_info()
+        results["collect_ms"] = (time.perf_counter() - start) * 1000
+    except Exception as e:
+        # wmic and the STARTUPINFO flags only exist on Windows; time the cache with a stand-in.
+        results["collect_ms"] = f"skipped ({type(e).__name__}: {e})"
+        data = {"os": "bench", "cpu": "bench", "ram": "bench", "gpu": "bench", "disks": []}
+    with _data_dir() as data_dir:
+        cache_utils.save_static_info(data, fingerprint)
+        results["cached_load"] = _time_calls(lambda: cache_utils.load_static_info(fingerprint), max(1, args.runs // 10))
+        _check_atomic_write(results, data_dir)
+
+    disk = {"device": "C:", "total": "100.00 GB", "used": "40.00 GB", "percent": 40.0}
+    cached = dict(data, disks=[disk])
+    _check(results, not cache_utils.stale_fields(cached, dict(cached, disks=[dict(disk, used="41.00 GB", percent=41.0)])),
+           "a disk usage change alone marks the static info stale")
+    _check(results, cache_utils.stale_fields(cached, dict(cached, disks=[dict(disk, total="200.00 GB")])) == ["disks"],
+           "a replaced disk does not mark the static info stale")
+    return results
+
+
+def _check_atomic_write(results, directory):
+    """Concurrent atomic_write calls to one path must all succeed and leave one whole payload."""
+    import threading
+
+    import path_utils
+
+    path = os.path.join(directory, "atomic.json")
+    payloads = [json.dumps({"writer": i, "data": "x" * 65536}) for i in range(8)]
+    errors = []
+
+    def write(payload):
+        try:
+            for _ in range(20):
+                path_utils.atomic_write(path, payload)
+        except OSError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=write, args=(payload,)) for payload in payloads]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    with open(path, "r") as f:
+        final = f.read()
+    _check(results, not errors, f"concurrent atomic_write failed: {errors[:1]}")
+    _check(results, final in payloads, "concurrent atomic_write left a mixed file")
+    _check(results, os.listdir(directory).count("atomic.json") == 1 and not [n for n in os.listdir(directory) if n.endswith(".tmp")],
+           "atomic_write left temp files behind")
+
+
+def bench_scheduler(args):
+    """Runs stub tasks mirroring the real resource declarations sequentially and through the scheduler."""
+    import scheduler_utils
+
+    def stub(duration, *resources):
+        @scheduler_utils.uses_resources(*resources)
+        def task(progress_callback):
+            time.sleep(duration)
+            return "ok"
+        return task
+
+    tasks = {
+        "Clean Temporary Files": stub(0.5, "fs:/tmp"),
+        "Clear Windows Update Cache": stub(0.6, "fs:/var/cache/SoftwareDistribution", "service:wuauserv"),
+        "Empty Recycle Bin": stub(0.3, "fs:/home/.Trash", "shell:recyclebin"),
+        "Clear DNS Cache": stub(0.2, "service:Dnscache"),
+        "Optimize System Disk (Defrag/TRIM)": stub(0.8, "fs:/"),
+        "Set High Performance Power Plan": stub(0.2, "power:scheme"),
+        "Adjust Visual Effects for Performance": stub(0.1, "registry:HKCU/Explorer/VisualEffects"),
+        "Disable Background Apps (Global)": stub(0.1, "registry:HKCU/BackgroundAccessApplications"),
+    }
+    start = time.perf_counter()
+    scheduler_utils.run_sequential(tasks, lambda message: None)
+    sequential = time.perf_counter() - start
+    start = time.perf_counter()
+    scheduler_utils.run_scheduled(tasks, lambda message: None)
+    scheduled = time.perf_counter() - start
+    return {"sequential_s": sequential, "scheduled_s": scheduled, "speedup": sequential / scheduled}
+
+
+IMPORT_TARGETS = {
+    "gui": "import customtkinter, ui_main",
+    "headless": "import main, cli_utils, system_utils",
+    "system_utils": "import system_utils",
+}
+# Loaded by the code that needs them, never by importing system_utils.
+LAZY_MODULES = ("asyncio", "sqlite3", "multiprocessing", "plugin_utils", "history_utils")
+
+
+def bench_backup(args):
+    """Journals settings runs against backup_utils.MemoryBackend and times reading the journal back.
+    Checks restoring the latest run, a chosen run, a point in time, a run that never committed,
+    and that a torn last line does not swallow the next entry."""
+    import backup_utils
+
+    results = {}
+    with _data_dir() as data_dir:
+        backend = backup_utils.MemoryBackend({"visual_effects": 1, "power_plan": "balanced"})
+        store = backup_utils.SnapshotStore(path=os.path.join(data_dir, backup_utils.JOURNAL_FILE), backend=backend)
+
+        for run_id, changes in (("run1", {"visual_effects": 2}), ("run2", {"visual_effects": 3, "power_plan": "high"})):
+            run = store.begin_run(run_id)
+            for setting, value in changes.items():
+                backend.write(setting, value)
+            run.commit()
+        after_run2 = time.time()
+        runs = store.runs()
+        _check(results, [run["run_id"] for run in runs] == ["run1", "run2"], f"journaled runs {[run['run_id'] for run in runs]}")
+        _check(results, len(runs[-1]["changes"]) == 2, f"run2 journaled {len(runs[-1]['changes'])} of 2 changes")
+
+        store.restore()
+        _check(results, backend.values == {"visual_effects": 2, "power_plan": "balanced"},
+               f"restoring the latest run left {backend.values}")
+        store.restore("run1")
+        _check(results, backend.values == {"visual_effects": 1, "power_plan": "balanced"},
+               f"restoring run1 left {backend.values}")
+        store.restore(timestamp=after_run2)
+        _check(results, backend.values == {"visual_effects": 3, "power_plan": "high"},
+               f"restoring the state after run2 left {backend.values}")
+
+        # A run killed before commit() still leaves the snapshot it took when it began.
+        store.begin_run("crashed")
+        backend.write("power_plan", "saver")
+        with open(store.path, "a", encoding="utf-8") as f:
+            f.write('{"type": "change", "run_id": "crashed"')
+        reopened = backup_utils.SnapshotStore(path=store.path, backend=backend)
+        reopened.restore("crashed")
+        _check(results, backend.values["power_plan"] == "high", f"restoring an uncommitted run left {backend.values}")
+        restores = [run for run in reopened.runs() if run["run_id"].startswith("restore-")]
+        _check(results, len(restores) == 4 and restores[-1]["changes"],
+               "the restore after a torn line was not journaled as a run of its own")
+
+        results["entries"] = len(store.entries())
+        results["runs"] = _time_calls(store.runs, max(1, args.runs // 10))
+    return results
+
+
+def bench_retry(args):
+    """Drives retry_utils.RetryQueue with a simulated clock and MemoryRebootBackend: checks the
+    backoff delays, that a file still locked after RETRY_WINDOW_SECONDS is handed to the reboot
+    backend, and that it is retried once more after a reboot."""
+    import retry_utils
+
+    results = {}
+    clock = [1000.0]
+    locked = {"locked.tmp", "freed.tmp"}
+    attempts = {}
+
+    def remove(path):
+        attempts.setdefault(path, []).append(clock[0] - 1000.0)
+        if path == "freed.tmp" and len(attempts[path]) == 3:
+            locked.discard(path)
+        if path in locked:
+            raise PermissionError(path)
+
+    with _data_dir() as data_dir:
+        path = os.path.join(data_dir, retry_utils.QUEUE_FILE)
+        backend = retry_utils.MemoryRebootBackend()
+        queue = retry_utils.RetryQueue(path, backend, clock=lambda: clock[0], boot_time=lambda: 1.0, remove=remove)
+        queue.add("locked.tmp", 100, run_id="run")
+        queue.add("freed.tmp", 50, run_id="run")
+        delay = queue.retry_due()
+        while delay is not None:
+            clock[0] += delay
+            delay = queue.retry_due()
+
+        expected, wait = [], retry_utils.FIRST_RETRY_SECONDS
+        while not expected or expected[-1] < retry_utils.RETRY_WINDOW_SECONDS:
+            expected.append((expected[-1] if expected else 0) + wait)
+            wait = min(wait * 2, retry_utils.MAX_BACKOFF_SECONDS)
+        results["attempts"] = len(attempts.get("locked.tmp", []))
+        _check(results, attempts.get("locked.tmp") == expected, f"retried at {attempts.get('locked.tmp')}, expected {expected}")
+        _check(results, attempts.get("freed.tmp") == expected[:3], f"a freed file was retried at {attempts.get('freed.tmp')}")
+        _check(results, backend.scheduled == ["locked.tmp"], f"scheduled for reboot: {backend.scheduled}")
+        stats = queue.stats("run")
+        _check(results, stats == {"queued": 2, "recovered_files": 1, "recovered_bytes": 50, "scheduled_reboot": 1},
+               f"run stats {stats}")
+        _check(results, queue.pending() == 0, "a file scheduled for reboot is still retrying")
+
+        locked.clear()
+        rebooted = retry_utils.RetryQueue(path, backend, clock=lambda: clock[0], boot_time=lambda: 2.0, remove=remove)
+        _check(results, rebooted.pending() == 1, "the file left for reboot is not retried after a reboot")
+        rebooted.retry_due()
+        _check(results, not rebooted.entries, "the file left for reboot stayed queued after the reboot retry")
+
+        results["retry_due"] = _time_calls(queue.retry_due, max(1, args.runs // 10))
+    return results
+
+
+PROGRESS_SCRIPT = """
+import sys, time
+for percent in (10, 20, 30):
+    sys.stdout.write(f"{percent}%" + ("\\n" if percent == 30 else "\\r"))
+    sys.stdout.flush()
+    time.sleep(0.2)
+"""
+
+
+def bench_commands(args):
+    """Runs stand-in commands (python -c, sleep, true) through command_utils: checks that \\r progress
+    streams line by line before the command exits, and that timeouts and cancellation kill it."""
+    import threading
+
+    import command_utils
+
+    results = {"spawn": _time_calls(lambda: command_utils.run_command(["true"]), max(1, args.runs // 20))}
+
+    arrivals = []
+    start = time.perf_counter()
+    result = command_utils.run_command([sys.executable, "-c", PROGRESS_SCRIPT],
+                                       on_line=lambda line: arrivals.append((line, time.perf_counter() - start)))
+    elapsed = time.perf_counter() - start
+    _check(results, [line for line, _ in arrivals] == ["10%", "20%", "30%"], f"streamed lines {arrivals}")
+    _check(results, bool(arrivals) and arrivals[0][1] < elapsed - 0.3, "progress arrived only when the command exited")
+    _check(results, result.stdout.split("\n") == ["10%", "20%", "30%"], f"collected stdout {result.stdout!r}")
+
+    start = time.perf_counter()
+    try:
+        command_utils.run_command(["sleep", "5"], timeout=0.2)
+        _check(results, False, "a command past its timeout was not stopped")
+    except subprocess.TimeoutExpired:
+        results["timeout_s"] = time.perf_counter() - start
+        _check(results, results["timeout_s"] < 1, f"a 0.2 s timeout took {results['timeout_s']:.2f} s")
+
+    event = threading.Event()
+    timer = threading.Timer(0.2, event.set)
+    start = time.perf_counter()
+    timer.start()
+    try:
+        with command_utils.cancel_scope(event):
+            command_utils.run_command(["sleep", "5"])
+        _check(results, False, "a cancelled command ran to completion")
+    except command_utils.CommandCancelled:
+        results["cancel_s"] = time.perf_counter() - start
+        _check(results, results["cancel_s"] < 1, f"cancelling took {results['cancel_s']:.2f} s")
+    finally:
+        timer.cancel()
+    try:
+        with command_utils.cancel_scope(event):
+            command_utils.run_command(["true"])
+        _check(results, False, "a command started after cancellation ran")
+    except command_utils.CommandCancelled:
+        pass
+
+    try:
+        command_utils.run_command([sys.executable, "-c", "raise SystemExit(3)"], check=True)
+        _check(results, False, "check=True ignored a failing exit code")
+    except subprocess.CalledProcessError as e:
+        _check(results, e.returncode == 3, f"exit code {e.returncode}")
+    return results
+
+
+def _import_times(statement):
+    """Runs `python -X importtime` in a fresh interpreter and returns cumulative microseconds per module."""
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", statement],
+                          capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+    if proc.returncode != 0:
+        return None, proc.stderr.strip().splitlines()[-1]
+    times = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative_us, name = line[len("import time:"):].split("|")
+        # Nested imports are indented; only top-level entries add up to the total.
+        if not name[1:].startswith(" "):
+            times[name.strip()] = int(cumulative_us)
+    return times, None
+
+
+def bench_imports(args):
+    """Cold-start import cost of the GUI and headless paths, with the heaviest top-level modules.
+    Fails if importing system_utils loads any of LAZY_MODULES."""
+    results = {}
+    for target, statement in IMPORT_TARGETS.items():
+        runs = []
+        heaviest = None
+        for _ in range(max(1, min(args.runs, 5))):
+            times, error = _import_times(statement)
+            if error:
+                results[target] = f"failed: {error}"
+                break
+            runs.append(sum(times.values()) / 1000)
+            heaviest = sorted(times.items(), key=lambda item: item[1], reverse=True)[:10]
+        else:
+            results[target] = {
+                "total_ms": min(runs),
+                "heaviest_ms": {name: us / 1000 for name, us in heaviest},
+            }
+
+    probe = f"import sys, system_utils; print(' '.join(m for m in {LAZY_MODULES!r} if m in sys.modules))"
+    proc = subprocess.run([sys.executable, "-c", probe], capture_output=True, text=True,
+                          cwd=os.path.dirname(os.path.abspath(__file__)))
+    eager = proc.stdout.split()
+    _check(results, proc.returncode == 0 and not eager, f"importing system_utils loads {', '.join(eager) or proc.stderr.strip()}")
+    return results
+
+
+def bench_instrumentation(args):
+    """Per-call overhead of wrapping an optimization and recording counters, switched on and off."""
+    import instrumentation_utils
+
+    def task(progress_callback):
+        for _ in range(10):
+            instrumentation_utils.record(bytes_freed=1, files_touched=1)
+        return "ok"
+
+    results = {}
+    for enabled in (False, True):
+        instrumentation_utils.set_enabled(enabled)
+        recorder = instrumentation_utils.RunRecorder()
+        wrapped = recorder.wrap("task", task)
+        results["enabled" if enabled else "disabled"] = _time_calls(lambda: wrapped(None), args.runs)
+    instrumentation_utils.set_enabled(True)
+
+    # CPU burnt in pool threads counts toward the span; a failure is flagged only when reported.
+    import scheduler_utils
+    from concurrent.futures import ThreadPoolExecutor
+
+    def spin(_):
+        end = time.thread_time() + 0.05
+        while time.thread_time() < end:
+            pass
+
+    def pooled(progress_callback):
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            list(pool.map(instrumentation_utils.pool_cpu(spin), range(4)))
+        return "Failed to nothing, by name only"
+
+    def failing(progress_callback):
+        instrumentation_utils.record_error("boom")
+        return scheduler_utils.FailedResult("Failed: boom")
+
+    recorder = instrumentation_utils.RunRecorder()
+    recorder.wrap("pooled", pooled)(None)
+    recorder.wrap("failing", failing)(None)
+    pooled_span, failing_span = recorder.spans
+    results["pool_cpu_seconds"] = pooled_span.cpu_seconds
+    _check(results, pooled_span.cpu_seconds >= 0.15, f"pool CPU not counted: {pooled_span.cpu_seconds:.3f}s of 0.2s")
+    _check(results, not pooled_span.errors, "a result mentioning failure flagged the span")
+    _check(results, failing_span.errors == ["boom"], f"record_error not kept: {failing_span.errors}")
+    return results
+
+
+def bench_policy(args):
+    """Per-entry cost of Policy.allows_file as the number of glob rules grows; it should stay
+    roughly flat."""
+    import policy_utils
+
+    names = [f"file{i}.{ext}" for i in range(1000) for ext in ("tmp", "log", "dat")]
+    paths = [f"build{i % 50}/obj/{name}" for i, name in enumerate(names)]
+    st = os.stat(__file__)
+    now = time.time()
+    results = {}
+    for rule_count in (1, 10, 100, 500):
+        # A realistic mix: half "*.ext" suffix rules, some prefixes and 40% general globs, most
+        # of them anchored on an extension, a leading literal or a folder, a few on nothing.
+        rules = []
+        for i in range(rule_count):
+            kind = i % 20
+            if kind < 10:
+                rules.append(f"*.ext{i}")
+            elif kind < 12:
+                rules.append(f"cache{i}*")
+            elif kind < 14:
+                rules.append(f"~$*.doc{i}")
+            elif kind < 16:
+                rules.append(f"report{i}-??.*")
+            elif kind < 18:
+                rules.append(f"build{i}/*.o?")
+            elif kind < 19:
+                rules.append(f"*.log.{i}[0-9]")
+            else:
+                rules.append(f"*thumb{i}*.db")
+        policy = policy_utils.Policy(exclude=rules)
+
+        def check():
+            for name, path in zip(names, paths):
+                policy.allows_file(name, path, st, now)
+
+        timing = _time_calls(check, max(1, args.runs // 10))
+        timing["ns_per_entry"] = timing["mean_ms"] * 1e6 / len(names)
+        results[str(rule_count)] = timing
+    return results
+
+
+def bench_progress(args):
+    """Stress test: worker threads push a million progress events while a 100 ms drain loop
+    stands in for the Tk after() tick. Reports drain latency and peak memory, and fails if an
+    event is lost, a drain hands over more than one event per task or the last counters of a
+    task, or the completion, never reach the Tk side."""
+    import threading
+    import tracemalloc
+
+    import progress_utils
+
+    total_events = 1_000_000
+    workers = 8
+    bus = progress_utils.ProgressBus()
+    finished = threading.Event()
+
+    def task(progress_callback):
+        count = total_events // workers
+        for i in range(count):
+            progress_utils.report(items_done=i, items_total=count, bytes_done=i * 4096)
+
+    def worker(index):
+        progress_utils.run_as(f"task{index}", task)(bus)
+
+    tracemalloc.start()
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(workers)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    drains = []
+    ui_updates = 0
+
+    def joiner():
+        for thread in threads:
+            thread.join()
+        bus.complete("done")
+        finished.set()
+
+    threading.Thread(target=joiner).start()
+    results = {}
+    latest = {}
+    completions = []
+    while True:
+        done = finished.wait(0.1)
+        drain_start = time.perf_counter()
+        events, completion = bus.drain()
+        for event in events:
+            progress_utils.format_event(event)
+        drains.append(time.perf_counter() - drain_start)
+        ui_updates += len(events)
+        _check(results, len({event["task"] for event in events}) == len(events), "a drain returned two events for one task")
+        latest.update((event["task"], event) for event in events)
+        if completion is not None:
+            completions.append(completion)
+        if done:
+            break
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    results.update({
+        "events": bus.published,
+        "events_per_s": bus.published / elapsed,
+        "ui_updates": ui_updates,
+        "tk_drains": len(drains),
+        "drain": _summarize(drains),
+        "peak_memory_kb": peak / 1024,
+    })
+    count = total_events // workers
+    _check(results, bus.published == count * workers, f"{count * workers - bus.published} event(s) lost")
+    _check(results, ui_updates <= workers * len(drains), f"{ui_updates} UI updates from {len(drains)} drains of {workers} tasks")
+    # One drain per tick, plus the final one.
+    _check(results, len(drains) <= elapsed / 0.1 + 2, f"{len(drains)} drains in {elapsed:.1f} s at a 100 ms tick")
+    final = {(f"task{i}", count - 1, (count - 1) * 4096, count) for i in range(workers)}
+    seen = {(task, event["items_done"], event["bytes_done"], event["items_total"]) for task, event in latest.items()}
+    _check(results, seen == final, f"last counters on the Tk side differ from the workers': {sorted(seen ^ final)[:4]}")
+    _check(results, completions == [("done",)], f"completion delivered {len(completions)} time(s)")
+    # The median: the workers here spin on the GIL far harder than real tasks do.
+    _check(results, results["drain"]["p50_ms"] <= TK_FRAME_BUDGET_MS,
+           f"a drain takes {results['drain']['p50_ms']:.1f} ms (budget {TK_FRAME_BUDGET_MS} ms)")
+    return results
+
+
+def bench_listmodel(args):
+    """Operations behind the virtualized review list on a million (size, path) rows.
+
+    sort_* and filter_text are computed by plan() on a worker thread; the tk_* entries are
+    what the Tk thread itself pays per sort, filter, click or summary update, and the run
+    fails if the median of any of them exceeds TK_FRAME_BUDGET_MS."""
+    import random
+
+    import list_model
+
+    rng = random.Random(0)
+    rows = [(rng.randrange(1 << 32), f"C:\\Users\\me\\dir{i % 977}\\file{i}.bin") for i in range(1_000_000)]
+    model = list_model.ListModel(("Size", "Path"), rows, weight_column=0)
+    predicate = list_model.text_predicate("dir42\\", column=1)
+    runs = max(1, args.runs // 100)
+    results = {}
+    plans = {}
+
+    def plan(name, column, reverse, predicate):
+        plans[name] = model.plan(column, reverse, predicate)
+
+    def tk_apply(name):
+        _check(results, model.apply(plans[name]), f"{name}: plan went stale")
+
+    for name, column, reverse, keep in (("sort_size", 0, True, None), ("sort_path", 1, False, None),
+                                        ("filter_text", 1, False, predicate), ("clear_filter", 1, False, None)):
+        results[name] = _time_calls(lambda: plan(name, column, reverse, keep), runs)
+        results[f"tk_apply_{name}"] = _time_calls(lambda: tk_apply(name), runs)
+    model.apply(plans["filter_text"])
+    results["tk_select_all_filtered"] = _time_calls(lambda: model.select_all(), runs)
+    results["tk_invert_filtered"] = _time_calls(lambda: model.invert_selection(), runs)
+    model.apply(plans["clear_filter"])
+    # The first whole-list selection sums the weights once; later ones reuse that total.
+    results["first_select_all"] = _time_calls(lambda: model.select_all(), 1)
+    for name, operation in (
+        ("tk_select_all", lambda: model.select_all()),
+        ("tk_invert", lambda: model.invert_selection()),
+        ("selected_rows", lambda: model.selected_rows()),
+        ("tk_toggle", lambda: model.toggle(500)),
+        ("tk_summary", lambda: (len(model), model.selected_count(), model.selected_weight())),
+        ("tk_visible_page", lambda: model.visible(500, 40)),
+    ):
+        results[name] = _time_calls(operation, runs)
+
+    selected = model.selected_rows()
+    _check(results, (model.selected_count(), model.selected_weight()) == (len(selected), sum(size for size, _ in selected)),
+           "running selection totals drifted from the selection")
+    # Rows whose files could not be deleted stay listed.
+    failed = {path for _, path in selected[::1000]}
+    start = time.perf_counter()
+    model.remove_selected(keep=lambda row: row[1] in failed)
+    results["remove_selected_ms"] = (time.perf_counter() - start) * 1000
+    _check(results, len(model.rows) == len(rows) - len(selected) + len(failed) and {path for _, path in model.rows} >= failed,
+           f"{len(model.rows)} rows left after removing {len(selected) - len(failed)} of {len(rows)}")
+    largest = list_model.LargestRows(1000)
+    start = time.perf_counter()
+    for batch in range(0, len(rows), 1000):
+        largest.extend(rows[batch:batch + 1000])
+    results["largest_rows_s"] = time.perf_counter() - start
+    _check(results, sorted(largest.rows()) == sorted(rows)[-1000:] and largest.dropped == len(rows) - 1000,
+           "LargestRows did not keep the largest rows")
+    for name, result in list(results.items()):
+        if name.startswith("tk_"):
+            _check(results, result["p50_ms"] <= TK_FRAME_BUDGET_MS,
+                   f"{name} takes {result['p50_ms']:.1f} ms on the Tk thread (budget {TK_FRAME_BUDGET_MS} ms)")
+    return results
+
+
+def bench_daemon(args):
+    """Replays a synthetic day of load through the daemon's IdleScheduler on a simulated clock:
+    a busy morning, a user returning mid-run and a run whose own I/O exceeds its budget. Checks
+    that runs start and resume only after settle_seconds of quiet, pause on the first busy poll,
+    keep their own I/O at max_io_mb_s on average and stop at max_duration_minutes, and that the
+    Daemon ends a run whose thread dies."""
+    import random
+    import threading
+
+    import daemon_utils
+
+    rng = random.Random(0)
+    config = dict(daemon_utils.DEFAULT_CONFIG)
+    poll = config["poll_seconds"]
+    settle = config["settle_seconds"]
+    work_seconds = 8 * 60
+    raw_io_mb_s = 60
+    results = {}
+
+    def load_at(t):
+        hour = t / 3600
+        busy = hour < 2 or 2.2 <= hour < 2.25 or 9 <= hour < 17
+        return {
+            "cpu_percent": rng.uniform(40, 90) if busy else rng.uniform(0, 10),
+            "disk_mb_s": rng.uniform(10, 50) if busy else rng.uniform(0, 2),
+            "input_idle_seconds": 0 if busy else 3600,
+        }
+
+    scheduler = daemon_utils.IdleScheduler(config)
+    actions = []
+    running = False
+    done = 0.0
+    run_start = run_end = None
+    io_total = 0.0
+    # Time the run held its slot (running or duty-cycle paused), as opposed to paused by load.
+    slot_seconds = 0.0
+    quiet_since = None
+    step_times = []
+    t = 0
+    while t < 24 * 3600:
+        load = load_at(t)
+        quiet = scheduler.is_quiet(load)
+        quiet_since = (t if quiet_since is None else quiet_since) if quiet else None
+        load["own_io_mb_s"] = raw_io_mb_s if running else 0.0
+        was_running = running
+        start = time.perf_counter()
+        action = scheduler.step(t, load)
+        step_times.append(time.perf_counter() - start)
+        if action == daemon_utils.START:
+            _check(results, quiet_since is not None and t - quiet_since >= settle,
+                   f"started at {t}s after {t - quiet_since if quiet_since is not None else 0}s of quiet (settle {settle}s)")
+        if was_running and not quiet:
+            _check(results, action in (daemon_utils.PAUSE, daemon_utils.STOP), f"kept running under load at {t}s")
+        if action in (daemon_utils.START, daemon_utils.RESUME):
+            running = True
+            run_start = t if run_start is None else run_start
+        elif action in (daemon_utils.PAUSE, daemon_utils.STOP):
+            running = False
+        if action != daemon_utils.WAIT:
+            actions.append((round(t / 3600, 3), action))
+        if running:
+            done += poll
+            io_total += raw_io_mb_s * poll
+            if done >= work_seconds:
+                running = False
+                run_end = t + poll
+                scheduler.finished(run_end)
+                actions.append((round(run_end / 3600, 3), "finished"))
+        if scheduler.state in ("running", "throttled") or running:
+            slot_seconds += poll
+        t += poll
+
+    counts = {}
+    for _, action in actions:
+        counts[action] = counts.get(action, 0) + 1
+    wall = (run_end - run_start) if run_end is not None else None
+    duty_io = io_total / slot_seconds if slot_seconds else None
+    results.update({
+        "work_done_minutes": done / 60,
+        "first_start_h": run_start / 3600 if run_start is not None else None,
+        "run_wall_minutes": wall / 60 if wall else None,
+        "avg_own_io_mb_s": io_total / wall if wall else None,
+        "duty_cycled_io_mb_s": duty_io,
+        "io_budget_mb_s": config["max_io_mb_s"],
+        "actions": counts,
+        "first_actions": actions[:8],
+        "step": _summarize(step_times),
+    })
+    _check(results, done >= work_seconds, f"only {done / 60:.1f} of {work_seconds / 60:.0f} minutes of work got done")
+    _check(results, counts.get(daemon_utils.PAUSE, 0) >= 2, "never paused for the returning user or the I/O budget")
+    _check(results, duty_io is not None and abs(duty_io - config["max_io_mb_s"]) <= 0.15 * config["max_io_mb_s"],
+           f"own I/O averaged {duty_io} MB/s against a budget of {config['max_io_mb_s']} MB/s")
+
+    # A run that never finishes on its own is stopped at max_duration_minutes.
+    limit = config["max_duration_minutes"] * 60
+    scheduler = daemon_utils.IdleScheduler(config)
+    quiet = {"cpu_percent": 0.0, "disk_mb_s": 0.0, "input_idle_seconds": None, "own_io_mb_s": 0.0}
+    started = stopped = None
+    t = 0
+    while stopped is None and t < 2 * limit:
+        action = scheduler.step(t, quiet)
+        if action == daemon_utils.START:
+            started = t
+        elif action == daemon_utils.STOP:
+            stopped = t
+        t += poll
+    results["stopped_after_minutes"] = (stopped - started) / 60 if stopped is not None else None
+    _check(results, stopped is not None and limit <= stopped - started < limit + poll,
+           f"a run without an end stopped after {results['stopped_after_minutes']} minutes (limit {limit / 60:.0f})")
+    _check(results, started == settle, f"first start at {started}s on an idle machine (settle {settle}s)")
+
+    # The Daemon ends a run whose thread died without calling on_complete.
+    class CrashingOptimizer:
+        OPTIMIZATIONS = {}
+
+        def load_plugins(self):
+            pass
+
+        def run_optimizations(self, tasks, progress_callback, completion_callback, cancel_event=None, throttle=None):
+            def task():
+                raise RuntimeError("export failed")
+
+            thread = threading.Thread(target=task)
+            thread.start()
+            return thread
+
+    daemon = daemon_utils.Daemon(config=dict(config, tasks=[]), probe=object())
+    saved = daemon_utils._save_last_run
+    daemon_utils._save_last_run = lambda timestamp: None
+    excepthook = threading.excepthook
+    threading.excepthook = lambda hook_args: None
+    try:
+        daemon._start(CrashingOptimizer())
+        daemon._thread.join()
+        daemon._reap(time.time())
+    finally:
+        daemon_utils._save_last_run = saved
+        threading.excepthook = excepthook
+    _check(results, not daemon._active and daemon.scheduler.state == "idle", "a crashed run left the daemon active")
+    return results
+
+
+def bench_processes(args):
+    """Times one top-N process sampling pass with --processes extra idle processes running (Linux),
+    and checks that idle processes still get their memory re-read."""
+    import process_utils
+
+    sleep = shutil.which("sleep")
+    command = [sleep, "300"] if sleep else [sys.executable, "-c", "import time; time.sleep(300)"]
+    children = [subprocess.Popen(command) for _ in range(args.processes)]
+    try:
+        import psutil
+        sampler = process_utils.ProcessSampler()
+        sampler.sample()
+        timing = _time_calls(sampler.sample, max(1, args.runs // 10))
+        timing["processes"] = len(psutil.pids())
+        # An idle child whose memory shrank (as after a working-set trim) is re-read within
+        # COUNTER_REFRESH_TICKS ticks, though its CPU time never moves.
+        pid = children[0].pid
+        cpu_total, _, io_total = sampler._previous[pid]
+        sampler._previous[pid] = (cpu_total, 1, io_total)
+        for _ in range(process_utils.COUNTER_REFRESH_TICKS):
+            sampler.sample()
+        _check(timing, sampler._previous[pid][1] != 1, "an idle process's memory was never re-read")
+    finally:
+        for child in children:
+            child.kill()
+        for child in children:
+            child.wait()
+    return timing
+
+
+def bench_history(args):
+    """Run history queries over years of synthetic runs, and the peak memory of streaming CSV/PDF exports."""
+    import random
+    import tracemalloc
+
+    import history_utils
+
+    rng = random.Random(args.seed)
+    tasks = ["Clean Temporary Files", "Clear Windows Update Cache", "Empty Recycle Bin", "Clear DNS Cache",
+             "Clear Browser Caches", "Clear Thumbnail Caches", "Delete Crash Dumps", "Set High Performance Power Plan"]
+    runs = 5 * 365 * 24
+    now = time.time()
+    results = {"runs": runs, "task_rows": runs * len(tasks)}
+    with tempfile.TemporaryDirectory(prefix="sysopt-bench-") as directory:
+        history = history_utils.RunHistory(os.path.join(directory, "history.sqlite3"))
+        start = time.perf_counter()
+        with history.conn:
+            for i in range(runs):
+                started = now - (runs - i) * 3600
+                run_id = f"run{i}"
+                freed = [rng.randrange(1 << 30) for _ in tasks]
+                history.conn.execute("INSERT INTO runs (run_id, host, started_at, finished_at) VALUES (?, ?, ?, ?)",
+                                     (run_id, f"host{i % 3}", started, started + 60))
+                history.conn.executemany(
+                    "INSERT INTO tasks (run_id, task, host, started_at, wall_seconds, bytes_freed, result) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    [(run_id, task, f"host{i % 3}", started, rng.random() * 5, size, "ok") for task, size in zip(tasks, freed)])
+                history._add_to_week(started, f"host{i % 3}", sum(freed), 1)
+        results["populate_s"] = time.perf_counter() - start
+
+        queries = max(1, args.runs // 20)
+        results["bytes_freed_per_week"] = _time_calls(history.bytes_freed_per_week, queries)
+        results["bytes_freed_per_week_host"] = _time_calls(lambda: history.bytes_freed_per_week(host="host1"), queries)
+        results["recent_runs"] = _time_calls(history.recent_runs, queries)
+        results["task_history_90d"] = _time_calls(lambda: history.task_history("Clear DNS Cache", now - 90 * 86400), queries)
+        record = history_utils.RunHistory(os.path.join(directory, "history.sqlite3"))
+        results["record_run"] = _time_calls(lambda: record.record_run(f"new{rng.random()}", now, {task: "ok" for task in tasks}), queries)
+        record.close()
+
+        for kind, limit in (("csv", None), ("pdf", 2000)):
+            # A PDF page is built in memory by fpdf2, so only the newest rows go into the timed one.
+            since = 0.0 if limit is None else now - limit / len(tasks) * 3600
+            tracemalloc.start()
+            start = time.perf_counter()
+            try:
+                rows = history_utils.EXPORTERS[kind](history, os.path.join(directory, f"history.{kind}"), since)
+            except ImportError as e:
+                results[f"export_{kind}"] = f"skipped ({e})"
+                tracemalloc.stop()
+                continue
+            seconds = time.perf_counter() - start
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            results[f"export_{kind}"] = {"rows": rows, "export_s": seconds, "peak_memory_kb": peak / 1024}
+        history.close()
+    return results
+
+
+def bench_fleet(args):
+    """Local agent processes driven by the fleet controller: request round trips over reused
+    connections, a dry-run fan-out, duplicate requests joining one job and a burst of distinct jobs."""
+    import concurrent.futures
+
+    import agent_utils
+    import fleet_controller
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    results = {"agents": args.agents}
+    with tempfile.TemporaryDirectory(prefix="sysopt-bench-") as directory:
+        temp_root = os.path.join(directory, "temp")
+        _make_tree(temp_root, 2000, files_per_dir=args.files_per_dir, seed=args.seed)
+        agents = []
+        addresses = []
+        token = "bench-" + os.urandom(8).hex()
+        try:
+            for i in range(args.agents):
+                address = f"unix:{os.path.join(directory, f'agent{i}.sock')}" if sys.platform != "win32" else "127.0.0.1:0"
+                env = dict(os.environ, SYSOPT_DATA_DIR=os.path.join(directory, f"data{i}"), TEMP=temp_root, PYTHONUNBUFFERED="1",
+                           SYSOPT_AGENT_TOKEN=token)
+                agent = subprocess.Popen([sys.executable, os.path.join(here, "main.py"), "--agent", "--listen", address],
+                                         stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, env=env, text=True)
+                agents.append(agent)
+                line = agent.stdout.readline()
+                if not line.startswith("Agent listening on "):
+                    return {"error": f"agent {i} did not start: {line.strip()}"}
+                addresses.append(line[len("Agent listening on "):].split(" with ")[0])
+
+            controller = fleet_controller.FleetController(addresses, token)
+            try:
+                rounds = max(1, args.runs // 20)
+                results["ping_fanout"] = _time_calls(lambda: controller.send({"op": "ping"}), args.runs)
+                results["dry_run_fanout"] = _time_calls(lambda: controller.run("clean-temp", dry_run=True), rounds)
+
+                client = controller.clients[addresses[0]]
+                request = {"op": "run", "tasks": ["clean-temp"], "policy": {"min_age_hours": 0}, "dry_run": True}
+                with concurrent.futures.ThreadPoolExecutor(8) as pool:
+                    replies = list(pool.map(lambda _: client.request(request), range(8)))
+                results["duplicate_requests"] = len(replies)
+                results["duplicate_jobs_run"] = len({reply["job"] for reply in replies})
+
+                burst = [dict(request, policy={"min_size_bytes": i}) for i in range(4 * agent_utils.MAX_WORKERS)]
+                start = time.perf_counter()
+                with concurrent.futures.ThreadPoolExecutor(len(burst) * len(addresses)) as pool:
+                    replies = list(pool.map(lambda pair: controller.clients[pair[0]].request(pair[1]),
+                                            [(address, job) for address in addresses for job in burst]))
+                seconds = time.perf_counter() - start
+                results["burst_jobs"] = len(replies)
+                results["burst_s"] = seconds
+                results["burst_jobs_per_s"] = len(replies) / seconds
+                results["burst_failed"] = sum(1 for reply in replies if reply["event"] != "result")
+                results["connections_opened"] = controller.connects
+            finally:
+                controller.close()
+        finally:
+            for agent in agents:
+                agent.terminate()
+            for agent in agents:
+                agent.wait(10)
+    return results
+
+
+BENCHMARKS = {
+    "sampler": bench_sampler,
+    "cleanup": bench_cleanup,
+    "quarantine": bench_quarantine,
+    "watcher": bench_watcher,
+    "static_info": bench_static_info,
+    "backup": bench_backup,
+    "retry": bench_retry,
+    "scheduler": bench_scheduler,
+    "commands": bench_commands,
+    "imports": bench_imports,
+    "instrumentation": bench_instrumentation,
+    "policy": bench_policy,
+    "progress": bench_progress,
+    "listmodel": bench_listmodel,
+    "daemon": bench_daemon,
+    "processes": bench_processes,
+    "history": bench_history,
+    "fleet": bench_fleet,
+}
+
+
+# Timing leaves compared against the baseline; everything else (counts, reports) is context.
+TIMING_SUFFIXES = ("_ms", "_s", "ns_per_entry")
+# Tail latencies are reported but swing too much between runs to gate on.
+UNGATED_KEYS = ("p99_ms", "max_ms")
+
+
+def _timings(results, prefix=""):
+    """Flattens nested results into {"bench.key.sub": value} for the numeric timing leaves."""
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}.{key}" if prefix else key
+        if isinstance(value, dict):
+            flat.update(_timings(value, name))
+        elif (isinstance(value, (int, float)) and not isinstance(value, bool)
+              and key.endswith(TIMING_SUFFIXES) and key not in UNGATED_KEYS):
+            flat[name] = value
+    return flat
+
+
+def compare(results, baseline, tolerance, min_ms):
+    """Returns {metric: {"baseline", "current", "ratio", "regressed"}} for timings present in both runs.
+
+    A timing regresses when it is more than `tolerance` slower than the baseline; timings under
+    min_ms in both runs are too noisy to judge and never count.
+    """
+    current = _timings(results)
+    previous = _timings(baseline)
+    comparison = {}
+    for name in sorted(current.keys() & previous.keys()):
+        new, old = current[name], previous[name]
+        scale = 1000 if name.endswith("_s") else 1e-6 if name.endswith("ns_per_entry") else 1
+        ratio = new / old if old else float("inf")
+        noisy = max(new, old) * scale < min_ms
+        comparison[name] = {"baseline": old, "current": new, "ratio": ratio, "regressed": not noisy and ratio > 1 + tolerance}
+    return comparison
+
+
+def _metadata(args):
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    import platform
+    return {
+        "timestamp": time.time(),
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "args": {key: value for key, value in vars(args).items() if key not in ("output", "baseline", "save_baseline")},
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pro System Optimizer benchmarks")
+    parser.add_argument("names", nargs="*", help=f"benchmarks to run (default: all of {', '.join(BENCHMARKS)})")
+    parser.add_argument("--runs", type=int, default=200)
+    parser.add_argument("--files", type=int, default=20000, help="files in synthetic trees")
+    parser.add_argument("--files-per-dir", type=int, default=200)
+    parser.add_argument("--depth", type=int, default=2, help="directory levels in synthetic trees")
+    parser.add_argument("--file-size", type=int, default=512, help="bytes per file (the median for lognormal)")
+    parser.add_argument("--size-dist", choices=SIZE_DISTRIBUTIONS, default="fixed")
+    parser.add_argument("--unremovable", type=float, default=0.0, help="share of files that cannot be deleted (0-1)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--processes", type=int, default=1000, help="extra processes for the process benchmark")
+    parser.add_argument("--agents", type=int, default=4, help="local agent processes for the fleet benchmark")
+    parser.add_argument("--output", metavar="FILE", help="also write the results to FILE")
+    parser.add_argument("--baseline", metavar="FILE", help="compare timings against an earlier --output/--save-baseline file")
+    parser.add_argument("--save-baseline", metavar="FILE", help="store these results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown before a timing counts as a regression")
+    parser.add_argument("--min-ms", type=float, default=0.05, help="ignore timings below this in both runs")
+    args = parser.parse_args(argv)
+    unknown = [name for name in args.names if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"unknown benchmark(s): {', '.join(unknown)}")
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    results = {}
+    for name in args.names or BENCHMARKS:
+        results[name] = BENCHMARKS[name](args)
+    document = {"meta": _metadata(args), "results": results}
+
+    failed = False
+    for name, result in results.items():
+        for message in result.get("failures", []) if isinstance(result, dict) else ():
+            failed = True
+            print(f"FAILED {name}: {message}", file=sys.stderr)
+
+    regressions = []
+    if baseline is not None:
+        document["comparison"] = compare(results, baseline.get("results", baseline), args.tolerance, args.min_ms)
+        regressions = [name for name, entry in document["comparison"].items() if entry["regressed"]]
+        for name in regressions:
+            entry = document["comparison"][name]
+            print(f"REGRESSION {name}: {entry['baseline']:.4g} -> {entry['current']:.4g} ({entry['ratio']:.2f}x)", file=sys.stderr)
+
+    text = json.dumps(document, indent=2)
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(text + "\n")
+    print(text)
+    return 1 if regressions or failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
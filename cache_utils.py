@@ -0,0 +1,93 @@
+# cache_utils.py
+import json
+import platform
+import time
+
+import psutil
+
+import path_utils
+
+CACHE_VERSION = 1
+STATIC_INFO_CACHE_FILE = "static_info_cache.json"
+# Disk usage moves between any two starts; a change there alone does not redraw the static info.
+VOLATILE_DISK_FIELDS = ("used", "percent")
+
+cache_stats = {
+    "hits": 0,
+    "misses": 0,
+    "last_load_ms": None,
+    "last_refresh_ms": None,
+    "stale_fields": [],
+}
+
+
+def static_info_fingerprint():
+    """Cheap facts that change whenever the static info could have changed."""
+    return {
+        "version": CACHE_VERSION,
+        "platform": platform.platform(),
+        "boot_time": psutil.boot_time(),
+        "cpu_count": psutil.cpu_count(logical=True),
+        "partitions": [[p.device, p.mountpoint, p.fstype] for p in psutil.disk_partitions(all=False)],
+    }
+
+
+def load_static_info(fingerprint=None):
+    """Returns the cached static-info dict if its fingerprint still matches, else None."""
+    start = time.perf_counter()
+    fingerprint = fingerprint or static_info_fingerprint()
+    try:
+        with open(path_utils.data_file(STATIC_INFO_CACHE_FILE), "r") as f:
+            cached = json.load(f)
+    except (OSError, ValueError):
+        cached = None
+
+    data = None
+    if cached and cached.get("fingerprint") == fingerprint:
+        data = cached.get("data")
+    if data is None:
+        cache_stats["misses"] += 1
+    else:
+        cache_stats["hits"] += 1
+    cache_stats["last_load_ms"] = (time.perf_counter() - start) * 1000
+    return data
+
+
+def save_static_info(data, fingerprint=None):
+    payload = {"fingerprint": fingerprint or static_info_fingerprint(), "data": data}
+    try:
+        path_utils.atomic_write(path_utils.data_file(STATIC_INFO_CACHE_FILE), json.dumps(payload))
+    except OSError as e:
+        print(f"Could not write static info cache: {e}")
+
+
+def _stable(key, value):
+    """value without the fields of key that change on their own."""
+    if key == "disks" and isinstance(value, list):
+        return [{field: v for field, v in disk.items() if field not in VOLATILE_DISK_FIELDS} for disk in value]
+    return value
+
+
+def stale_fields(cached, fresh):
+    """Keys of fresh whose stable part differs from cached."""
+    return [key for key in fresh if _stable(key, cached.get(key)) != _stable(key, fresh[key])]
+
+
+def get_static_info_cached(collect, on_update):
+    """Calls on_update(data) with the cached dict immediately, then again after collect() refreshes it.
+
+    Meant to run on a background thread; collect is the slow get_static_info.
+    """
+    fingerprint = static_info_fingerprint()
+    cached = load_static_info(fingerprint)
+    if cached is not None:
+        on_update(cached)
+
+    start = time.perf_counter()
+    fresh = collect()
+    cache_stats["last_refresh_ms"] = (time.perf_counter() - start) * 1000
+    cache_stats["stale_fields"] = stale_fields(cached, fresh) if cached is not None else []
+    save_static_info(fresh, fingerprint)
+    if cached is None or cache_stats["stale_fields"]:
+        on_update(fresh)
+    return fresh
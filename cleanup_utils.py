@@ -0,0 +1,430 @@
+# cleanup_utils.py
+import errno
+import functools
+import os
+import stat
+import tempfile
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import instrumentation_utils
+
+DEFAULT_MAX_WORKERS = min(16, (os.cpu_count() or 1) * 2)
+CLEAN_BATCH_SIZE = 1024
+# Per-volume quarantine folder (see quarantine_utils). It can sit inside a cleaned root, e.g. a
+# drive root or a tmpfs /tmp, so every walk skips it.
+QUARANTINE_DIR = ".sysopt-quarantine"
+
+
+def default_temp_roots():
+    """Returns the user and system temp folders, falling back to the platform temp dir."""
+    roots = []
+    if os.environ.get('TEMP'):
+        roots.append(os.environ['TEMP'])
+    if os.environ.get('windir'):
+        roots.append(os.path.join(os.environ['windir'], 'Temp'))
+    if not roots:
+        roots.append(tempfile.gettempdir())
+
+    unique = []
+    seen = set()
+    for root in roots:
+        key = os.path.normcase(os.path.abspath(root))
+        if key not in seen:
+            seen.add(key)
+            unique.append(root)
+    return unique
+
+
+def format_size(num_bytes):
+    for unit in ("B", "KB", "MB", "GB"):
+        if abs(num_bytes) < 1024:
+            return f"{num_bytes:.0f} {unit}" if unit == "B" else f"{num_bytes:.2f} {unit}"
+        num_bytes /= 1024
+    return f"{num_bytes:.2f} TB"
+
+
+def _is_link_like(st):
+    """Symlinks and Windows junctions must be unlinked, never descended into."""
+    if stat.S_ISLNK(st.st_mode):
+        return True
+    attributes = getattr(st, "st_file_attributes", 0)
+    return bool(attributes & getattr(stat, "FILE_ATTRIBUTE_REPARSE_POINT", 0))
+
+
+class _Scope:
+    """The policy, per-root byte budget and reference time applied while walking one root."""
+
+    def __init__(self, root, policy):
+        self.root_len = len(root.rstrip("/\\")) + 1
+        self.policy = policy
+        self.budget = policy.budget_for(root)
+        self.now = time.time()
+
+    def allows(self, entry, st, is_dir):
+        relpath = entry.path[self.root_len:]
+        if is_dir:
+            return self.policy.allows_directory(entry.name, relpath)
+        return self.policy.allows_file(entry.name, relpath, st, self.now)
+
+
+def _clean_directory(path, scope=None, remove=os.unlink, on_failure=None):
+    """Removes (unlinks, or moves into quarantine) every file directly inside path that the scope
+    allows; returns counters and the (path, stat) of the subdirectories left to walk. Files that
+    could not be removed are passed to on_failure(path, size, mtime)."""
+    files_removed = bytes_freed = failures = 0
+    subdirs = []
+    try:
+        with os.scandir(path) as it:
+            for entry in it:
+                if entry.name == QUARANTINE_DIR:
+                    continue
+                try:
+                    # On Windows this stat comes from the directory listing itself, no extra syscall.
+                    st = entry.stat(follow_symlinks=False)
+                    is_dir = stat.S_ISDIR(st.st_mode) and not _is_link_like(st)
+                    if scope is not None and not scope.allows(entry, st, is_dir):
+                        continue
+                    if is_dir:
+                        subdirs.append((entry.path, st))
+                        continue
+                    size = st.st_size if stat.S_ISREG(st.st_mode) else 0
+                    if scope is not None and not scope.budget.take(size):
+                        continue
+                    try:
+                        remove(entry.path)
+                    except OSError:
+                        if scope is not None:
+                            scope.budget.refund(size)
+                        if on_failure is not None:
+                            on_failure(entry.path, size, st.st_mtime)
+                        raise
+                except OSError:
+                    failures += 1
+                else:
+                    files_removed += 1
+                    bytes_freed += size
+    except OSError:
+        failures += 1
+    return files_removed, bytes_freed, failures, subdirs
+
+
+def _remove_empty_directory(path):
+    try:
+        os.rmdir(path)
+    except OSError as e:
+        # A directory still holding locked files is already counted through those files.
+        return 0 if e.errno == errno.ENOTEMPTY else 1
+    return 0
+
+
+def _quarantine_entries(root, quarantine, totals, cancel_event):
+    """Moves each top-level entry of root into quarantine with one rename; returns the moved
+    directories and the (path, stat) of directories that could not be moved whole."""
+    moved_dirs = []
+    leftovers = []
+    try:
+        with os.scandir(root) as it:
+            entries = list(it)
+    except OSError:
+        totals["failures"] += 1
+        return moved_dirs, leftovers
+    for entry in entries:
+        if cancel_event is not None and cancel_event.is_set():
+            break
+        if entry.name == QUARANTINE_DIR:
+            continue
+        try:
+            st = entry.stat(follow_symlinks=False)
+        except OSError:
+            totals["failures"] += 1
+            continue
+        is_dir = stat.S_ISDIR(st.st_mode) and not _is_link_like(st)
+        try:
+            destination = quarantine.move(entry.path, totals)
+        except OSError:
+            # Typically a directory holding a locked file; its contents are moved one by one.
+            if is_dir:
+                leftovers.append((entry.path, st))
+            else:
+                totals["failures"] += 1
+            continue
+        if is_dir:
+            moved_dirs.append(destination)
+        else:
+            totals["files_removed"] += 1
+            totals["bytes_freed"] += st.st_size if stat.S_ISREG(st.st_mode) else 0
+    return moved_dirs, leftovers
+
+
+def _subtree_verdicts(path, scope, verdicts):
+    """Records in verdicts, for path and every directory below it, (allowed, files, bytes): whether
+    the scope allows removing all of it, and what that would remove. Only reads."""
+    allowed = True
+    items = total_bytes = 0
+    try:
+        with os.scandir(path) as it:
+            entries = list(it)
+    except OSError:
+        entries = []
+        allowed = False
+    for entry in entries:
+        if entry.name == QUARANTINE_DIR:
+            # Never moved along with its parent.
+            allowed = False
+            continue
+        try:
+            st = entry.stat(follow_symlinks=False)
+        except OSError:
+            allowed = False
+            continue
+        is_dir = stat.S_ISDIR(st.st_mode) and not _is_link_like(st)
+        if not scope.allows(entry, st, is_dir):
+            allowed = False
+        elif is_dir:
+            sub_allowed, sub_items, sub_bytes = _subtree_verdicts(entry.path, scope, verdicts)
+            allowed = allowed and sub_allowed and scope.policy.allows_directory_removal(st, scope.now)
+            items += sub_items
+            total_bytes += sub_bytes
+        else:
+            items += 1
+            total_bytes += st.st_size if stat.S_ISREG(st.st_mode) else 0
+    verdicts[path] = (allowed, items, total_bytes)
+    return verdicts[path]
+
+
+def _quarantine_subtree(path, st, scope, remove, verdict=None):
+    """Moves a directory into quarantine with one rename when the scope allows everything in it.
+    Returns (moved, files, bytes, verdicts); verdicts holds what was learnt about the directories
+    below path (empty when verdict was already known), so the caller need not walk them again."""
+    verdicts = {}
+    if verdict is None:
+        verdict = _subtree_verdicts(path, scope, verdicts)
+    allowed, items, total_bytes = verdict
+    if allowed and scope.policy.allows_directory_removal(st, scope.now) and scope.budget.take(total_bytes):
+        try:
+            remove(path)
+            return True, items, total_bytes, verdicts
+        except OSError:
+            # Typically a locked file somewhere below; its contents are moved one by one instead.
+            scope.budget.refund(total_bytes)
+    return False, 0, 0, verdicts
+
+
+def clean_roots(roots, max_workers=DEFAULT_MAX_WORKERS, on_progress=None, cancel_event=None, policy=None, quarantine=None, on_failure=None):
+    """Deletes the contents of each root (but not the root itself) using a bounded thread pool.
+
+    With a policy_utils.Policy only the files it allows are deleted, excluded directories
+    are skipped whole and each root stops at its byte cap. Setting cancel_event stops the
+    walk from descending into further directories. With a quarantine_utils.Quarantine
+    nothing is deleted: without a policy each top-level entry is renamed into it whole,
+    with a policy each directory the policy allows entirely is, and the allowed files of
+    the remaining directories are renamed one by one. Files that cannot be removed
+    (typically locked) are reported to on_failure(path, size, mtime) from the worker threads.
+
+    Returns {root: {"files_removed": int, "bytes_freed": int, "failures": int}}, plus
+    "copied_bytes" and "copy_seconds" when quarantining had to copy across volumes.
+    """
+    results = {}
+    scopes = {}
+    directories = []
+    removers = {}
+    verdicts = {}
+    whole_moves = quarantine is not None and policy is not None
+    # Pool threads do not run in the caller's context; these count their CPU toward its span.
+    clean_directory = instrumentation_utils.pool_cpu(_clean_directory)
+    quarantine_subtree = instrumentation_utils.pool_cpu(_quarantine_subtree)
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        pending = {}
+
+        def submit_directory(path, root, depth, st):
+            if whole_moves:
+                # Checked first; see below for what happens when it cannot be moved whole.
+                future = pool.submit(quarantine_subtree, path, st, scopes[root], removers[root], verdicts.get(path))
+                pending[future] = (root, depth, (path, st))
+            else:
+                directories.append((depth, path, root, st))
+                pending[pool.submit(clean_directory, path, scopes[root], removers[root], on_failure)] = (root, depth, None)
+
+        for root in roots:
+            results[root] = {"files_removed": 0, "bytes_freed": 0, "failures": 0}
+            scopes[root] = _Scope(root, policy) if policy is not None else None
+            removers[root] = functools.partial(quarantine.move, stats=results[root]) if quarantine is not None else os.unlink
+            remove = removers[root]
+            if not root or not os.path.isdir(root):
+                continue
+            if quarantine is not None and policy is None:
+                moved_dirs, leftovers = _quarantine_entries(root, quarantine, results[root], cancel_event)
+                if moved_dirs:
+                    moved = scan_roots(moved_dirs, max_workers=max_workers)
+                    results[root]["files_removed"] += moved["items"]
+                    results[root]["bytes_freed"] += moved["bytes"]
+                for path, st in leftovers:
+                    submit_directory(path, root, 0, st)
+            else:
+                pending[pool.submit(clean_directory, root, scopes[root], remove, on_failure)] = (root, 0, None)
+
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                root, depth, checked = pending.pop(future)
+                totals = results[root]
+                if checked is not None:
+                    moved, files_moved, bytes_moved, learnt = future.result()
+                    verdicts.update(learnt)
+                    if moved:
+                        totals["files_removed"] += files_moved
+                        totals["bytes_freed"] += bytes_moved
+                    elif cancel_event is None or not cancel_event.is_set():
+                        path, st = checked
+                        directories.append((depth, path, root, st))
+                        pending[pool.submit(clean_directory, path, scopes[root], removers[root], on_failure)] = (root, depth, None)
+                    continue
+                files_removed, bytes_freed, failures, subdirs = future.result()
+                totals["files_removed"] += files_removed
+                totals["bytes_freed"] += bytes_freed
+                totals["failures"] += failures
+                if cancel_event is not None and cancel_event.is_set():
+                    continue
+                for subdir, st in subdirs:
+                    submit_directory(subdir, root, depth + 1, st)
+            if on_progress:
+                on_progress(results)
+
+        # Remove the now-empty directories deepest level first; each level runs in parallel.
+        # Age is judged from the stat taken before their contents were deleted.
+        by_depth = {}
+        for depth, path, root, st in directories:
+            scope = scopes[root]
+            if scope is None or scope.policy.allows_directory_removal(st, scope.now):
+                by_depth.setdefault(depth, []).append((path, root))
+        for depth in sorted(by_depth, reverse=True):
+            level = by_depth[depth]
+            for (path, root), failed in zip(level, pool.map(instrumentation_utils.pool_cpu(_remove_empty_directory), [p for p, _ in level])):
+                results[root]["failures"] += failed
+
+    if quarantine is not None:
+        for totals in results.values():
+            quarantine.count(totals["files_removed"], totals["bytes_freed"])
+    return results
+
+
+def _unlink(path, remove=os.unlink):
+    try:
+        remove(path)
+    except FileNotFoundError:
+        return None
+    except OSError:
+        return False
+    return True
+
+
+def clean_files(candidates, max_workers=DEFAULT_MAX_WORKERS, cancel_event=None, quarantine=None, on_failure=None):
+    """Deletes (or quarantines) known (path, size) candidates directly, without walking any directory.
+
+    Files that vanished in the meantime are neither counted as removed nor as failures; the
+    ones that could not be removed are passed to on_failure(path, size).
+    Returns {"files_removed": int, "bytes_freed": int, "failures": int}.
+    """
+    totals = {"files_removed": 0, "bytes_freed": 0, "failures": 0}
+    remove = functools.partial(quarantine.move, stats=totals) if quarantine is not None else os.unlink
+    unlink = instrumentation_utils.pool_cpu(_unlink)
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        # Batches keep cancellation responsive; pool.map would queue every unlink up front.
+        for start in range(0, len(candidates), CLEAN_BATCH_SIZE):
+            if cancel_event is not None and cancel_event.is_set():
+                break
+            batch = candidates[start:start + CLEAN_BATCH_SIZE]
+            paths = [path for path, _ in batch]
+            for (path, size), removed in zip(batch, pool.map(unlink, paths, [remove] * len(paths))):
+                if removed:
+                    totals["files_removed"] += 1
+                    totals["bytes_freed"] += size
+                elif removed is False:
+                    totals["failures"] += 1
+                    if on_failure is not None:
+                        on_failure(path, size)
+    if quarantine is not None:
+        quarantine.count(totals["files_removed"], totals["bytes_freed"])
+    return totals
+
+
+def _scan_directory(path, scope=None, collect=False):
+    """Read-only counterpart of _clean_directory: sizes the files directly inside path, and
+    with collect also lists them as (size, path)."""
+    items = total_bytes = 0
+    subdirs = []
+    files = [] if collect else None
+    try:
+        with os.scandir(path) as it:
+            for entry in it:
+                if entry.name == QUARANTINE_DIR:
+                    continue
+                try:
+                    st = entry.stat(follow_symlinks=False)
+                except OSError:
+                    continue
+                is_dir = stat.S_ISDIR(st.st_mode) and not _is_link_like(st)
+                if scope is not None and not scope.allows(entry, st, is_dir):
+                    continue
+                if is_dir:
+                    subdirs.append(entry.path)
+                    continue
+                size = st.st_size if stat.S_ISREG(st.st_mode) else 0
+                if scope is not None and not scope.budget.take(size):
+                    continue
+                items += 1
+                total_bytes += size
+                if collect:
+                    files.append((size, entry.path))
+    except OSError:
+        pass
+    return items, total_bytes, subdirs, files
+
+
+def scan_roots(roots, budget_bytes=None, max_workers=DEFAULT_MAX_WORKERS, on_progress=None, progress_interval=0.25, policy=None,
+               on_files=None):
+    """Sizes what clean_roots would delete (under the same policy) without touching anything.
+
+    Stops early once budget_bytes is reached. on_progress(items, bytes) is called at most
+    every progress_interval seconds while walking; on_files([(size, path)]) gets the files
+    found, one directory at a time. Returns {"items", "bytes", "complete"}.
+    """
+    collect = on_files is not None
+    items = total_bytes = 0
+    complete = True
+    last_report = time.monotonic()
+    scan_directory = instrumentation_utils.pool_cpu(_scan_directory)
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        pending = {}
+        for root in roots:
+            if root and os.path.isdir(root):
+                scope = _Scope(root, policy) if policy is not None else None
+                pending[pool.submit(scan_directory, root, scope, collect)] = scope
+
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                scope = pending.pop(future)
+                dir_items, dir_bytes, subdirs, files = future.result()
+                items += dir_items
+                total_bytes += dir_bytes
+                if files:
+                    on_files(files)
+                for subdir in subdirs:
+                    pending[pool.submit(scan_directory, subdir, scope, collect)] = scope
+
+            if budget_bytes is not None and total_bytes >= budget_bytes:
+                complete = False
+                for future in pending:
+                    future.cancel()
+                break
+
+            now = time.monotonic()
+            if on_progress and now - last_report >= progress_interval:
+                last_report = now
+                on_progress(items, total_bytes)
+
+    if on_progress:
+        on_progress(items, total_bytes)
+    return {"items": items, "bytes": total_bytes, "complete": complete}
@@ -0,0 +1,128 @@
+# cli_utils.py
+import os
+import sys
+import threading
+
+
+def parse_task_keys(spec, known):
+    if not spec:
+        return []
+    if spec.strip().lower() == "all":
+        return list(known)
+    keys = [key.strip() for key in spec.split(",") if key.strip()]
+    unknown = [key for key in keys if key not in known]
+    if unknown:
+        raise ValueError(f"Unknown optimization(s): {', '.join(unknown)}. Use --list to see the available keys.")
+    return keys
+
+
+def _print_progress(message):
+    print(f"... {message}", flush=True)
+
+
+def run(args, admin):
+    """Entry point for `main.py --headless`; returns the process exit code."""
+    import cleanup_utils
+    import system_utils
+
+    if args.list:
+        system_utils.load_plugins()
+        for key, (label, _) in system_utils.OPTIMIZATIONS.items():
+            print(f"{key:<16} {label}")
+        return 0
+
+    if args.undo:
+        import quarantine_utils
+        totals = quarantine_utils.restore_run(None if args.undo == "latest" else args.undo)
+        if totals is None:
+            print("Nothing in quarantine to restore.", file=sys.stderr)
+            return 1
+        print(f"Restored {totals['restored']} item(s); {totals['conflicts']} already existed, {totals['failures']} failed.")
+        return 0 if not totals["failures"] else 1
+
+    if args.restore_points or args.restore_settings:
+        import backup_utils
+        if args.restore_points:
+            for run in backup_utils.restore_points():
+                print(f"{run['run_id']:<34} {backup_utils.describe_restore_point(run)}")
+            return 0
+        ok = backup_utils.restore_critical_settings(None if args.restore_settings == "latest" else args.restore_settings)
+        return 0 if ok else 1
+
+    if args.export_history:
+        import history_utils
+        kind = os.path.splitext(args.export_history)[1].lower().lstrip(".")
+        if kind not in history_utils.EXPORTERS:
+            print(f"Unsupported report format '{kind}': use .csv or .pdf.", file=sys.stderr)
+            return 2
+        history = history_utils.RunHistory()
+        try:
+            rows = history_utils.EXPORTERS[kind](history, args.export_history)
+        except (ImportError, OSError) as e:
+            print(f"Could not export the run history: {e}", file=sys.stderr)
+            return 1
+        finally:
+            history.close()
+        print(f"Exported {rows} row(s) to {args.export_history}")
+        return 0
+
+    if args.quarantine:
+        system_utils.QUARANTINE_DELETIONS = True
+    if args.hardlink_duplicates:
+        system_utils.HARDLINK_DUPLICATES = True
+
+    system_utils.load_plugins()
+    try:
+        keys = parse_task_keys(args.run, system_utils.OPTIMIZATIONS)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 2
+    if not keys:
+        print("Nothing to do: pass --run with one or more optimization keys.", file=sys.stderr)
+        return 2
+
+    if args.scan:
+        for key in keys:
+            label, func = system_utils.OPTIMIZATIONS[key]
+            scanner = system_utils.SCANNERS.get(func)
+            if scanner is None:
+                print(f"{label}: nothing to scan")
+                continue
+            try:
+                result = scanner()
+            except Exception as e:
+                print(f"{label}: scan failed: {e}")
+                continue
+            prefix = "" if result["complete"] else "over "
+            print(f"{label}: {prefix}{cleanup_utils.format_size(result['bytes'])} in {result['items']} item(s)")
+        return 0
+
+    if not admin:
+        print("Warning: not running with administrator privileges; some optimizations may fail.", file=sys.stderr)
+
+    done = threading.Event()
+    outcome = {}
+
+    def on_complete(before, after, results):
+        outcome.update(results)
+        done.set()
+
+    cancel_event = threading.Event()
+    thread = system_utils.run_optimizations({system_utils.OPTIMIZATIONS[key][0]: system_utils.OPTIMIZATIONS[key][1] for key in keys},
+                                            _print_progress, on_complete, cancel_event=cancel_event)
+    while not done.is_set() and thread.is_alive():
+        try:
+            done.wait(0.5)
+        except KeyboardInterrupt:
+            print("Cancelling...", file=sys.stderr, flush=True)
+            cancel_event.set()
+    if not done.is_set():
+        print("The run stopped before reporting its results.", file=sys.stderr)
+        return 1
+
+    import scheduler_utils
+    failed = False
+    for name, result in outcome.items():
+        print(f"{name}: {result}")
+        failed = failed or isinstance(result, scheduler_utils.FailedResult)
+    return 1 if failed else 0
@@ -0,0 +1,129 @@
+# command_utils.py
+import contextlib
+import contextvars
+import locale
+import re
+import subprocess
+import threading
+
+DEFAULT_TIMEOUT = 300
+CANCEL_POLL_INTERVAL = 0.1
+READ_CHUNK = 4096
+
+_cancel_event = contextvars.ContextVar("sysopt_cancel_event", default=None)
+
+
+class CommandCancelled(Exception):
+    pass
+
+
+@contextlib.contextmanager
+def cancel_scope(event):
+    """Makes event the cancellation signal for commands started in this context."""
+    token = _cancel_event.set(event)
+    try:
+        yield event
+    finally:
+        _cancel_event.reset(token)
+
+
+def current_cancel_event():
+    return _cancel_event.get()
+
+
+class CommandRunner:
+    """Runs external commands on a private asyncio loop so worker threads can time out or cancel them."""
+
+    def __init__(self):
+        self._loop = None
+        self._lock = threading.Lock()
+
+    def _ensure_loop(self):
+        with self._lock:
+            if self._loop is None:
+                import asyncio
+                # On Windows the default loop is the Proactor loop, which supports subprocesses.
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, name="CommandRunner", daemon=True).start()
+            return self._loop
+
+    async def _read_lines(self, stream, on_line, lines):
+        encoding = locale.getpreferredencoding(False)
+        pending = ""
+        while True:
+            chunk = await stream.read(READ_CHUNK)
+            if not chunk:
+                break
+            # Progress-style tools (defrag) rewrite one line with \r instead of emitting \n.
+            parts = re.split(r"[\r\n]+", pending + chunk.decode(encoding, errors="replace"))
+            pending = parts.pop()
+            for line in parts:
+                lines.append(line)
+                if on_line and line.strip():
+                    on_line(line)
+        if pending:
+            lines.append(pending)
+            if on_line and pending.strip():
+                on_line(pending)
+
+    async def _wait_cancelled(self, event):
+        import asyncio
+        while not event.is_set():
+            await asyncio.sleep(CANCEL_POLL_INTERVAL)
+
+    async def _run(self, args, timeout, on_line, cancel_event, popen_kwargs):
+        import asyncio
+        proc = await asyncio.create_subprocess_exec(
+            *args, stdin=asyncio.subprocess.DEVNULL, stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE, **popen_kwargs)
+        stdout_lines = []
+        stderr_lines = []
+        finished = asyncio.ensure_future(asyncio.gather(
+            self._read_lines(proc.stdout, on_line, stdout_lines),
+            self._read_lines(proc.stderr, None, stderr_lines),
+            proc.wait()))
+        waiters = {finished}
+        cancel_waiter = None
+        if cancel_event is not None:
+            cancel_waiter = asyncio.ensure_future(self._wait_cancelled(cancel_event))
+            waiters.add(cancel_waiter)
+
+        done, _ = await asyncio.wait(waiters, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+        if cancel_waiter is not None:
+            cancel_waiter.cancel()
+        if finished not in done:
+            with contextlib.suppress(ProcessLookupError):
+                proc.kill()
+            await proc.wait()
+            finished.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await finished
+            if cancel_waiter is not None and cancel_waiter in done:
+                raise CommandCancelled(f"Command cancelled: {' '.join(args)}")
+            raise subprocess.TimeoutExpired(list(args), timeout, "\n".join(stdout_lines), "\n".join(stderr_lines))
+
+        return subprocess.CompletedProcess(list(args), proc.returncode, "\n".join(stdout_lines), "\n".join(stderr_lines))
+
+    def run(self, args, timeout=DEFAULT_TIMEOUT, on_line=None, check=False, cancellable=True, **popen_kwargs):
+        """Blocking call for worker threads; never call it from the runner's own loop.
+
+        on_line(str) receives stdout lines as they arrive. Raises subprocess.TimeoutExpired,
+        CommandCancelled when the context's cancel event fires, or CalledProcessError if check.
+        """
+        cancel_event = current_cancel_event() if cancellable else None
+        if cancel_event is not None and cancel_event.is_set():
+            raise CommandCancelled(f"Command cancelled: {' '.join(args)}")
+        import asyncio
+        future = asyncio.run_coroutine_threadsafe(
+            self._run(args, timeout, on_line, cancel_event, popen_kwargs), self._ensure_loop())
+        result = future.result()
+        if check and result.returncode != 0:
+            raise subprocess.CalledProcessError(result.returncode, result.args, result.stdout, result.stderr)
+        return result
+
+
+runner = CommandRunner()
+
+
+def run_command(args, **kwargs):
+    return runner.run(args, **kwargs)
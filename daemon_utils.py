@@ -0,0 +1,318 @@
+# daemon_utils.py
+import ctypes
+import json
+import sys
+import threading
+import time
+
+import path_utils
+import throttle_utils
+
+CONFIG_FILE = "daemon.json"
+STATE_FILE = "daemon_state.json"
+MB = 1024 * 1024
+
+DEFAULT_CONFIG = {
+    "tasks": ["clean-temp", "recycle-bin", "dns"],
+    "interval_hours": 24,
+    "poll_seconds": 5,
+    # Load has to stay below the limits this long before a run starts or resumes.
+    "settle_seconds": 120,
+    "input_idle_seconds": 300,
+    # Limits on everything except our own processes.
+    "max_cpu_percent": 25,
+    "max_disk_mb_s": 5,
+    # Budget for the disk I/O of the run itself.
+    "max_io_mb_s": 20,
+    "max_duration_minutes": 30,
+}
+
+WAIT = "wait"
+START = "start"
+PAUSE = "pause"
+RESUME = "resume"
+STOP = "stop"
+
+
+def load_config(path=None):
+    """Reads daemon.json from the data directory, filling in DEFAULT_CONFIG for missing keys."""
+    path = path or path_utils.data_file(CONFIG_FILE)
+    config = dict(DEFAULT_CONFIG)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            config.update(json.load(f))
+    except FileNotFoundError:
+        pass
+    except (OSError, ValueError) as e:
+        print(f"Could not read daemon config {path}: {e}. Using the defaults.")
+    return config
+
+
+class IdleScheduler:
+    """Decides when a background run starts, pauses, resumes and stops.
+
+    It never reads the clock or the system itself: step(now, load) gets both from the caller,
+    so it can be driven by a simulated clock and a recorded load trace. load holds
+    "cpu_percent" and "disk_mb_s" of other processes, the run's own "own_io_mb_s" and
+    "input_idle_seconds" (None where unknown).
+    """
+
+    def __init__(self, config, last_run=None):
+        self.config = config
+        self.last_run = last_run
+        self.state = "idle"
+        self.started = None
+        self.quiet_since = None
+        self.resume_at = None
+
+    def is_quiet(self, load):
+        config = self.config
+        idle = load.get("input_idle_seconds")
+        return (load["cpu_percent"] <= config["max_cpu_percent"]
+                and load["disk_mb_s"] <= config["max_disk_mb_s"]
+                and (idle is None or idle >= config["input_idle_seconds"]))
+
+    def is_due(self, now):
+        return self.last_run is None or now - self.last_run >= self.config["interval_hours"] * 3600
+
+    def step(self, now, load):
+        config = self.config
+        if self.is_quiet(load):
+            if self.quiet_since is None:
+                self.quiet_since = now
+        else:
+            self.quiet_since = None
+        settled = self.quiet_since is not None and now - self.quiet_since >= config["settle_seconds"]
+
+        if self.state == "idle":
+            if self.is_due(now) and settled:
+                self.state = "running"
+                self.started = now
+                return START
+            return WAIT
+
+        if now - self.started >= config["max_duration_minutes"] * 60:
+            self.finished(now)
+            return STOP
+
+        if self.state == "running":
+            if self.quiet_since is None:
+                self.state = "paused"
+                return PAUSE
+            own_io = load.get("own_io_mb_s", 0)
+            if own_io > config["max_io_mb_s"]:
+                # Duty-cycle the run: pausing for this long brings the average back to the budget.
+                self.state = "throttled"
+                self.resume_at = now + config["poll_seconds"] * (own_io / config["max_io_mb_s"] - 1)
+                return PAUSE
+            return WAIT
+
+        if self.state == "throttled":
+            if self.quiet_since is None:
+                self.state = "paused"
+            elif now >= self.resume_at:
+                self.state = "running"
+                return RESUME
+            return WAIT
+
+        # paused by load from other processes or the user
+        if settled:
+            self.state = "running"
+            return RESUME
+        return WAIT
+
+    def finished(self, now):
+        self.state = "idle"
+        self.last_run = now
+        self.started = None
+
+
+def input_idle_seconds():
+    """Seconds since the last keyboard or mouse input, or None where this cannot be measured."""
+    if sys.platform != "win32":
+        return None
+
+    class LASTINPUTINFO(ctypes.Structure):
+        _fields_ = [("cbSize", ctypes.c_uint), ("dwTime", ctypes.c_uint)]
+
+    info = LASTINPUTINFO()
+    info.cbSize = ctypes.sizeof(info)
+    if not ctypes.windll.user32.GetLastInputInfo(ctypes.byref(info)):
+        return None
+    return ((ctypes.windll.kernel32.GetTickCount() - info.dwTime) & 0xFFFFFFFF) / 1000
+
+
+class SystemLoadProbe:
+    """Measures system CPU and disk load with this process tree's own share taken out."""
+
+    def __init__(self):
+        import psutil
+
+        import monitor_utils
+        self._psutil = psutil
+        # Sampled on the daemon thread; psutil's own non-blocking baseline is per thread.
+        self._cpu = monitor_utils.CpuMeter()
+        self._process = psutil.Process()
+        self._processes = {}
+        self._io = {}
+        self._last_time = None
+        self._last_disk = None
+
+    def _own_processes(self):
+        try:
+            current = [self._process] + self._process.children(recursive=True)
+        except self._psutil.Error:
+            current = [self._process]
+        # Keep the Process objects so cpu_percent() measures since the previous sample.
+        processes = {}
+        for process in current:
+            processes[process.pid] = self._processes.get(process.pid, process)
+        self._processes = processes
+        return processes.values()
+
+    def sample(self):
+        psutil = self._psutil
+        now = time.monotonic()
+        cpu = self._cpu.percent()
+        own_cpu = 0.0
+        own_io = 0
+        io = {}
+        for process in self._own_processes():
+            try:
+                own_cpu += process.cpu_percent(interval=None)
+                counters = process.io_counters()
+            except psutil.Error:
+                continue
+            total = counters.read_bytes + counters.write_bytes
+            io[process.pid] = total
+            own_io += max(0, total - self._io.get(process.pid, total if self._last_time is None else 0))
+        self._io = io
+        counters = psutil.disk_io_counters()
+        disk = counters.read_bytes + counters.write_bytes if counters else 0
+
+        elapsed = now - self._last_time if self._last_time is not None else 0
+        disk_delta = disk - self._last_disk if self._last_disk is not None else 0
+        self._last_time = now
+        self._last_disk = disk
+        return {
+            "cpu_percent": max(0.0, cpu - own_cpu / (psutil.cpu_count() or 1)),
+            "disk_mb_s": max(0, disk_delta - own_io) / MB / elapsed if elapsed else 0.0,
+            "own_io_mb_s": own_io / MB / elapsed if elapsed else 0.0,
+            "input_idle_seconds": input_idle_seconds(),
+        }
+
+
+def lower_priority():
+    """Drops this process (and the commands it starts) to idle CPU and I/O priority."""
+    import psutil
+    process = psutil.Process()
+    try:
+        if sys.platform == "win32":
+            process.nice(psutil.IDLE_PRIORITY_CLASS)
+            process.ionice(psutil.IOPRIO_VERYLOW)
+        else:
+            process.nice(19)
+            process.ionice(psutil.IOPRIO_CLASS_IDLE)
+    except (psutil.Error, OSError, AttributeError) as e:
+        print(f"Could not lower process priority: {e}")
+
+
+def _load_last_run():
+    try:
+        with open(path_utils.data_file(STATE_FILE), "r", encoding="utf-8") as f:
+            return json.load(f).get("last_run")
+    except (OSError, ValueError):
+        return None
+
+
+def _save_last_run(timestamp):
+    try:
+        path_utils.atomic_write(path_utils.data_file(STATE_FILE), json.dumps({"last_run": timestamp}))
+    except OSError as e:
+        print(f"Could not save daemon state: {e}")
+
+
+class Daemon:
+    """Runs the configured optimizations through run_optimizations whenever the machine is quiet."""
+
+    def __init__(self, config=None, probe=None):
+        self.config = config or load_config()
+        self.probe = probe or SystemLoadProbe()
+        self.scheduler = IdleScheduler(self.config, last_run=_load_last_run())
+        self.throttle = None
+        self.cancel_event = None
+        self._thread = None
+        self._active = False
+
+    def _start(self, system_utils):
+        system_utils.load_plugins()
+        tasks = {}
+        for key in self.config["tasks"]:
+            if key in system_utils.OPTIMIZATIONS:
+                label, func = system_utils.OPTIMIZATIONS[key]
+                tasks[label] = func
+            else:
+                print(f"Unknown optimization in daemon config: {key}")
+
+        def on_complete(before, after, results):
+            for name, result in results.items():
+                print(f"{name}: {result}", flush=True)
+
+        self.throttle = throttle_utils.Throttle()
+        self.cancel_event = threading.Event()
+        self._active = True
+        self._thread = system_utils.run_optimizations(tasks, lambda message: print(f"... {message}", flush=True), on_complete,
+                                                      cancel_event=self.cancel_event, throttle=self.throttle)
+
+    def _reap(self, now):
+        """Ends the run once its thread is gone, whether it completed or died on an exception."""
+        if self._active and not self._thread.is_alive():
+            self._active = False
+            self.scheduler.finished(now)
+            _save_last_run(self.scheduler.last_run)
+
+    def run(self, stop_event):
+        import system_utils
+
+        lower_priority()
+        system_utils.resume_locked_file_retries()
+        while not stop_event.is_set():
+            now = time.time()
+            action = self.scheduler.step(now, self.probe.sample())
+            if action == START and not self._active:
+                print("Machine is idle: starting background optimizations.", flush=True)
+                self._start(system_utils)
+            elif action == PAUSE and self._active:
+                print("Load is up: pausing.", flush=True)
+                self.throttle.pause()
+            elif action == RESUME and self._active:
+                print("Resuming.", flush=True)
+                self.throttle.resume()
+            elif action == STOP and self._active:
+                print("Time budget used up: stopping.", flush=True)
+                self.cancel_event.set()
+                self.throttle.resume()
+
+            self._reap(time.time())
+            stop_event.wait(self.config["poll_seconds"])
+
+        if self._active:
+            self.cancel_event.set()
+            self.throttle.resume()
+            self._thread.join(60)
+
+
+def main():
+    """Entry point for `main.py --daemon`; runs until interrupted."""
+    stop_event = threading.Event()
+    daemon = Daemon()
+    print(f"Background optimizer running ({', '.join(daemon.config['tasks'])}); press Ctrl+C to stop.", flush=True)
+    thread = threading.Thread(target=daemon.run, args=(stop_event,), name="Daemon", daemon=True)
+    thread.start()
+    while thread.is_alive():
+        try:
+            thread.join(0.5)
+        except KeyboardInterrupt:
+            print("Stopping...", file=sys.stderr, flush=True)
+            stop_event.set()
+    return 0
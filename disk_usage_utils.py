@@ -0,0 +1,178 @@
+# disk_usage_utils.py
+import os
+import sqlite3
+import stat
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import path_utils
+
+INDEX_FILE = "disk_index.sqlite3"
+LARGE_FILE_SIZE = 10 * 1024 * 1024
+DEFAULT_MAX_WORKERS = min(16, (os.cpu_count() or 1) * 2)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS dirs (
+    path TEXT PRIMARY KEY,
+    parent TEXT,
+    mtime_ns INTEGER NOT NULL,
+    own_size INTEGER NOT NULL,
+    own_files INTEGER NOT NULL,
+    total_size INTEGER NOT NULL DEFAULT 0,
+    total_files INTEGER NOT NULL DEFAULT 0,
+    scan_id INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS dirs_parent ON dirs(parent);
+CREATE INDEX IF NOT EXISTS dirs_total_size ON dirs(total_size);
+CREATE TABLE IF NOT EXISTS large_files (
+    path TEXT PRIMARY KEY,
+    dir TEXT NOT NULL,
+    size INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS large_files_dir ON large_files(dir);
+CREATE INDEX IF NOT EXISTS large_files_size ON large_files(size);
+"""
+
+
+def _is_link_like(st):
+    if stat.S_ISLNK(st.st_mode):
+        return True
+    return bool(getattr(st, "st_file_attributes", 0) & getattr(stat, "FILE_ATTRIBUTE_REPARSE_POINT", 0))
+
+
+def _scan_directory(path, cached_mtime, large_file_size):
+    """Returns (mtime_ns, own_size, own_files, subdirs, large_files), or subdirs=None when the
+    directory's mtime matches the index and its own entries can be reused."""
+    st = os.stat(path)
+    if cached_mtime == st.st_mtime_ns:
+        return st.st_mtime_ns, None, None, None, None
+
+    own_size = own_files = 0
+    subdirs = []
+    large_files = []
+    with os.scandir(path) as it:
+        for entry in it:
+            try:
+                entry_stat = entry.stat(follow_symlinks=False)
+            except OSError:
+                continue
+            if stat.S_ISDIR(entry_stat.st_mode):
+                if not _is_link_like(entry_stat):
+                    subdirs.append(entry.path)
+            elif stat.S_ISREG(entry_stat.st_mode):
+                own_size += entry_stat.st_size
+                own_files += 1
+                if entry_stat.st_size >= large_file_size:
+                    large_files.append((entry.path, path, entry_stat.st_size))
+    return st.st_mtime_ns, own_size, own_files, subdirs, large_files
+
+
+class DiskIndex:
+    """Per-directory size index stored in SQLite and refreshed incrementally by directory mtime.
+
+    A directory's mtime only changes when entries are added, removed or renamed, so files
+    that grow in place are picked up on the next full=True rescan.
+    """
+
+    def __init__(self, db_path=None):
+        self.db_path = db_path or path_utils.data_file(INDEX_FILE)
+        self.conn = sqlite3.connect(self.db_path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    @staticmethod
+    def _subtree_clause(root):
+        prefix = root.rstrip("/\\") + os.sep
+        return "(path = ? OR (path >= ? AND path < ?))", (root, prefix, prefix[:-1] + chr(ord(os.sep) + 1))
+
+    def analyze(self, root, full=False, max_workers=DEFAULT_MAX_WORKERS, large_file_size=LARGE_FILE_SIZE, on_progress=None):
+        """Walks root in parallel, reusing index rows of unchanged directories. Returns scan stats."""
+        root = os.path.abspath(root)
+        start = time.perf_counter()
+        clause, params = self._subtree_clause(root)
+        cached = {}
+        children = {}
+        if not full:
+            for path, parent, mtime_ns, own_size, own_files in self.conn.execute(
+                    f"SELECT path, parent, mtime_ns, own_size, own_files FROM dirs WHERE {clause}", params):
+                cached[path] = (mtime_ns, own_size, own_files)
+                children.setdefault(parent, []).append(path)
+
+        scan_id = time.time_ns()
+        rows = []
+        large_files = []
+        rescanned = []
+        reused = 0
+        # Keep the real parent even for the scan root so a later scan of an ancestor still finds it.
+        parents = {root: os.path.dirname(root) if os.path.dirname(root) != root else None}
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            pending = {pool.submit(_scan_directory, root, cached.get(root, (None,))[0], large_file_size): root}
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    path = pending.pop(future)
+                    try:
+                        mtime_ns, own_size, own_files, subdirs, dir_large_files = future.result()
+                    except OSError:
+                        continue
+                    if subdirs is None:
+                        _, own_size, own_files = cached[path]
+                        subdirs = children.get(path, [])
+                        reused += 1
+                    else:
+                        rescanned.append(path)
+                        large_files.extend(dir_large_files)
+                    rows.append((path, parents[path], mtime_ns, own_size, own_files, scan_id))
+                    for subdir in subdirs:
+                        parents[subdir] = path
+                        pending[pool.submit(_scan_directory, subdir, cached.get(subdir, (None,))[0], large_file_size)] = subdir
+                if on_progress:
+                    on_progress(len(rows))
+
+        totals = self._aggregate(rows)
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO dirs (path, parent, mtime_ns, own_size, own_files, total_size, total_files, scan_id) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                ((path, parent, mtime_ns, own_size, own_files, *totals[path], scan_id)
+                 for path, parent, mtime_ns, own_size, own_files, scan_id in rows))
+            self.conn.execute(f"DELETE FROM dirs WHERE {clause} AND scan_id != ?", (*params, scan_id))
+            self.conn.executemany("DELETE FROM large_files WHERE dir = ?", ((path,) for path in rescanned))
+            self.conn.execute(f"DELETE FROM large_files WHERE dir NOT IN (SELECT path FROM dirs) AND {clause}", params)
+            self.conn.executemany("INSERT OR REPLACE INTO large_files (path, dir, size) VALUES (?, ?, ?)", large_files)
+
+        return {
+            "directories": len(rows),
+            "rescanned": len(rescanned),
+            "reused": reused,
+            "total_size": totals.get(root, (0, 0))[0],
+            "seconds": time.perf_counter() - start,
+        }
+
+    @staticmethod
+    def _aggregate(rows):
+        """Rolls own sizes up into every ancestor, deepest directories first."""
+        totals = {path: [own_size, own_files] for path, _, _, own_size, own_files, _ in rows}
+        parent_of = {path: parent for path, parent, *_ in rows}
+        for path in sorted(totals, key=lambda p: p.count(os.sep), reverse=True):
+            parent = parent_of[path]
+            if parent in totals:
+                totals[parent][0] += totals[path][0]
+                totals[parent][1] += totals[path][1]
+        return totals
+
+    def top_directories(self, root, limit=20):
+        clause, params = self._subtree_clause(os.path.abspath(root))
+        return self.conn.execute(
+            f"SELECT path, total_size, total_files FROM dirs WHERE {clause} ORDER BY total_size DESC LIMIT ?",
+            (*params, limit)).fetchall()
+
+    def top_files(self, root, limit=20):
+        clause, params = self._subtree_clause(os.path.abspath(root))
+        return self.conn.execute(
+            f"SELECT path, size FROM large_files WHERE {clause} ORDER BY size DESC LIMIT ?",
+            (*params, limit)).fetchall()
@@ -0,0 +1,211 @@
+# duplicate_utils.py
+import hashlib
+import os
+import stat
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import cleanup_utils
+import instrumentation_utils
+
+PARTIAL_CHUNK = 8 * 1024
+FULL_CHUNK = 1024 * 1024
+IN_FLIGHT_BUCKETS = 32
+
+
+def _cancelled(cancel_event):
+    return cancel_event is not None and cancel_event.is_set()
+
+
+def _iter_files(roots, min_size, cancel_event=None):
+    """Yields (path, size, file_id) for regular files, never following links."""
+    stack = [root for root in roots if root and os.path.isdir(root)]
+    while stack and not _cancelled(cancel_event):
+        current = stack.pop()
+        try:
+            with os.scandir(current) as it:
+                for entry in it:
+                    try:
+                        st = entry.stat(follow_symlinks=False)
+                    except OSError:
+                        continue
+                    if stat.S_ISDIR(st.st_mode):
+                        # Quarantined copies are restored as they were, never hardlinked.
+                        if entry.name == cleanup_utils.QUARANTINE_DIR:
+                            continue
+                        if not getattr(st, "st_file_attributes", 0) & getattr(stat, "FILE_ATTRIBUTE_REPARSE_POINT", 0):
+                            stack.append(entry.path)
+                    elif stat.S_ISREG(st.st_mode) and st.st_size >= min_size:
+                        # DirEntry.stat() leaves st_ino at 0 on Windows, so hardlinks are only recognised elsewhere.
+                        file_id = (st.st_dev, st.st_ino) if st.st_ino else None
+                        yield entry.path, st.st_size, file_id
+        except OSError:
+            continue
+
+
+def _partial_hash(path, size):
+    """Hashes the first and last PARTIAL_CHUNK bytes; covers the whole file when it is small."""
+    digest = hashlib.blake2b(digest_size=16)
+    try:
+        with open(path, "rb") as f:
+            digest.update(f.read(PARTIAL_CHUNK))
+            if size > 2 * PARTIAL_CHUNK:
+                f.seek(-PARTIAL_CHUNK, os.SEEK_END)
+                digest.update(f.read(PARTIAL_CHUNK))
+            elif size > PARTIAL_CHUNK:
+                digest.update(f.read())
+    except OSError:
+        return None
+    return digest.digest()
+
+
+def _full_hash(path):
+    digest = hashlib.blake2b(digest_size=32)
+    try:
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(FULL_CHUNK), b""):
+                digest.update(chunk)
+    except OSError:
+        return None
+    return digest.digest()
+
+
+def _timed_full_hash(path):
+    """_full_hash for the process pool: also returns the CPU seconds it took there, which
+    the parent adds to its instrumentation span."""
+    start = time.process_time()
+    digest = _full_hash(path)
+    return digest, time.process_time() - start
+
+
+def _group_by(keys, paths):
+    groups = {}
+    for key, path in zip(keys, paths):
+        if key is not None:
+            groups.setdefault(key, []).append(path)
+    return [group for group in groups.values() if len(group) > 1]
+
+
+def _size_buckets(roots, min_size, cancel_event=None):
+    buckets = {}
+    seen_ids = set()
+    for path, size, file_id in _iter_files(roots, min_size, cancel_event):
+        if file_id is not None:
+            # Paths that are already hardlinks of each other are the same file, not duplicates.
+            if file_id in seen_ids:
+                continue
+            seen_ids.add(file_id)
+        buckets.setdefault(size, []).append(path)
+    return {size: paths for size, paths in buckets.items() if len(paths) > 1}
+
+
+def find_duplicates(roots, min_size=1, max_workers=None, on_progress=None, cancel_event=None):
+    """Yields (size, [paths]) for every group of identical files as soon as it is confirmed.
+
+    Files are bucketed by size, then by a hash of their first/last few KB (threads),
+    and only the survivors are fully hashed (process pool). Full hashes are held
+    for a bounded window of size buckets at a time. Setting cancel_event, or closing the
+    generator, drops the hashing still queued instead of waiting for it.
+    """
+    buckets = _size_buckets(roots, min_size, cancel_event)
+    if _cancelled(cancel_event):
+        return
+    if on_progress:
+        on_progress(f"{sum(len(p) for p in buckets.values())} file(s) share a size with another file")
+
+    def partial_groups(item):
+        size, paths = item
+        hashes = []
+        for path in paths:
+            if _cancelled(cancel_event):
+                return size, []
+            hashes.append(_partial_hash(path, size))
+        return size, _group_by(hashes, paths)
+
+    # Loads multiprocessing, which only a search needs.
+    from concurrent.futures import ProcessPoolExecutor
+
+    in_flight = deque()
+    threads = ThreadPoolExecutor(max_workers=max_workers)
+    processes = ProcessPoolExecutor(max_workers=max_workers)
+    try:
+        # Largest files first: they hold most of the reclaimable space.
+        for size, groups in threads.map(instrumentation_utils.pool_cpu(partial_groups), sorted(buckets.items(), reverse=True)):
+            if _cancelled(cancel_event):
+                return
+            for group in groups:
+                if size <= 2 * PARTIAL_CHUNK:
+                    # The partial hash already covered every byte.
+                    yield size, group
+                    continue
+                in_flight.append((size, group, [processes.submit(_timed_full_hash, path) for path in group]))
+            while len(in_flight) > IN_FLIGHT_BUCKETS:
+                yield from _confirm(in_flight.popleft())
+        while in_flight and not _cancelled(cancel_event):
+            yield from _confirm(in_flight.popleft())
+    finally:
+        # Everything is consumed on a normal finish; after a cancel only the hashes already
+        # running are left, and nobody waits for them.
+        threads.shutdown(wait=False, cancel_futures=True)
+        processes.shutdown(wait=False, cancel_futures=True)
+
+
+def _confirm(item):
+    size, paths, futures = item
+    results = [future.result() for future in futures]
+    instrumentation_utils.record(cpu_seconds=sum(cpu for _, cpu in results))
+    for group in _group_by([digest for digest, _ in results], paths):
+        yield size, group
+
+
+class DuplicateReport:
+    """Stands in for a task result: the duplicate groups found, for a review list to show, and
+    their summary as the result text."""
+
+    def __init__(self, hardlink=False):
+        self.groups = []
+        self.hardlink = hardlink
+        self.wasted = 0
+        self.reclaimed = 0
+        self.cancelled = False
+
+    def add(self, size, paths, reclaimed=0):
+        self.groups.append((size, paths))
+        self.wasted += size * (len(paths) - 1)
+        self.reclaimed += reclaimed
+
+    def rows(self):
+        """[(size, group number, path)] for every file of every group, numbered in the order found."""
+        return [(size, number, path) for number, (size, paths) in enumerate(self.groups, start=1) for path in paths]
+
+    def __str__(self):
+        found = f"{len(self.groups)} duplicate group(s)"
+        if self.cancelled:
+            return f"Cancelled after finding {found} wasting {cleanup_utils.format_size(self.wasted)}."
+        if self.hardlink:
+            return f"Found {found}; hardlinking reclaimed {cleanup_utils.format_size(self.reclaimed)}."
+        return f"Found {found} wasting {cleanup_utils.format_size(self.wasted)}."
+
+
+def replace_with_hardlinks(paths):
+    """Replaces every path after the first with a hardlink to it; returns bytes reclaimed."""
+    keep = paths[0]
+    keep_stat = os.stat(keep)
+    reclaimed = 0
+    for path in paths[1:]:
+        try:
+            st = os.stat(path)
+            if st.st_dev != keep_stat.st_dev or st.st_size != keep_stat.st_size or os.path.samestat(st, keep_stat):
+                continue
+            tmp_path = f"{path}.sysopt-link"
+            os.link(keep, tmp_path)
+            try:
+                os.replace(tmp_path, path)
+            except OSError:
+                os.unlink(tmp_path)
+                raise
+            reclaimed += st.st_size
+        except OSError as e:
+            print(f"Could not hardlink {path}: {e}")
+    return reclaimed
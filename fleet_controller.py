@@ -0,0 +1,154 @@
+# fleet_controller.py
+"""Sends optimization jobs to many agents (`main.py --agent`) at once.
+
+    python fleet_controller.py --agents 127.0.0.1:8765,unix:/tmp/agent2.sock --run clean-temp,dns --dry-run
+    python fleet_controller.py --agents-file hosts.txt --run all --policy cleanup_policy.json
+"""
+import argparse
+import concurrent.futures
+import json
+import sys
+import threading
+
+import agent_utils
+import cleanup_utils
+
+
+class FleetController:
+    """Fans requests out to agents over one reused connection per agent."""
+
+    def __init__(self, addresses, token, concurrency=64, timeout=agent_utils.IDLE_TIMEOUT_S):
+        self.clients = {address: agent_utils.AgentClient(address, token) for address in addresses}
+        self.timeout = timeout
+        self._pool = concurrent.futures.ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="Fleet")
+
+    def _request(self, address, message, on_event):
+        try:
+            return self.clients[address].request(message, on_event=on_event and (lambda event: on_event(address, event)),
+                                                 timeout=self.timeout)
+        except (OSError, ValueError) as e:
+            # TimeoutError is an OSError: a hung agent fails on its own without holding up the rest.
+            return {"event": "error", "error": str(e)}
+
+    def send(self, message, on_event=None):
+        """Sends message to every agent; returns {address: final event}. on_event(address, event) gets progress."""
+        futures = {self._pool.submit(self._request, address, message, on_event): address for address in self.clients}
+        return {futures[future]: future.result() for future in concurrent.futures.as_completed(futures)}
+
+    def run(self, tasks, policy=None, dry_run=False, on_event=None):
+        return self.send({"op": "run", "tasks": tasks, "policy": policy, "dry_run": dry_run}, on_event)
+
+    @property
+    def connects(self):
+        return sum(client.connects for client in self.clients.values())
+
+    def close(self):
+        self._pool.shutdown()
+        for client in self.clients.values():
+            client.close()
+
+
+def _read_addresses(args):
+    addresses = [address.strip() for address in (args.agents or "").split(",") if address.strip()]
+    if args.agents_file:
+        with open(args.agents_file, "r", encoding="utf-8") as f:
+            addresses += [line.strip() for line in f if line.strip() and not line.lstrip().startswith("#")]
+    return list(dict.fromkeys(addresses))
+
+
+def describe(event):
+    """One line for an agent's final event."""
+    if event["event"] != "result":
+        return f"{event['event']}: {event.get('error', '')}"
+    parts = []
+    for name, result in event["results"].items():
+        if isinstance(result, dict) and "bytes" in result:
+            prefix = "" if result["complete"] else "over "
+            result = f"{prefix}{cleanup_utils.format_size(result['bytes'])} in {result['items']} item(s)"
+        elif isinstance(result, dict):
+            result = f"scan failed: {result.get('error')}"
+        parts.append(f"{name}: {result if result is not None else 'nothing to scan'}")
+    return ("cancelled; " if event.get("cancelled") else "") + "; ".join(parts)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run optimization jobs on many agents at once")
+    parser.add_argument("--agents", help="comma-separated agent addresses (host:port or unix:/path)")
+    parser.add_argument("--agents-file", metavar="FILE", help="file with one agent address per line")
+    parser.add_argument("--run", metavar="TASKS", help="comma-separated optimization keys, or 'all'")
+    parser.add_argument("--dry-run", action="store_true", help="only report reclaimable space, delete nothing")
+    parser.add_argument("--policy", metavar="FILE", help="cleanup policy JSON to use instead of each agent's own")
+    parser.add_argument("--ping", action="store_true", help="only report which agents answer and what they are running")
+    parser.add_argument("--token-file", metavar="FILE", help="file holding the agents' token (default: SYSOPT_AGENT_TOKEN, "
+                                                             "else this machine's agent_token)")
+    parser.add_argument("--timeout", type=float, default=agent_utils.IDLE_TIMEOUT_S,
+                        help="seconds without any event before an agent counts as failed")
+    parser.add_argument("--concurrency", type=int, default=64, help="agents contacted at once")
+    parser.add_argument("--json", action="store_true", help="print every event as a JSON line")
+    parser.add_argument("--quiet", action="store_true", help="print only the final result of each agent")
+    args = parser.parse_args(argv)
+
+    try:
+        addresses = _read_addresses(args)
+        if args.token_file:
+            with open(args.token_file, "r", encoding="utf-8") as f:
+                token = f.read().strip()
+        else:
+            token = agent_utils.load_token()
+        policy = None
+        if args.policy:
+            with open(args.policy, "r", encoding="utf-8") as f:
+                policy = json.load(f)
+    except (OSError, ValueError) as e:
+        print(e, file=sys.stderr)
+        return 2
+    if not addresses or not (args.run or args.ping):
+        parser.error("pass --agents or --agents-file, and --run or --ping")
+    if not token:
+        parser.error(f"no agent token: set {agent_utils.TOKEN_ENV} or pass --token-file")
+
+    print_lock = threading.Lock()
+
+    def on_event(address, event):
+        if args.quiet:
+            return
+        with print_lock:
+            if args.json:
+                print(json.dumps({"agent": address, **event}), flush=True)
+            elif event["event"] == "progress":
+                details = [f"{event['items_done']} items"] if event.get("items_done") is not None else []
+                if event.get("bytes_done") is not None:
+                    details.append(cleanup_utils.format_size(event["bytes_done"]))
+                text = " ".join(filter(None, [event.get("message"), f"({', '.join(details)})" if details else None]))
+                task = f"{event['task']}: " if event.get("task") else ""
+                print(f"[{address}] {task}{text}", flush=True)
+            elif event["event"] == "accepted" and event.get("duplicate"):
+                print(f"[{address}] joined job {event['job']}, which was already {event['state']}", flush=True)
+
+    controller = FleetController(addresses, token, concurrency=max(1, args.concurrency), timeout=args.timeout)
+    try:
+        if args.ping:
+            outcomes = controller.send({"op": "ping"})
+        else:
+            outcomes = controller.run(args.run, policy=policy, dry_run=args.dry_run, on_event=on_event)
+    finally:
+        controller.close()
+
+    failed = 0
+    for address in addresses:
+        event = outcomes[address]
+        if event["event"] not in ("result", "reply"):
+            failed += 1
+        if args.json:
+            print(json.dumps({"agent": address, **event}))
+        elif event["event"] == "reply":
+            print(f"{address}: {event.get('host')}, {len(event.get('jobs', []))} job(s) queued or running")
+        else:
+            print(f"{address}: {describe(event)}")
+    if not args.json:
+        print(f"{len(addresses) - failed}/{len(addresses)} agent(s) succeeded.")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,235 @@
+# history_utils.py
+import csv
+import socket
+import sqlite3
+import threading
+import time
+
+import cleanup_utils
+import path_utils
+
+HISTORY_FILE = "run_history.sqlite3"
+WEEK_SECONDS = 7 * 86400
+# The Unix epoch fell on a Thursday; shifting by three days makes weeks start on Monday.
+WEEK_OFFSET = 3 * 86400
+EXPORT_BATCH_SIZE = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    host TEXT NOT NULL,
+    started_at REAL NOT NULL,
+    finished_at REAL NOT NULL,
+    cancelled INTEGER NOT NULL DEFAULT 0,
+    cpu_before REAL, ram_before REAL, disk_before REAL,
+    cpu_after REAL, ram_after REAL, disk_after REAL
+);
+CREATE INDEX IF NOT EXISTS runs_started_at ON runs(started_at);
+CREATE INDEX IF NOT EXISTS runs_host_started_at ON runs(host, started_at);
+CREATE TABLE IF NOT EXISTS tasks (
+    run_id TEXT NOT NULL,
+    task TEXT NOT NULL,
+    host TEXT NOT NULL,
+    started_at REAL NOT NULL,
+    wall_seconds REAL,
+    cpu_seconds REAL,
+    bytes_freed INTEGER NOT NULL DEFAULT 0,
+    files_touched INTEGER NOT NULL DEFAULT 0,
+    errors INTEGER NOT NULL DEFAULT 0,
+    result TEXT,
+    PRIMARY KEY (run_id, task)
+);
+CREATE INDEX IF NOT EXISTS tasks_started_at ON tasks(started_at);
+CREATE INDEX IF NOT EXISTS tasks_task_started_at ON tasks(task, started_at);
+CREATE INDEX IF NOT EXISTS tasks_host_started_at ON tasks(host, started_at);
+CREATE TABLE IF NOT EXISTS weekly (
+    week_start INTEGER NOT NULL,
+    host TEXT NOT NULL,
+    bytes_freed INTEGER NOT NULL DEFAULT 0,
+    runs INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (week_start, host)
+);
+"""
+
+EXPORT_COLUMNS = ("run_id", "host", "started_at", "task", "wall_seconds", "bytes_freed", "files_touched", "errors", "result")
+
+
+class RunHistory:
+    """Every optimization run with its per-task results and before/after metrics, in SQLite.
+
+    Task rows repeat the run's host and start time so that time, task and host queries are
+    answered from one index without a join, and the weekly table keeps running totals so
+    trend queries never scan the task rows. Like DiskIndex, open one per thread.
+    """
+
+    def __init__(self, db_path=None):
+        self.db_path = db_path or path_utils.data_file(HISTORY_FILE)
+        self.conn = sqlite3.connect(self.db_path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def record_run(self, run_id, started_at, results, spans=(), before=None, after=None, host=None, cancelled=False, finished_at=None):
+        """Stores one run. results maps task names to their result (anything str() can render);
+        spans are the instrumentation_utils.Span objects carrying timings and counters."""
+        host = host or socket.gethostname()
+        before = before or {}
+        after = after or {}
+        by_task = {span.task: span for span in spans}
+        rows = []
+        for task, result in results.items():
+            span = by_task.get(task)
+            rows.append((run_id, task, host, started_at,
+                         span.wall_seconds if span else None, span.cpu_seconds if span else None,
+                         span.bytes_freed if span else 0, span.files_touched if span else 0,
+                         len(span.errors) if span else 0, None if result is None else str(result)))
+        with self.conn:
+            previous = self.conn.execute(
+                "SELECT r.host, r.started_at, (SELECT COALESCE(SUM(bytes_freed), 0) FROM tasks t WHERE t.run_id = r.run_id) "
+                "FROM runs r WHERE r.run_id = ?", (run_id,)).fetchone()
+            if previous:
+                # Recording a run again replaces it, so take its old totals back out first.
+                self._add_to_week(previous[1], previous[0], -previous[2], -1)
+                self.conn.execute("DELETE FROM tasks WHERE run_id = ?", (run_id,))
+            self.conn.execute(
+                "INSERT OR REPLACE INTO runs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (run_id, host, started_at, finished_at or time.time(), int(cancelled),
+                 before.get("cpu_usage"), before.get("ram_usage"), before.get("disk_usage"),
+                 after.get("cpu_usage"), after.get("ram_usage"), after.get("disk_usage")))
+            self.conn.executemany("INSERT OR REPLACE INTO tasks VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            self._add_to_week(started_at, host, sum(row[6] for row in rows), 1)
+
+    def _add_to_week(self, started_at, host, bytes_freed, runs):
+        self.conn.execute(
+            "INSERT INTO weekly (week_start, host, bytes_freed, runs) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (week_start, host) DO UPDATE SET bytes_freed = bytes_freed + excluded.bytes_freed, runs = runs + excluded.runs",
+            (week_start(started_at), host, bytes_freed, runs))
+
+    def recent_runs(self, limit=50, host=None):
+        """[(run_id, host, started_at, finished_at, cancelled, bytes_freed, tasks)], newest first."""
+        where, params = ("WHERE r.host = ?", (host,)) if host else ("", ())
+        return self.conn.execute(
+            f"SELECT r.run_id, r.host, r.started_at, r.finished_at, r.cancelled, "
+            f"(SELECT COALESCE(SUM(bytes_freed), 0) FROM tasks t WHERE t.run_id = r.run_id), "
+            f"(SELECT COUNT(*) FROM tasks t WHERE t.run_id = r.run_id) "
+            f"FROM runs r {where} ORDER BY r.started_at DESC LIMIT ?", (*params, limit)).fetchall()
+
+    def task_history(self, task, since=0.0, until=None):
+        """[(started_at, wall_seconds, bytes_freed, result)] for one task, oldest first."""
+        return self.conn.execute(
+            "SELECT started_at, wall_seconds, bytes_freed, result FROM tasks WHERE task = ? AND started_at >= ? AND started_at < ? "
+            "ORDER BY started_at", (task, since, until or time.time() + 1)).fetchall()
+
+    def bytes_freed_per_week(self, since=0.0, until=None, host=None):
+        """[(week_start, bytes_freed, runs)] for UTC weeks starting on Monday. Read from the weekly
+        totals, so since and until select whole weeks: those containing them are included."""
+        sql = "SELECT week_start, SUM(bytes_freed), SUM(runs) FROM weekly WHERE week_start >= ? AND week_start <= ?"
+        params = [week_start(since), week_start(until or time.time())]
+        if host:
+            sql += " AND host = ?"
+            params.append(host)
+        return self.conn.execute(sql + " GROUP BY week_start ORDER BY week_start", params).fetchall()
+
+    def iter_rows(self, since=0.0, until=None):
+        """Yields EXPORT_COLUMNS tuples in time order, fetched in batches rather than all at once."""
+        cursor = self.conn.execute(
+            f"SELECT {', '.join(EXPORT_COLUMNS)} FROM tasks WHERE started_at >= ? AND started_at < ? ORDER BY started_at, run_id",
+            (since, until or time.time() + 1))
+        while True:
+            batch = cursor.fetchmany(EXPORT_BATCH_SIZE)
+            if not batch:
+                return
+            yield from batch
+
+
+def week_start(timestamp):
+    """Start of the Monday-based UTC week containing timestamp."""
+    return int((timestamp + WEEK_OFFSET) // WEEK_SECONDS) * WEEK_SECONDS - WEEK_OFFSET
+
+
+def _timestamp(value):
+    return time.strftime("%Y-%m-%d %H:%M", time.localtime(value))
+
+
+def export_csv(history, path, since=0.0, until=None, on_progress=None):
+    """Streams the task rows into a CSV file; returns the number of rows written."""
+    count = 0
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(EXPORT_COLUMNS)
+        for row in history.iter_rows(since, until):
+            writer.writerow(row)
+            count += 1
+            if on_progress and count % EXPORT_BATCH_SIZE == 0:
+                on_progress(count)
+    return count
+
+
+def export_pdf(history, path, since=0.0, until=None, on_progress=None):
+    """Writes a weekly summary followed by every task row; returns the number of task rows."""
+    from fpdf import FPDF
+
+    pdf = FPDF(orientation="L")
+    pdf.set_auto_page_break(True, margin=12)
+    pdf.add_page()
+    pdf.set_font("Helvetica", "B", 14)
+    pdf.cell(0, 10, "Pro System Optimizer - Run History", new_x="LMARGIN", new_y="NEXT")
+    pdf.set_font("Helvetica", size=9)
+    for week, freed, runs in history.bytes_freed_per_week(since, until):
+        pdf.cell(0, 5, f"Week of {time.strftime('%Y-%m-%d', time.gmtime(week))}: {cleanup_utils.format_size(freed or 0)} freed in {runs} run(s)",
+                 new_x="LMARGIN", new_y="NEXT")
+    pdf.ln(4)
+
+    widths = (36, 64, 20, 26, 130)
+    count = 0
+    for run_id, host, started_at, task, wall_seconds, freed, _, errors, result in history.iter_rows(since, until):
+        cells = (_timestamp(started_at), task[:40], f"{wall_seconds or 0:.1f}s", cleanup_utils.format_size(freed or 0),
+                 (result or "")[:90])
+        for width, text in zip(widths, cells):
+            # The core fonts only cover Latin-1.
+            pdf.cell(width, 5, text.encode("latin-1", "replace").decode("latin-1"))
+        pdf.ln(5)
+        count += 1
+        if on_progress and count % EXPORT_BATCH_SIZE == 0:
+            on_progress(count)
+    pdf.output(path)
+    return count
+
+
+EXPORTERS = {"csv": export_csv, "pdf": export_pdf}
+
+
+def start_export(kind, path, on_done, on_progress=None, since=0.0, until=None, db_path=None):
+    """Exports on a worker thread with its own connection; calls on_done(rows, error) from that thread."""
+    def work():
+        history = None
+        try:
+            history = RunHistory(db_path)
+            rows = EXPORTERS[kind](history, path, since, until, on_progress)
+        except Exception as e:
+            on_done(0, e)
+        else:
+            on_done(rows, None)
+        finally:
+            if history is not None:
+                history.close()
+
+    thread = threading.Thread(target=work, name="HistoryExport", daemon=True)
+    thread.start()
+    return thread
+
+
+def record_run(recorder, results, before, after, cancelled=False):
+    """Stores a finished run_optimizations call; failures are printed, never raised."""
+    try:
+        history = RunHistory()
+        try:
+            history.record_run(recorder.run_id, recorder.started_at, results, recorder.spans, before, after,
+                               host=recorder.host, cancelled=cancelled)
+        finally:
+            history.close()
+    except (sqlite3.Error, OSError) as e:
+        print(f"Could not record run history: {e}")
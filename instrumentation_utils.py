@@ -0,0 +1,192 @@
+# instrumentation_utils.py
+import contextvars
+import functools
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+
+import path_utils
+
+RUN_LOG_FILE = "runs.jsonl"
+PROMETHEUS_FILE = "system_optimizer.prom"
+
+# Switched off, pool CPU accounting, subprocess records and the run log/Prometheus export are
+# skipped; spans still time each task and count what it freed, which the run history needs.
+_enabled = os.getenv("SYSOPT_INSTRUMENTATION", "1") != "0"
+_current_span = contextvars.ContextVar("sysopt_span", default=None)
+
+
+def set_enabled(enabled):
+    global _enabled
+    _enabled = bool(enabled)
+
+
+def is_enabled():
+    return _enabled
+
+
+class Span:
+    """Timing and counters for one optimization callable within a run.
+
+    cpu_seconds covers the task's own thread plus the pool work wrapped with pool_cpu() or
+    reported through record(cpu_seconds=...), so it can exceed wall_seconds.
+    """
+
+    def __init__(self, task):
+        self.task = task
+        self.started_at = time.time()
+        self.wall_seconds = 0.0
+        self.cpu_seconds = 0.0
+        self.bytes_freed = 0
+        self.files_touched = 0
+        self.subprocesses = []
+        self.errors = []
+        self.result = None
+        self._lock = threading.Lock()
+        self._wall_start = time.perf_counter()
+        self._cpu_start = time.thread_time()
+
+    def add(self, bytes_freed=0, files_touched=0, cpu_seconds=0.0):
+        # Pool threads add to the span concurrently.
+        with self._lock:
+            self.bytes_freed += bytes_freed
+            self.files_touched += files_touched
+            self.cpu_seconds += cpu_seconds
+
+    def finish(self, result):
+        self.wall_seconds = time.perf_counter() - self._wall_start
+        self.add(cpu_seconds=time.thread_time() - self._cpu_start)
+        self.result = result
+
+    def to_dict(self):
+        return {
+            "task": self.task,
+            "started_at": self.started_at,
+            "wall_seconds": self.wall_seconds,
+            "cpu_seconds": self.cpu_seconds,
+            "bytes_freed": self.bytes_freed,
+            "files_touched": self.files_touched,
+            "subprocesses": self.subprocesses,
+            "errors": self.errors,
+            # Results may be report objects that render themselves.
+            "result": None if self.result is None else str(self.result),
+        }
+
+
+def record(bytes_freed=0, files_touched=0, cpu_seconds=0.0):
+    """Adds counters to the span of the optimization running in this context, if any.
+    cpu_seconds is for work done outside its threads, e.g. in a process pool."""
+    span = _current_span.get()
+    if span is not None:
+        span.add(bytes_freed, files_touched, cpu_seconds)
+
+
+def pool_cpu(func):
+    """Wraps func before it is submitted to a thread pool so the CPU time it uses counts toward
+    the span of the optimization submitting it; pool threads do not inherit its context."""
+    span = _current_span.get() if _enabled else None
+    if span is None:
+        return func
+
+    @functools.wraps(func)
+    def timed(*args, **kwargs):
+        start = time.thread_time()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            span.add(cpu_seconds=time.thread_time() - start)
+
+    return timed
+
+
+def record_subprocess(command, seconds, returncode):
+    if not _enabled:
+        return
+    span = _current_span.get()
+    if span is not None:
+        span.subprocesses.append({"command": command, "seconds": seconds, "returncode": returncode})
+
+
+def record_error(message):
+    """Marks the span as failed. Tasks that catch their own exceptions call this; a raised
+    exception is recorded by RunRecorder.wrap."""
+    span = _current_span.get()
+    if span is not None:
+        span.errors.append(str(message))
+
+
+class RunRecorder:
+    """Collects the spans of one run_optimizations call and exports them."""
+
+    def __init__(self, run_id=None):
+        self.run_id = run_id or uuid.uuid4().hex
+        self.host = socket.gethostname()
+        self.started_at = time.time()
+        self.spans = []
+
+    def wrap(self, task, func):
+        @functools.wraps(func)
+        def wrapper(progress_callback):
+            span = Span(task)
+            token = _current_span.set(span)
+            result = None
+            try:
+                result = func(progress_callback)
+                return result
+            except Exception as e:
+                span.errors.append(str(e))
+                raise
+            finally:
+                span.finish(result)
+                _current_span.reset(token)
+                self.spans.append(span)
+
+        return wrapper
+
+    def export(self, run_log_path=None, prometheus_path=None):
+        if not _enabled or not self.spans:
+            return
+        try:
+            self.write_run_log(run_log_path or path_utils.data_file(RUN_LOG_FILE))
+            self.write_prometheus(prometheus_path or os.path.join(
+                os.getenv("SYSOPT_PROMETHEUS_DIR") or path_utils.get_data_dir(), PROMETHEUS_FILE))
+        except OSError as e:
+            print(f"Could not export run metrics: {e}")
+
+    def write_run_log(self, path):
+        lines = []
+        for span in self.spans:
+            entry = {"run_id": self.run_id, "host": self.host}
+            entry.update(span.to_dict())
+            lines.append(json.dumps(entry))
+        with open(path, "a", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+
+    def write_prometheus(self, path):
+        """Writes a node_exporter textfile-collector file describing the latest run."""
+        metrics = (
+            ("sysopt_task_duration_seconds", "Wall time of the optimization in the latest run.", lambda s: s.wall_seconds),
+            ("sysopt_task_cpu_seconds", "CPU time of the optimization, including its pool workers, in the latest run.", lambda s: s.cpu_seconds),
+            ("sysopt_task_bytes_freed", "Bytes freed by the optimization in the latest run.", lambda s: s.bytes_freed),
+            ("sysopt_task_files_touched", "Files touched by the optimization in the latest run.", lambda s: s.files_touched),
+            ("sysopt_task_subprocess_seconds", "Time spent in external commands in the latest run.",
+             lambda s: sum(p["seconds"] for p in s.subprocesses)),
+            ("sysopt_task_errors", "Errors raised by the optimization in the latest run.", lambda s: len(s.errors)),
+        )
+        lines = []
+        for name, help_text, value in metrics:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} gauge")
+            for span in self.spans:
+                lines.append(f'{name}{{task="{_escape_label(span.task)}",host="{_escape_label(self.host)}"}} {value(span)}')
+        lines.append("# HELP sysopt_last_run_timestamp_seconds Start time of the latest run.")
+        lines.append("# TYPE sysopt_last_run_timestamp_seconds gauge")
+        lines.append(f'sysopt_last_run_timestamp_seconds{{host="{_escape_label(self.host)}"}} {self.started_at}')
+        path_utils.atomic_write(path, "\n".join(lines) + "\n")
+
+
+def _escape_label(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
@@ -0,0 +1,199 @@
+# list_model.py
+import heapq
+import itertools
+
+
+class ListModel:
+    """Rows of tuples behind a virtualized list: sorting, filtering and selection work on
+    row indices and a byte-per-row selection mask, never on widgets.
+
+    The view is the filtered, sorted list of row indices; positions passed to the view
+    methods are positions in it. `version` changes whenever a redraw is needed.
+
+    Sorting and filtering a million rows takes most of a second, so a UI computes them with
+    plan() on a worker thread and swaps the result in with apply() on its own thread. The
+    number of selected rows and the sum of weight_column over them are kept up to date as
+    the selection changes, so showing them costs nothing per click.
+    """
+
+    def __init__(self, columns, rows=(), weight_column=None):
+        self.columns = list(columns)
+        self.weight_column = weight_column
+        self.version = 0
+        self.set_rows(rows)
+
+    def set_rows(self, rows):
+        self.rows = list(rows)
+        self.selected = bytearray(len(self.rows))
+        self._selected_count = 0
+        self._selected_weight = 0
+        self._total = None
+        self.sort_column = None
+        self.sort_reverse = False
+        self._predicate = None
+        # Every row index in sort order; filtering walks it, so changing the filter never re-sorts.
+        self._order = list(range(len(self.rows)))
+        self.view = list(self._order)
+        self.version += 1
+
+    def __len__(self):
+        return len(self.view)
+
+    def visible(self, start, count):
+        """Returns [(row, selected)] for count view positions starting at start."""
+        rows, selected = self.rows, self.selected
+        return [(rows[i], bool(selected[i])) for i in self.view[start:start + count]]
+
+    @property
+    def predicate(self):
+        return self._predicate
+
+    def plan(self, column, reverse=False, predicate=None):
+        """Computes the order and view for a sort column and filter without changing the model.
+        Only reads it, so it may run on another thread; pass the result to apply()."""
+        rows, order = self.rows, self._order
+        if column is not None and (column, reverse) != (self.sort_column, self.sort_reverse):
+            # Sorting ints by a precomputed key list avoids a Python lambda call per comparison.
+            keys = [row[column] for row in rows]
+            order = sorted(order, key=keys.__getitem__, reverse=reverse)
+        view = list(order) if predicate is None else [i for i in order if predicate(rows[i])]
+        return rows, column, reverse, predicate, order, view
+
+    def apply(self, plan):
+        """Installs a plan(); returns False (and changes nothing) if the rows were replaced since."""
+        rows, column, reverse, predicate, order, view = plan
+        if rows is not self.rows:
+            return False
+        self.sort_column, self.sort_reverse, self._predicate = column, reverse, predicate
+        self._order, self.view = order, view
+        self.version += 1
+        return True
+
+    def sort(self, column, reverse=False):
+        self.apply(self.plan(column, reverse, self._predicate))
+
+    def filter(self, predicate=None):
+        """Keeps rows for which predicate(row) is true; None shows everything."""
+        self.apply(self.plan(self.sort_column, self.sort_reverse, predicate))
+
+    def filter_text(self, text, column):
+        self.filter(text_predicate(text, column))
+
+    def _view_is_everything(self):
+        return len(self.view) == len(self.rows)
+
+    def _weight(self, i):
+        return self.rows[i][self.weight_column] if self.weight_column is not None else 0
+
+    def _total_weight(self):
+        if self._total is None:
+            column = self.weight_column
+            self._total = sum(row[column] for row in self.rows) if column is not None else 0
+        return self._total
+
+    def _set(self, i, value):
+        """Sets one row's selection, keeping the running count and weight in step."""
+        if self.selected[i] != value:
+            self.selected[i] = value
+            step = 1 if value else -1
+            self._selected_count += step
+            self._selected_weight += step * self._weight(i)
+
+    def select_all(self, selected=True):
+        """Selects (or clears) every row in the view."""
+        value = 1 if selected else 0
+        if self._view_is_everything():
+            self.selected[:] = bytes([value]) * len(self.rows)
+            self._selected_count = len(self.rows) if value else 0
+            self._selected_weight = self._total_weight() if value else 0
+        else:
+            for i in self.view:
+                self._set(i, value)
+        self.version += 1
+
+    def invert_selection(self):
+        if self._view_is_everything():
+            self.selected = self.selected.translate(_INVERT)
+            self._selected_count = len(self.rows) - self._selected_count
+            self._selected_weight = self._total_weight() - self._selected_weight
+        else:
+            mask = self.selected
+            for i in self.view:
+                self._set(i, mask[i] ^ 1)
+        self.version += 1
+
+    def select_where(self, predicate, selected=True):
+        value = 1 if selected else 0
+        rows = self.rows
+        for i in self.view:
+            if predicate(rows[i]):
+                self._set(i, value)
+        self.version += 1
+
+    def toggle(self, position):
+        i = self.view[position]
+        self._set(i, self.selected[i] ^ 1)
+        self.version += 1
+
+    def selected_count(self):
+        return self._selected_count
+
+    def selected_weight(self):
+        """Sum of weight_column over the selected rows."""
+        return self._selected_weight
+
+    def selected_rows(self):
+        return list(itertools.compress(self.rows, self.selected))
+
+    def remove_selected(self, keep=None):
+        """Drops the selected rows, except those keep(row) is true for, keeping the current sort
+        and filter without sorting again. Kept rows end up unselected."""
+        if keep is None:
+            remove = self.selected
+        else:
+            remove = bytearray(self.selected)
+            rows = self.rows
+            for i in itertools.compress(range(len(rows)), remove):
+                if keep(rows[i]):
+                    remove[i] = 0
+        keep = remove.translate(_INVERT)
+        # The new index of each kept row is the number of kept rows before it.
+        new_index = list(itertools.accumulate(keep, initial=0))
+        order = [new_index[i] for i in self._order if keep[i]]
+        view = [new_index[i] for i in self.view if keep[i]]
+        column, reverse, predicate = self.sort_column, self.sort_reverse, self._predicate
+        self.set_rows(itertools.compress(self.rows, keep))
+        self.sort_column, self.sort_reverse, self._predicate = column, reverse, predicate
+        self._order, self.view = order, view
+
+
+class LargestRows:
+    """Collects rows as they stream in but keeps only the `limit` with the largest first column,
+    so a scan of a huge tree holds at most that many rows in memory."""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.dropped = 0
+        self._heap = []
+
+    def extend(self, rows):
+        heap = self._heap
+        for row in rows:
+            if len(heap) < self.limit:
+                heapq.heappush(heap, row)
+            else:
+                if row > heap[0]:
+                    heapq.heapreplace(heap, row)
+                self.dropped += 1
+
+    def rows(self):
+        return list(self._heap)
+
+
+def text_predicate(text, column):
+    """A filter() predicate for rows whose column contains text (case-insensitive); None for empty text."""
+    text = text.strip().lower()
+    return (lambda row: text in str(row[column]).lower()) if text else None
+
+
+_INVERT = bytes([1, 0]) + bytes(254)
@@ -1,32 +1,78 @@
 # main.py
-import customtkinter as ctk
-import ctypes
+import argparse
 import sys
-from tkinter import messagebox
+
 
 def is_admin():
     """Checks for administrator privileges."""
+    import ctypes
     try:
         return ctypes.windll.shell32.IsUserAnAdmin()
     except:
         return False
 
 
-if not is_admin():
- 
-    messagebox.showerror(
-        "Administrator Privileges Required",
-        "This application requires administrator privileges to run.\nPlease right-click the program and select 'Run as administrator'."
-    )
-    sys.exit() 
-
+def run_gui():
+    import customtkinter as ctk
+    from tkinter import messagebox
 
-from ui_main import App
+    if not is_admin():
+        messagebox.showerror(
+            "Administrator Privileges Required",
+            "This application requires administrator privileges to run.\nPlease right-click the program and select 'Run as administrator'."
+        )
+        sys.exit()
 
+    from ui_main import App
 
-if __name__ == "__main__":
     ctk.set_appearance_mode("Dark")
     ctk.set_default_color_theme("blue")
-    
+
     app = App()
-    app.mainloop()
\ No newline at end of file
+    app.mainloop()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pro System Optimizer")
+    parser.add_argument("--headless", action="store_true", help="run without the GUI (never imports Tk or PIL)")
+    parser.add_argument("--run", metavar="TASKS", help="comma-separated optimization keys, or 'all'")
+    parser.add_argument("--scan", action="store_true", help="only report reclaimable space, delete nothing")
+    parser.add_argument("--list", action="store_true", help="list the optimization keys and exit")
+    parser.add_argument("--quarantine", action="store_true", help="move cleaned files into an undoable quarantine instead of deleting")
+    parser.add_argument("--hardlink-duplicates", action="store_true", help="replace duplicate files found by the 'duplicates' task with hardlinks")
+    parser.add_argument("--undo", nargs="?", const="latest", metavar="RUN_ID", help="restore files quarantined by a run (default: the latest)")
+    parser.add_argument("--restore-points", action="store_true", help="list the runs whose settings can be restored and exit")
+    parser.add_argument("--restore-settings", nargs="?", const="latest", metavar="RUN_ID",
+                        help="restore the settings from before a run (default: the latest)")
+    parser.add_argument("--export-history", metavar="FILE", help="write the run history to a .csv or .pdf report and exit")
+    parser.add_argument("--daemon", action="store_true", help="stay in the background and run the daemon.json tasks whenever the machine is idle")
+    parser.add_argument("--agent", action="store_true", help="serve optimization jobs from a local socket (see fleet_controller.py)")
+    parser.add_argument("--listen", metavar="ADDRESS", help="agent address: host:port or unix:/path (default: 127.0.0.1:8765)")
+    parser.add_argument("--workers", type=int, default=2, help="jobs the agent runs at once")
+    args = parser.parse_args(argv)
+
+    if args.daemon:
+        if not is_admin():
+            print("Warning: not running as administrator; some optimizations will fail.", file=sys.stderr)
+        import daemon_utils
+        return daemon_utils.main()
+
+    if args.agent:
+        if not is_admin():
+            print("Warning: not running as administrator; some optimizations will fail.", file=sys.stderr)
+        import agent_utils
+        return agent_utils.main(args.listen, max(1, args.workers))
+
+    if args.headless or args.list or args.undo or args.export_history or args.restore_points or args.restore_settings:
+        import cli_utils
+        return cli_utils.run(args, is_admin())
+
+    run_gui()
+    return 0
+
+
+if __name__ == "__main__":
+    # The duplicate finder hashes in a process pool, which needs this in frozen builds.
+    import multiprocessing
+    multiprocessing.freeze_support()
+    sys.exit(main())
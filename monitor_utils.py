@@ -0,0 +1,231 @@
+# monitor_utils.py
+import ctypes
+import os
+import select
+import sys
+import threading
+import time
+from collections import deque
+
+import psutil
+
+SAMPLE_INTERVAL = 1.0
+HISTORY_SIZE = 300
+# The drive Windows runs from, or / elsewhere.
+SYSTEM_ROOT = os.environ.get("SystemDrive", "") + os.sep
+# Where the OS cannot tell us that the mount table changed, re-enumerate this often.
+PARTITION_REFRESH_SECONDS = 30
+
+
+def list_partitions():
+    """Mountpoints of the mounted, readable partitions (no optical drives or pseudo filesystems)."""
+    mountpoints = []
+    for part in psutil.disk_partitions(all=False):
+        if 'cdrom' in part.opts or part.fstype == '':
+            continue
+        mountpoints.append(part.mountpoint)
+    return mountpoints
+
+
+class _MountWatcher:
+    """Cheap "did the mounts change?" check, so partitions are only re-enumerated when they do.
+
+    Windows compares the GetLogicalDrives() bitmask, Linux polls /proc/self/mounts (the
+    kernel flags it when the mount table changes) and other systems fall back to a timer.
+    """
+
+    def __init__(self):
+        self._signature = None
+        self._mounts = None
+        self._poller = None
+        self._checked = 0.0
+        # sample() may run on the sampler thread and a caller at once; a poll object is not shareable.
+        self._lock = threading.Lock()
+        if sys.platform.startswith("linux"):
+            try:
+                self._mounts = open("/proc/self/mounts", "rb")
+                self._poller = select.poll()
+                self._poller.register(self._mounts, select.POLLPRI | select.POLLERR)
+            except OSError:
+                self._mounts = self._poller = None
+
+    def changed(self):
+        """True on the first call and whenever the set of mounts may have changed since the last."""
+        with self._lock:
+            return self._changed()
+
+    def _changed(self):
+        if sys.platform == "win32":
+            signature = ctypes.windll.kernel32.GetLogicalDrives()
+            changed, self._signature = signature != self._signature, signature
+            return changed
+        if self._poller is not None:
+            first = self._signature is None
+            self._signature = True
+            if self._poller.poll(0) or first:
+                # Reading the table to the end acknowledges the change.
+                self._mounts.seek(0)
+                self._mounts.read()
+                return True
+            return False
+        now = time.monotonic()
+        if now - self._checked >= PARTITION_REFRESH_SECONDS:
+            self._checked = now
+            return True
+        return False
+
+    def close(self):
+        if self._mounts is not None:
+            self._mounts.close()
+
+
+def _rate(current, previous, elapsed):
+    # Counters can go backwards when a disk is re-attached or a NIC reset; treat that as idle.
+    return max(0, current - previous) / elapsed if elapsed else 0.0
+
+
+def _disk_rates(counters, last, elapsed):
+    return {
+        "read_bytes_s": _rate(counters.read_bytes, last.read_bytes, elapsed),
+        "write_bytes_s": _rate(counters.write_bytes, last.write_bytes, elapsed),
+        "read_iops": _rate(counters.read_count, last.read_count, elapsed),
+        "write_iops": _rate(counters.write_count, last.write_count, elapsed),
+    }
+
+
+class CpuMeter:
+    """Non-blocking system CPU usage since the previous read, whichever thread makes it.
+
+    psutil.cpu_percent(interval=None) keeps its baseline per thread, so a fresh worker thread
+    always reads 0 from it; this keeps one baseline, taken when the meter is created.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._last = psutil.cpu_times()
+
+    def percent(self):
+        with self._lock:
+            current = psutil.cpu_times()
+            last, self._last = self._last, current
+        # Linux counts guest time inside user time already.
+        total = sum(current) - sum(last) - sum(getattr(current, name, 0) - getattr(last, name, 0) for name in ("guest", "guest_nice"))
+        idle = sum(getattr(current, name, 0) - getattr(last, name, 0) for name in ("idle", "iowait"))
+        if total <= 0:
+            return 0.0
+        return round(min(100.0, max(0.0, (total - idle) / total * 100)), 1)
+
+
+def io_rates(counters, previous, elapsed):
+    """Per-second disk and network throughput between two (per disk, all disks, network) counter reads."""
+    disks, total, net = counters
+    prev_disks, prev_total, prev_net = previous
+    rates = {"disks": {name: _disk_rates(c, prev_disks[name], elapsed) for name, c in disks.items() if name in prev_disks}}
+    # psutil's all-disk total skips partitions, which the per-disk view would count twice on Linux.
+    if total is not None and prev_total is not None:
+        rates.update(("disk_" + key, value) for key, value in _disk_rates(total, prev_total, elapsed).items())
+    else:
+        rates.update(disk_read_bytes_s=0.0, disk_write_bytes_s=0.0, disk_read_iops=0.0, disk_write_iops=0.0)
+    if net is not None and prev_net is not None:
+        rates["net_sent_bytes_s"] = _rate(net.bytes_sent, prev_net.bytes_sent, elapsed)
+        rates["net_recv_bytes_s"] = _rate(net.bytes_recv, prev_net.bytes_recv, elapsed)
+    else:
+        rates["net_sent_bytes_s"] = rates["net_recv_bytes_s"] = 0.0
+    return rates
+
+
+class MetricsSampler:
+    """Samples CPU/RAM/disk usage on a background thread into a fixed-size ring buffer."""
+
+    def __init__(self, interval=SAMPLE_INTERVAL, history_size=HISTORY_SIZE, store=None, processes=None):
+        self.interval = interval
+        self.store = store
+        self.processes = processes
+        self._top = None
+        self._mount_watcher = _MountWatcher()
+        self._partitions = []
+        self._counters = None
+        self._counters_time = None
+        self._cpu = CpuMeter()
+        self._samples = deque(maxlen=history_size)
+        self._latest = None
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="MetricsSampler", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        self._mount_watcher.close()
+
+    def _run(self):
+        next_tick = time.monotonic()
+        while not self._stop_event.is_set():
+            try:
+                self.sample()
+            except Exception as e:
+                print(f"Metrics sampling failed: {e}")
+            next_tick += self.interval
+            delay = next_tick - time.monotonic()
+            if delay < 0:
+                next_tick = time.monotonic()
+                delay = 0
+            self._stop_event.wait(delay)
+
+    def sample(self):
+        """Takes one non-blocking sample and appends it to the ring buffer."""
+        if self._mount_watcher.changed():
+            self._partitions = list_partitions()
+        partitions = {}
+        for mountpoint in self._partitions:
+            try:
+                partitions[mountpoint] = psutil.disk_usage(mountpoint).percent
+            except OSError:
+                # Unplugged between enumerations, or a card reader without media.
+                continue
+
+        now = time.monotonic()
+        counters = (psutil.disk_io_counters(perdisk=True) or {}, psutil.disk_io_counters(), psutil.net_io_counters())
+        previous = self._counters or counters
+        elapsed = now - self._counters_time if self._counters_time is not None else 0
+        self._counters, self._counters_time = counters, now
+
+        sample = {
+            "timestamp": time.time(),
+            "cpu_usage": self._cpu.percent(),
+            "ram_usage": psutil.virtual_memory().percent,
+            "disk_usage": partitions[SYSTEM_ROOT] if SYSTEM_ROOT in partitions else psutil.disk_usage(SYSTEM_ROOT).percent,
+            "partitions": partitions,
+        }
+        sample.update(io_rates(counters, previous, elapsed))
+        # deque.append and the attribute swap are atomic under the GIL, so readers never lock.
+        self._samples.append(sample)
+        self._latest = sample
+        if self.store is not None:
+            self.store.add(sample)
+        if self.processes is not None:
+            self._top = self.processes.sample()
+        return sample
+
+    def latest(self):
+        """Returns the most recent sample, or None before the first tick."""
+        return self._latest
+
+    def top_processes(self):
+        """Returns the latest process_utils.ProcessSampler ranking, or None without one."""
+        return self._top
+
+    def history(self, seconds=None):
+        samples = list(self._samples)
+        if seconds is None:
+            return samples
+        cutoff = time.time() - seconds
+        return [s for s in samples if s["timestamp"] >= cutoff]
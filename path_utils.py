@@ -0,0 +1,78 @@
+# path_utils.py
+import json
+import os
+import stat
+import tempfile
+
+APP_DIR_NAME = "SystemOptimizer"
+
+
+def get_data_dir():
+    """Per-user directory for caches, logs and databases (override with SYSOPT_DATA_DIR)."""
+    path = os.getenv('SYSOPT_DATA_DIR')
+    if not path:
+        base = os.getenv('APPDATA') or os.getenv('XDG_DATA_HOME') or os.path.join(os.path.expanduser('~'), '.local', 'share')
+        path = os.path.join(base, APP_DIR_NAME)
+    # Private to the user: it holds the agent token and the settings journals.
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    return path
+
+
+def data_file(name):
+    return os.path.join(get_data_dir(), name)
+
+
+def atomic_write(path, data, mode="w"):
+    """Writes data to a uniquely named sibling temp file and renames it over path, so concurrent
+    writers never share a temp file. An existing file keeps its permissions."""
+    directory, name = os.path.split(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{name}.", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, mode) as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        try:
+            os.chmod(tmp_path, stat.S_IMODE(os.stat(path).st_mode))
+        except FileNotFoundError:
+            # mkstemp makes it private; readers such as node_exporter may run as another user.
+            os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def append_json_lines(path, entries):
+    """Appends entries as JSON lines and syncs them to disk. A line torn by an earlier crash is
+    terminated first, so it stays one unreadable line instead of swallowing the next entry."""
+    data = "".join(json.dumps(entry) + "\n" for entry in entries).encode("utf-8")
+    fd = os.open(path, os.O_RDWR | os.O_APPEND | os.O_CREAT | getattr(os, "O_BINARY", 0), 0o600)
+    try:
+        if os.fstat(fd).st_size:
+            os.lseek(fd, -1, os.SEEK_END)
+            if os.read(fd, 1) != b"\n":
+                data = b"\n" + data
+        os.write(fd, data)
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def read_json_lines(path):
+    """Returns the readable entries of a JSON lines file, skipping torn lines; [] if it does not exist."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            lines = f.readlines()
+    except FileNotFoundError:
+        return []
+    entries = []
+    for line in lines:
+        try:
+            entries.append(json.loads(line))
+        except ValueError:
+            continue
+    return entries
@@ -0,0 +1,172 @@
+# plugin_utils.py
+import glob
+import importlib.util
+import os
+import sys
+import threading
+
+import policy_utils
+
+PLUGIN_DIR = "plugins"
+ENTRY_POINT_GROUP = "sysopt.cleaners"
+RISK_LEVELS = ("low", "medium", "high")
+# Cleaner threads a plugin asks for while it runs, by declared footprint.
+FOOTPRINT_WORKERS = {"light": 2, "medium": 4, "heavy": 8}
+
+
+class CleanerPlugin:
+    """Declares a cleaner: which folders it empties, on which platforms, and how risky and heavy it is.
+
+    roots maps a sys.platform prefix ("win32", "linux", "darwin") to folder patterns; "~",
+    $VARIABLES and glob wildcards are expanded when the roots are resolved, so one pattern can
+    cover every browser profile. Only files matching include (all files when empty) and older
+    than min_age_hours are removed. Plugins that are not "low" risk start unchecked.
+    """
+
+    def __init__(self, key, label, roots, risk="low", footprint="light", include=(), min_age_hours=24, description=""):
+        if risk not in RISK_LEVELS:
+            raise ValueError(f"{key}: risk must be one of {', '.join(RISK_LEVELS)}")
+        if footprint not in FOOTPRINT_WORKERS:
+            raise ValueError(f"{key}: footprint must be one of {', '.join(FOOTPRINT_WORKERS)}")
+        self.key = key
+        self.label = label
+        self.roots = roots
+        self.risk = risk
+        self.footprint = footprint
+        self.include = list(include)
+        self.min_age_hours = min_age_hours
+        self.description = description
+
+    @property
+    def workers(self):
+        return FOOTPRINT_WORKERS[self.footprint]
+
+    def patterns(self, platform=sys.platform):
+        return [pattern for prefix, patterns in self.roots.items() if platform.startswith(prefix) for pattern in patterns]
+
+    def supports(self, platform=sys.platform):
+        return bool(self.patterns(platform))
+
+    def resolve_roots(self, platform=sys.platform):
+        """Existing folders the patterns currently match, without duplicates."""
+        roots = []
+        seen = set()
+        for pattern in self.patterns(platform):
+            pattern = os.path.expandvars(os.path.expanduser(pattern))
+            # An unset variable stays literal; never let it turn into a path relative to the cwd.
+            if "$" in pattern or "%" in pattern or not os.path.isabs(pattern):
+                continue
+            for root in sorted(glob.glob(pattern)):
+                key = os.path.normcase(os.path.abspath(root))
+                if os.path.isdir(root) and key not in seen:
+                    seen.add(key)
+                    roots.append(root)
+        return roots
+
+    def policy(self):
+        return policy_utils.Policy.from_dict({"include": self.include, "min_age_hours": self.min_age_hours})
+
+
+class WorkerBudget:
+    """Cleaner threads shared by every plugin running at once, so parallel cleaners
+    together never put more concurrent I/O on the disks than a single one would."""
+
+    def __init__(self, total):
+        self.total = total
+        self.available = total
+        self._condition = threading.Condition()
+
+    def acquire(self, count, cancel_event=None):
+        """Blocks until count slots (at most the whole budget) are free; returns the number taken,
+        or 0 if cancel_event was set while waiting."""
+        count = max(1, min(count, self.total))
+        with self._condition:
+            while self.available < count:
+                if cancel_event is not None and cancel_event.is_set():
+                    return 0
+                self._condition.wait(0.5)
+            self.available -= count
+        return count
+
+    def release(self, count):
+        with self._condition:
+            self.available += count
+            self._condition.notify_all()
+
+
+def _plugins_from(value, origin):
+    plugins = value if isinstance(value, (list, tuple)) else [value]
+    for plugin in plugins:
+        if not isinstance(plugin, CleanerPlugin):
+            raise TypeError(f"{origin} provides {type(plugin).__name__}, not a CleanerPlugin")
+    return list(plugins)
+
+
+def plugin_dirs():
+    """The plugins folder next to the app (bundled in frozen builds).
+
+    Plugins run with the app's administrator rights, so they are only loaded from the install
+    folder and from installed packages, never from the user-writable data folder.
+    """
+    base = getattr(sys, "_MEIPASS", os.path.dirname(os.path.abspath(__file__)))
+    return [os.path.join(base, PLUGIN_DIR)]
+
+
+def _load_folder(directory):
+    plugins = []
+    try:
+        names = sorted(name for name in os.listdir(directory) if name.endswith(".py") and not name.startswith("_"))
+    except FileNotFoundError:
+        return plugins
+    for name in names:
+        path = os.path.join(directory, name)
+        try:
+            spec = importlib.util.spec_from_file_location(f"sysopt_plugin_{name[:-3]}", path)
+            module = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(module)
+            plugins.extend(_plugins_from(getattr(module, "PLUGINS", []), path))
+        except Exception as e:
+            print(f"Could not load cleaner plugin {path}: {e}")
+    return plugins
+
+
+def _load_entry_points():
+    try:
+        from importlib.metadata import entry_points
+    except ImportError:
+        return []
+    try:
+        found = entry_points(group=ENTRY_POINT_GROUP)
+    except TypeError:
+        # Python < 3.10 returns a dict of groups.
+        found = entry_points().get(ENTRY_POINT_GROUP, [])
+    plugins = []
+    for entry_point in found:
+        try:
+            plugins.extend(_plugins_from(entry_point.load(), entry_point.name))
+        except Exception as e:
+            print(f"Could not load cleaner plugin {entry_point.name}: {e}")
+    return plugins
+
+
+def discover(platform=sys.platform, reserved=()):
+    """Loads the plugins from the plugin folder and the "sysopt.cleaners" entry point group.
+
+    Plugins for other platforms are dropped; the first plugin claiming a key wins, and keys
+    in reserved (the built-in optimizations) cannot be taken.
+    """
+    plugins = []
+    keys = set(reserved)
+    for directory in plugin_dirs():
+        plugins.extend(_load_folder(directory))
+    plugins.extend(_load_entry_points())
+    registry = []
+    for plugin in plugins:
+        if not plugin.supports(platform):
+            continue
+        if plugin.key in keys:
+            print(f"Ignoring cleaner plugin '{plugin.key}': the key is already taken.")
+            continue
+        keys.add(plugin.key)
+        registry.append(plugin)
+    return registry
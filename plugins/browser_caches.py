@@ -0,0 +1,35 @@
+# plugins/browser_caches.py
+import plugin_utils
+
+PLUGINS = [
+    plugin_utils.CleanerPlugin(
+        "browser-cache", "Clear Browser Caches",
+        roots={
+            "win32": [
+                "$LOCALAPPDATA/Google/Chrome/User Data/*/Cache",
+                "$LOCALAPPDATA/Google/Chrome/User Data/*/Code Cache",
+                "$LOCALAPPDATA/Microsoft/Edge/User Data/*/Cache",
+                "$LOCALAPPDATA/Microsoft/Edge/User Data/*/Code Cache",
+                "$LOCALAPPDATA/BraveSoftware/Brave-Browser/User Data/*/Cache",
+                "$LOCALAPPDATA/Mozilla/Firefox/Profiles/*/cache2",
+            ],
+            "linux": [
+                "~/.cache/google-chrome/*/Cache",
+                "~/.cache/google-chrome/*/Code Cache",
+                "~/.cache/chromium/*/Cache",
+                "~/.cache/chromium/*/Code Cache",
+                "~/.cache/microsoft-edge/*/Cache",
+                "~/.cache/BraveSoftware/Brave-Browser/*/Cache",
+                "~/.cache/mozilla/firefox/*/cache2",
+            ],
+            "darwin": [
+                "~/Library/Caches/Google/Chrome/*/Cache",
+                "~/Library/Caches/Firefox/Profiles/*/cache2",
+            ],
+        },
+        footprint="heavy",
+        # Entries a running browser just wrote are still in use.
+        min_age_hours=1,
+        description="Disk caches of Chrome, Edge, Brave, Chromium and Firefox; cookies and history are not touched.",
+    ),
+]
@@ -0,0 +1,19 @@
+# plugins/crash_dumps.py
+import plugin_utils
+
+PLUGINS = [
+    plugin_utils.CleanerPlugin(
+        "crash-dumps", "Delete Crash Dumps",
+        roots={
+            "win32": [
+                "$LOCALAPPDATA/CrashDumps",
+                "$SystemRoot/Minidump",
+                "$ProgramData/Microsoft/Windows/WER/ReportArchive",
+                "$ProgramData/Microsoft/Windows/WER/ReportQueue",
+            ],
+            "linux": ["/var/crash", "/var/lib/systemd/coredump"],
+        },
+        risk="medium",
+        description="Crash dumps and error reports; only needed when debugging a crash.",
+    ),
+]
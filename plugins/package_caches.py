@@ -0,0 +1,27 @@
+# plugins/package_caches.py
+import plugin_utils
+
+PLUGINS = [
+    plugin_utils.CleanerPlugin(
+        "pip-cache", "Clear pip Cache",
+        roots={
+            "win32": ["$LOCALAPPDATA/pip/Cache"],
+            "linux": ["~/.cache/pip"],
+            "darwin": ["~/Library/Caches/pip"],
+        },
+        risk="medium",
+        footprint="medium",
+        description="Downloaded wheels and HTTP responses; later installs download them again.",
+    ),
+    plugin_utils.CleanerPlugin(
+        "npm-cache", "Clear npm Cache",
+        roots={
+            "win32": ["$LOCALAPPDATA/npm-cache/_cacache"],
+            "linux": ["~/.npm/_cacache"],
+            "darwin": ["~/.npm/_cacache"],
+        },
+        risk="medium",
+        footprint="medium",
+        description="npm's content-addressed package cache; later installs download the packages again.",
+    ),
+]
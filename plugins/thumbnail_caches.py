@@ -0,0 +1,16 @@
+# plugins/thumbnail_caches.py
+import plugin_utils
+
+PLUGINS = [
+    plugin_utils.CleanerPlugin(
+        "thumbnail-cache", "Clear Thumbnail Caches",
+        roots={
+            "win32": ["$LOCALAPPDATA/Microsoft/Windows/Explorer"],
+            "linux": ["~/.cache/thumbnails"],
+        },
+        # Explorer keeps its icon caches in the same folder.
+        include=["thumbcache_*.db", "*.png"],
+        min_age_hours=0,
+        description="Explorer and freedesktop thumbnail caches; they are rebuilt when folders are opened.",
+    ),
+]
@@ -0,0 +1,295 @@
+# policy_utils.py
+import contextlib
+import contextvars
+import fnmatch
+import json
+import os
+import re
+import threading
+
+import path_utils
+
+POLICY_FILE = "cleanup_policy.json"
+WILDCARDS = re.compile(r"[*?\[]")
+GLOB_SPECIAL = re.compile(r"[*?\[\]]")
+# A literal extension ending a pattern, e.g. ".tmp" in "~$*.tmp".
+GLOB_EXTENSION = re.compile(r"\.[^./*?\[\]]+$")
+GLOB_PREFIX = re.compile(r"[^*?\[\]]*")
+
+# Files younger than a day are most likely still in use by an installer or a running app.
+DEFAULT_POLICY = {
+    "include": [],
+    "exclude": [],
+    "min_age_hours": 24,
+    "min_size_bytes": 0,
+    "roots": {},
+}
+
+_scoped_policy = contextvars.ContextVar("sysopt_policy", default=None)
+
+
+class GlobMatcher:
+    """Matches many glob patterns with a roughly constant number of lookups per name.
+
+    Literal patterns go into a set, "*suffix" and "prefix*" patterns into sets keyed by
+    length. The remaining globs are grouped by a literal every match must have (a leading
+    folder, the extension or a leading prefix), so a name is only tried against the few
+    globs it could match. Patterns containing "/" are matched against the path relative
+    to the root.
+    """
+
+    def __init__(self, patterns, case_sensitive=os.path.normcase("A") == "A"):
+        self.case_sensitive = case_sensitive
+        self.name_index = _PatternIndex()
+        self.path_index = _PatternIndex()
+        self.name_globs = _GlobIndex()
+        self.path_globs = _GlobIndex()
+        for pattern in patterns:
+            pattern = pattern.replace("\\", "/").strip("/")
+            if not case_sensitive:
+                pattern = pattern.lower()
+            index, globs = (self.path_index, self.path_globs) if "/" in pattern else (self.name_index, self.name_globs)
+            if not index.add(pattern):
+                globs.add(pattern)
+        self.name_globs.compile()
+        self.path_globs.compile()
+        self.empty = not patterns
+
+    def matches(self, name, relpath=None):
+        if self.empty:
+            return False
+        if not self.case_sensitive:
+            name = name.lower()
+        if self.name_index.matches(name) or (not self.name_globs.empty and self.name_globs.matches(name)):
+            return True
+        if relpath is None or (not self.path_index and self.path_globs.empty):
+            return False
+        relpath = relpath.replace("\\", "/")
+        if not self.case_sensitive:
+            relpath = relpath.lower()
+        return self.path_index.matches(relpath) or (not self.path_globs.empty and self.path_globs.matches(relpath))
+
+
+class _PatternIndex:
+    def __init__(self):
+        self.match_all = False
+        self.literals = set()
+        self.suffixes = {}
+        self.prefixes = {}
+
+    def __bool__(self):
+        return bool(self.match_all or self.literals or self.suffixes or self.prefixes)
+
+    def add(self, pattern):
+        """Indexes literal, "*suffix" and "prefix*" patterns; returns False for anything else."""
+        if pattern == "*":
+            self.match_all = True
+        elif not WILDCARDS.search(pattern):
+            self.literals.add(pattern)
+        elif pattern.startswith("*") and not WILDCARDS.search(pattern[1:]):
+            self.suffixes.setdefault(len(pattern) - 1, set()).add(pattern[1:])
+        elif pattern.endswith("*") and not WILDCARDS.search(pattern[:-1]):
+            self.prefixes.setdefault(len(pattern) - 1, set()).add(pattern[:-1])
+        else:
+            return False
+        return True
+
+    def matches(self, text):
+        if self.match_all or text in self.literals:
+            return True
+        size = len(text)
+        for length, suffixes in self.suffixes.items():
+            if size >= length and text[size - length:] in suffixes:
+                return True
+        for length, prefixes in self.prefixes.items():
+            if size >= length and text[:length] in prefixes:
+                return True
+        return False
+
+
+class _GlobIndex:
+    """General globs bucketed by a literal part of every text they match, one combined regex per bucket.
+
+    Globs anchored nowhere, like "*.log.[0-9]", are keyed by their longest literal run; one
+    regex scan over the text finds which of those runs it contains.
+    """
+
+    def __init__(self):
+        self.folders = {}
+        self.extensions = {}
+        self.prefixes = {}
+        self.contains = {}
+        self.rest = []
+        self.find_literals = None
+        self.empty = True
+
+    def add(self, pattern):
+        regex = fnmatch.translate(pattern)
+        folder = pattern.split("/", 1)[0] if "/" in pattern else None
+        extension = GLOB_EXTENSION.search(pattern)
+        prefix = GLOB_PREFIX.match(pattern).group()
+        literal = max(_literal_runs(pattern), key=len, default="")
+        if folder and not GLOB_SPECIAL.search(folder):
+            self.folders.setdefault(folder, []).append(regex)
+        elif extension:
+            # The extension has no dot of its own, so the last dot of any match starts this literal.
+            self.extensions.setdefault(extension.group(), []).append(regex)
+        elif prefix:
+            self.prefixes.setdefault(len(prefix), {}).setdefault(prefix, []).append(regex)
+        elif literal:
+            self.contains.setdefault(literal, []).append(regex)
+        else:
+            self.rest.append(regex)
+
+    def compile(self):
+        def combined(regexes):
+            return re.compile("|".join(regexes)).match
+        self.empty = not (self.folders or self.extensions or self.prefixes or self.contains or self.rest)
+        self.folders = {key: combined(regexes) for key, regexes in self.folders.items()}
+        self.extensions = {key: combined(regexes) for key, regexes in self.extensions.items()}
+        self.prefixes = {length: {key: combined(regexes) for key, regexes in buckets.items()}
+                         for length, buckets in self.prefixes.items()}
+        # Longest first, so each position reports its longest run; the shorter runs found there
+        # are prefixes of it, so every bucket also checks the globs of its prefixes.
+        literals = sorted(self.contains, key=len, reverse=True)
+        self.find_literals = re.compile("(?=(%s))" % "|".join(map(re.escape, literals))).finditer if literals else None
+        self.contains = {key: combined([regex for other in literals if key.startswith(other) for regex in self.contains[other]])
+                         for key in literals}
+        self.rest = combined(self.rest) if self.rest else None
+
+    def matches(self, text):
+        if self.folders:
+            match = self.folders.get(text.split("/", 1)[0])
+            if match is not None and match(text):
+                return True
+        if self.extensions:
+            dot = text.rfind(".")
+            match = self.extensions.get(text[dot:]) if dot >= 0 else None
+            if match is not None and match(text):
+                return True
+        for length, buckets in self.prefixes.items():
+            match = buckets.get(text[:length])
+            if match is not None and match(text):
+                return True
+        if self.find_literals is not None:
+            for found in self.find_literals(text):
+                if self.contains[found.group(1)](text):
+                    return True
+        return self.rest is not None and self.rest(text) is not None
+
+
+def _literal_runs(pattern):
+    """The runs of plain characters in a glob, skipping wildcards and character classes the way
+    fnmatch reads them ("]" right after "[" or "[!" belongs to the class)."""
+    runs = []
+    run = ""
+    i = 0
+    while i < len(pattern):
+        char = pattern[i]
+        if char in "*?[":
+            runs.append(run)
+            run = ""
+            if char == "[":
+                j = i + 1
+                if j < len(pattern) and pattern[j] == "!":
+                    j += 1
+                if j < len(pattern) and pattern[j] == "]":
+                    j += 1
+                end = pattern.find("]", j)
+                i = end if end >= 0 else i
+        else:
+            run += char
+        i += 1
+    runs.append(run)
+    return [run for run in runs if run]
+
+
+class RootBudget:
+    """Thread-safe byte cap for one cleaner root."""
+
+    def __init__(self, max_bytes):
+        self.remaining = max_bytes
+        self._lock = threading.Lock()
+
+    def take(self, num_bytes):
+        if self.remaining is None:
+            return True
+        with self._lock:
+            if num_bytes > self.remaining:
+                return False
+            self.remaining -= num_bytes
+            return True
+
+    def refund(self, num_bytes):
+        if self.remaining is None:
+            return
+        with self._lock:
+            self.remaining += num_bytes
+
+
+class Policy:
+    def __init__(self, include=(), exclude=(), min_age_hours=0, min_size_bytes=0, roots=None):
+        self.include = GlobMatcher(include)
+        self.exclude = GlobMatcher(exclude)
+        self.min_age_seconds = float(min_age_hours) * 3600
+        self.min_size_bytes = int(min_size_bytes)
+        self.roots = {os.path.normcase(os.path.abspath(root)): settings for root, settings in (roots or {}).items()}
+
+    @classmethod
+    def from_dict(cls, data):
+        merged = dict(DEFAULT_POLICY)
+        merged.update(data)
+        return cls(merged["include"], merged["exclude"], merged["min_age_hours"], merged["min_size_bytes"], merged["roots"])
+
+    def budget_for(self, root):
+        settings = self.roots.get(os.path.normcase(os.path.abspath(root)), {})
+        return RootBudget(settings.get("max_bytes"))
+
+    def allows_file(self, name, relpath, st, now):
+        """Decides from cached DirEntry stat data alone whether a file may be deleted."""
+        if st.st_size < self.min_size_bytes:
+            return False
+        if self.min_age_seconds and now - max(st.st_mtime, st.st_ctime) < self.min_age_seconds:
+            return False
+        if not self.include.empty and not self.include.matches(name, relpath):
+            return False
+        return not self.exclude.matches(name, relpath)
+
+    def allows_directory(self, name, relpath):
+        """Excluded directories are skipped with everything below them."""
+        return not self.exclude.matches(name, relpath)
+
+    def allows_directory_removal(self, st, now):
+        return not self.min_age_seconds or now - max(st.st_mtime, st.st_ctime) >= self.min_age_seconds
+
+
+@contextlib.contextmanager
+def policy_scope(policy):
+    """Makes load_policy() return policy for cleaners started in this context (None keeps the file)."""
+    token = _scoped_policy.set(policy)
+    try:
+        yield
+    finally:
+        _scoped_policy.reset(token)
+
+
+def scoped_policy():
+    return _scoped_policy.get()
+
+
+def load_policy(path=None):
+    """Reads the cleanup policy file from the data directory, falling back to DEFAULT_POLICY.
+    Inside a policy_scope the scoped policy is returned instead."""
+    scoped = _scoped_policy.get()
+    if scoped is not None and path is None:
+        return scoped
+    path = path or path_utils.data_file(POLICY_FILE)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        data = {}
+    except (OSError, ValueError) as e:
+        print(f"Could not read cleanup policy {path}: {e}. Using the default policy.")
+        data = {}
+    return Policy.from_dict(data)
@@ -0,0 +1,95 @@
+# process_utils.py
+import heapq
+import time
+
+import psutil
+
+import cleanup_utils
+
+TOP_N = 5
+# Read for every process each tick; both come from the same stat call inside process_iter's oneshot().
+ATTRS = ["name", "cpu_times"]
+# Idle processes still have their memory re-read every this many ticks: Windows trims the
+# working sets of idle processes, which shrinks their RSS without any CPU time of their own.
+COUNTER_REFRESH_TICKS = 10
+
+
+class ProcessSampler:
+    """Ranks running processes by CPU, resident memory and disk I/O.
+
+    Rates come from the counters cached per PID at the previous sample(), so nothing
+    blocks on an interval; the first sample only primes the cache. A process that used
+    no CPU time since then cannot have grown or done I/O, so its memory and I/O counters
+    are only re-read once its CPU time moves, or every COUNTER_REFRESH_TICKS ticks (staggered
+    by PID) to catch memory the OS took back; on a typical desktop that skips most of them.
+    """
+
+    def __init__(self, top_n=TOP_N):
+        self.top_n = top_n
+        self._previous = {}
+        self._previous_time = None
+        self._tick = 0
+        self._cpu_count = psutil.cpu_count() or 1
+
+    @staticmethod
+    def _read_counters(proc):
+        rss = io_total = 0
+        with proc.oneshot():
+            try:
+                rss = proc.memory_info().rss
+            except psutil.Error:
+                pass
+            try:
+                io = proc.io_counters()
+                io_total = io.read_bytes + io.write_bytes
+            except (psutil.Error, AttributeError):
+                pass
+        return rss, io_total
+
+    def sample(self):
+        """Returns {"cpu": [...], "memory": [...], "io": [...]}, each the top_n rows of
+        (pid, name, cpu_percent, rss_bytes, io_bytes_per_s) in descending order."""
+        now = time.monotonic()
+        elapsed = now - self._previous_time if self._previous_time is not None else 0
+        previous = self._previous
+        self._tick += 1
+        tick = self._tick
+        current = {}
+        rows = []
+        for proc in psutil.process_iter(ATTRS, ad_value=None):
+            info = proc.info
+            cpu_times = info["cpu_times"]
+            cpu_total = cpu_times.user + cpu_times.system if cpu_times else 0.0
+            pid = proc.pid
+
+            cpu_percent = io_rate = 0.0
+            last = previous.get(pid)
+            if last is None or cpu_total != last[0] or (tick + pid) % COUNTER_REFRESH_TICKS == 0:
+                rss, io_total = self._read_counters(proc)
+            else:
+                rss, io_total = last[1], last[2]
+            if last is not None and elapsed:
+                # A reused PID shows up as counters going backwards; it just reads as idle once.
+                cpu_percent = max(0.0, cpu_total - last[0]) / elapsed * 100 / self._cpu_count
+                io_rate = max(0, io_total - last[2]) / elapsed
+            current[pid] = (cpu_total, rss, io_total)
+            rows.append((pid, info["name"] or "?", cpu_percent, rss, io_rate))
+
+        self._previous = current
+        self._previous_time = now
+        return {
+            "cpu": heapq.nlargest(self.top_n, rows, key=lambda row: row[2]),
+            "memory": heapq.nlargest(self.top_n, rows, key=lambda row: row[3]),
+            "io": heapq.nlargest(self.top_n, rows, key=lambda row: row[4]),
+        }
+
+
+def format_top(top):
+    """Renders a sample() result as fixed-width text for the dashboard."""
+    lines = []
+    for title, key, column, fmt in (("CPU", "cpu", 2, lambda v: f"{v:.1f}%"),
+                                    ("Memory", "memory", 3, cleanup_utils.format_size),
+                                    ("Disk I/O", "io", 4, lambda v: f"{cleanup_utils.format_size(v)}/s")):
+        entries = ", ".join(f"{row[1]} ({fmt(row[column])})" for row in top[key] if row[column])
+        lines.append(f"{title:<9}{entries or '-'}")
+    return "\n".join(lines)
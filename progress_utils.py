@@ -0,0 +1,117 @@
+# progress_utils.py
+import contextvars
+import functools
+import threading
+import time
+
+import cleanup_utils
+
+_current_task = contextvars.ContextVar("sysopt_progress_task", default=None)
+
+
+def run_as(task, func):
+    """Wraps an optimization so progress it reports is attributed to task."""
+
+    @functools.wraps(func)
+    def wrapper(progress_callback):
+        token = _current_task.set((task, progress_callback))
+        try:
+            return func(progress_callback)
+        finally:
+            _current_task.reset(token)
+
+    return wrapper
+
+
+def current_task():
+    current = _current_task.get()
+    return current[0] if current is not None else None
+
+
+def report(message=None, items_done=None, items_total=None, bytes_done=None):
+    """Reports structured progress for the task running in this context.
+
+    A ProgressBus receives every field; a plain progress_callback(message) only the message.
+    """
+    current = _current_task.get()
+    if current is None:
+        return
+    task, callback = current
+    publish = getattr(callback, "publish", None)
+    if publish is not None:
+        publish(task, message, items_done, items_total, bytes_done)
+    elif message is not None:
+        callback(message)
+
+
+class ProgressBus:
+    """Thread-safe progress channel from worker threads to the UI thread.
+
+    Workers publish as often as they like; only the newest state per task is kept, so memory
+    stays bounded by the number of tasks. The UI calls drain() on a timer and gets at most one
+    event per task per tick. The bus itself is a progress_callback(message).
+    """
+
+    def __init__(self):
+        self.published = 0
+        self._lock = threading.Lock()
+        self._state = {}
+        self._dirty = {}
+        self._completion = None
+
+    def __call__(self, message):
+        self.publish(current_task(), message)
+
+    def publish(self, task, message=None, items_done=None, items_total=None, bytes_done=None):
+        with self._lock:
+            self.published += 1
+            event = self._state.get(task)
+            if event is None:
+                event = self._state[task] = {
+                    "task": task, "message": None, "items_done": None, "items_total": None,
+                    "bytes_done": None, "eta_seconds": None, "started": time.monotonic(),
+                }
+            if message is not None:
+                event["message"] = message
+            if items_done is not None:
+                event["items_done"] = items_done
+            if items_total is not None:
+                event["items_total"] = items_total
+            if bytes_done is not None:
+                event["bytes_done"] = bytes_done
+            # Re-insert so drain() lists tasks in the order they last reported.
+            self._dirty.pop(task, None)
+            self._dirty[task] = None
+
+    def complete(self, *args):
+        """Usable as the completion_callback; the UI receives the arguments from drain()."""
+        with self._lock:
+            self._completion = args
+
+    def drain(self):
+        """Returns (events changed since the last drain, completion args or None)."""
+        with self._lock:
+            events = [dict(self._state[task]) for task in self._dirty]
+            self._dirty.clear()
+            completion, self._completion = self._completion, None
+        now = time.monotonic()
+        for event in events:
+            done, total = event["items_done"], event["items_total"]
+            if done and total and total > done:
+                event["eta_seconds"] = (now - event["started"]) * (total - done) / done
+        return events, completion
+
+
+def format_event(event):
+    text = event["message"] or ""
+    details = []
+    if event["items_done"] is not None:
+        items = f"{event['items_done']}" if event["items_total"] is None else f"{event['items_done']}/{event['items_total']}"
+        details.append(f"{items} items")
+    if event["bytes_done"] is not None:
+        details.append(cleanup_utils.format_size(event["bytes_done"]))
+    if event["eta_seconds"] is not None:
+        details.append(f"~{event['eta_seconds']:.0f}s left")
+    if details:
+        text = f"{text} ({', '.join(details)})" if text else ", ".join(details)
+    return text
@@ -0,0 +1,350 @@
+# quarantine_utils.py
+import contextlib
+import contextvars
+import errno
+import json
+import os
+import shutil
+import threading
+import time
+
+import cleanup_utils
+import path_utils
+
+QUARANTINE_DIR = cleanup_utils.QUARANTINE_DIR
+INDEX_FILE = "quarantine_index.json"
+MANIFEST_FILE = "manifest.jsonl"
+LEGACY_MANIFEST_FILE = "manifest.json"
+MANIFEST_BATCH_SIZE = 256
+MANIFEST_FLUSH_SECONDS = 1.0
+RESTORE_BATCH_SIZE = 256
+RETENTION_DAYS = 7
+COPY_CHUNK_SIZE = 1024 * 1024
+
+_current_quarantine = contextvars.ContextVar("sysopt_quarantine", default=None)
+_index_lock = threading.Lock()
+
+
+@contextlib.contextmanager
+def quarantine_scope(quarantine):
+    """Makes cleaners started in this context move into quarantine instead of deleting."""
+    token = _current_quarantine.set(quarantine)
+    try:
+        yield quarantine
+    finally:
+        _current_quarantine.reset(token)
+
+
+def current_quarantine():
+    return _current_quarantine.get()
+
+
+def _volume_root(path):
+    path = os.path.abspath(path)
+    drive = os.path.splitdrive(path)[0]
+    if drive:
+        return drive + os.sep
+    while not os.path.ismount(path):
+        path = os.path.dirname(path)
+    return path
+
+
+def _copy_across(source, destination):
+    """Streams a file or tree to another volume in fixed-size chunks, then removes the source.
+    Returns the number of bytes copied."""
+    copied = 0
+    if os.path.isdir(source) and not os.path.islink(source):
+        for dirpath, dirnames, filenames in os.walk(source):
+            target_dir = os.path.join(destination, os.path.relpath(dirpath, source))
+            os.makedirs(target_dir, exist_ok=True)
+            for name in filenames:
+                copied += _copy_across(os.path.join(dirpath, name), os.path.join(target_dir, name))
+        shutil.rmtree(source)
+        return copied
+    if os.path.islink(source):
+        os.symlink(os.readlink(source), destination)
+    else:
+        with open(source, "rb") as fsrc, open(destination, "wb") as fdst:
+            shutil.copyfileobj(fsrc, fdst, COPY_CHUNK_SIZE)
+            copied = fdst.tell()
+        shutil.copystat(source, destination)
+    os.unlink(source)
+    return copied
+
+
+def _move(source, destination):
+    """Renames when both paths share a volume; otherwise copies. Returns bytes copied (0 for a rename)."""
+    try:
+        os.rename(source, destination)
+        return 0
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+    return _copy_across(source, destination)
+
+
+class Quarantine:
+    """Per-run quarantine: cleaners rename what they would delete into <volume>/.sysopt-quarantine/<run id>.
+
+    A rename is a metadata operation, so whole subtrees move in O(1). When the volume root
+    is not writable the data directory is used instead, and moves that end up crossing
+    volumes are copied in chunks; their cost is tallied in cross_volume_bytes/seconds.
+
+    The run is added to the index as soon as its first run directory exists and moves are
+    appended to that directory's manifest in batches, so a run that crashes can still be
+    restored and purged.
+    """
+
+    def __init__(self, run_id):
+        self.run_id = run_id
+        self.created = time.time()
+        self.items = 0
+        self.bytes = 0
+        self.cross_volume_bytes = 0
+        self.cross_volume_seconds = 0.0
+        self._run_dirs = {}
+        self._made_dirs = set()
+        self._pending = {}
+        self._flushed_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _run_dir(self, path):
+        volume = _volume_root(path)
+        with self._lock:
+            run_dir = self._run_dirs.get(volume)
+            if run_dir is None:
+                run_dir = os.path.join(volume, QUARANTINE_DIR, self.run_id)
+                try:
+                    os.makedirs(run_dir, exist_ok=True)
+                except OSError:
+                    run_dir = os.path.join(path_utils.data_file("quarantine"), self.run_id)
+                    os.makedirs(run_dir, exist_ok=True)
+                path_utils.append_json_lines(os.path.join(run_dir, MANIFEST_FILE), [{"run_id": self.run_id, "created": self.created}])
+                self._run_dirs[volume] = run_dir
+                self._pending[run_dir] = []
+                self._update_index(complete=False)
+            return run_dir
+
+    def _update_index(self, complete):
+        with _index_lock:
+            index = _load_index()
+            index[self.run_id] = {"created": self.created, "run_dirs": sorted(self._run_dirs.values()), "items": self.items,
+                                  "bytes": self.bytes, "copied_bytes": self.cross_volume_bytes, "complete": complete}
+            _save_index(index)
+
+    def move(self, path, stats=None):
+        """Moves a file or a whole directory tree into quarantine, keeping its absolute path below
+        the run directory. Cross-volume copy costs are also added to stats["copied_bytes"] and
+        stats["copy_seconds"] when given."""
+        run_dir = self._run_dir(path)
+        relative = os.path.splitdrive(os.path.abspath(path))[1].lstrip("\\/")
+        destination = os.path.join(run_dir, relative)
+        parent = os.path.dirname(destination)
+        if parent not in self._made_dirs:
+            os.makedirs(parent, exist_ok=True)
+            self._made_dirs.add(parent)
+        start = time.perf_counter()
+        copied = _move(path, destination)
+        with self._lock:
+            if copied:
+                seconds = time.perf_counter() - start
+                self.cross_volume_bytes += copied
+                self.cross_volume_seconds += seconds
+                if stats is not None:
+                    stats["copied_bytes"] = stats.get("copied_bytes", 0) + copied
+                    stats["copy_seconds"] = stats.get("copy_seconds", 0.0) + seconds
+            self._pending[run_dir].append({"source": path, "dest": relative})
+            due = (len(self._pending[run_dir]) >= MANIFEST_BATCH_SIZE
+                   or time.monotonic() - self._flushed_at >= MANIFEST_FLUSH_SECONDS)
+            if due:
+                self._flush()
+        return destination
+
+    def _flush(self):
+        """Appends the moves not yet in the manifests; called with self._lock held."""
+        self._flushed_at = time.monotonic()
+        for run_dir, entries in self._pending.items():
+            if not entries:
+                continue
+            try:
+                path_utils.append_json_lines(os.path.join(run_dir, MANIFEST_FILE), entries)
+            except OSError as e:
+                # Kept pending: the next flush or commit() tries again.
+                print(f"Could not write quarantine manifest in {run_dir}: {e}")
+                continue
+            entries.clear()
+
+    def count(self, items, num_bytes):
+        with self._lock:
+            self.items += items
+            self.bytes += num_bytes
+
+    def commit(self):
+        """Writes the remaining manifest entries and records the run's totals in the index."""
+        with self._lock:
+            if not self._run_dirs:
+                return
+            self._flush()
+        try:
+            self._update_index(complete=True)
+        except OSError as e:
+            print(f"Could not update the quarantine index for run {self.run_id}: {e}")
+
+
+def describe_copy_cost(results):
+    """Summarizes the cross-volume copies recorded in clean_roots/clean_files results."""
+    copied = sum(r.get("copied_bytes", 0) for r in results)
+    if not copied:
+        return ""
+    seconds = sum(r.get("copy_seconds", 0.0) for r in results)
+    return f" {cleanup_utils.format_size(copied)} had to be copied across volumes ({seconds:.1f}s)."
+
+
+def _load_index():
+    try:
+        with open(path_utils.data_file(INDEX_FILE), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        print(f"Could not read quarantine index: {e}")
+        return {}
+
+
+def _save_index(index):
+    path_utils.atomic_write(path_utils.data_file(INDEX_FILE), json.dumps(index))
+
+
+def _read_manifest(run_dir):
+    """Returns the moves recorded in a run directory, reading runs from before the journal too."""
+    path = os.path.join(run_dir, MANIFEST_FILE)
+    if os.path.exists(path):
+        return [entry for entry in path_utils.read_json_lines(path) if "source" in entry]
+    with open(os.path.join(run_dir, LEGACY_MANIFEST_FILE), "r", encoding="utf-8") as f:
+        return json.load(f)["entries"]
+
+
+def list_runs():
+    """Returns [{"run_id", "created", "items", "bytes", "run_dirs"}], newest first."""
+    with _index_lock:
+        index = _load_index()
+    runs = [dict(info, run_id=run_id) for run_id, info in index.items()]
+    return sorted(runs, key=lambda run: run["created"], reverse=True)
+
+
+def restore_run(run_id=None, on_progress=None):
+    """Moves everything a run quarantined back to its original place (the newest run by default).
+
+    Paths that were recreated in the meantime are left alone and reported as conflicts.
+    on_progress(done, total) is called every RESTORE_BATCH_SIZE items.
+    Returns {"restored", "conflicts", "failures"}, or None if there is nothing to restore.
+    """
+    runs = list_runs()
+    if run_id is not None:
+        runs = [run for run in runs if run["run_id"] == run_id]
+    if not runs:
+        return None
+    run = runs[0]
+    totals = {"restored": 0, "conflicts": 0, "failures": 0}
+    for run_dir in run["run_dirs"]:
+        try:
+            entries = _read_manifest(run_dir)
+        except (OSError, ValueError) as e:
+            print(f"Could not read quarantine manifest in {run_dir}: {e}")
+            totals["failures"] += 1
+            continue
+        for entry in entries:
+            done = sum(totals.values())
+            if on_progress and done and done % RESTORE_BATCH_SIZE == 0:
+                on_progress(done, run["items"])
+            source = entry["source"]
+            if os.path.lexists(source):
+                totals["conflicts"] += 1
+                continue
+            try:
+                os.makedirs(os.path.dirname(source), exist_ok=True)
+                _move(os.path.join(run_dir, entry["dest"]), source)
+                totals["restored"] += 1
+            except OSError as e:
+                print(f"Could not restore {source}: {e}")
+                totals["failures"] += 1
+        if not totals["conflicts"] and not totals["failures"]:
+            shutil.rmtree(run_dir, ignore_errors=True)
+    if not totals["conflicts"] and not totals["failures"]:
+        with _index_lock:
+            index = _load_index()
+            index.pop(run["run_id"], None)
+            _save_index(index)
+    return totals
+
+
+def _quarantine_dirs(index):
+    """Every folder that may hold run directories: the data directory fallback, the parents of the
+    indexed run directories and the quarantine folder of each mounted volume."""
+    dirs = {path_utils.data_file("quarantine")}
+    for info in index.values():
+        dirs.update(os.path.dirname(run_dir) for run_dir in info["run_dirs"])
+    try:
+        import psutil
+        dirs.update(os.path.join(partition.mountpoint, QUARANTINE_DIR) for partition in psutil.disk_partitions())
+    except Exception as e:
+        print(f"Could not list volumes for the quarantine purge: {e}")
+    return dirs
+
+
+def _unindexed_run_dirs(index, cutoff):
+    """Run directories the index does not know, e.g. left by a crash before it was updated,
+    whose last change is older than cutoff."""
+    indexed = {os.path.normcase(run_dir) for info in index.values() for run_dir in info["run_dirs"]}
+    found = []
+    for parent in _quarantine_dirs(index):
+        try:
+            with os.scandir(parent) as it:
+                entries = list(it)
+        except OSError:
+            continue
+        for entry in entries:
+            try:
+                if (entry.is_dir(follow_symlinks=False) and os.path.normcase(entry.path) not in indexed
+                        and entry.stat(follow_symlinks=False).st_mtime < cutoff):
+                    found.append(entry.path)
+            except OSError:
+                continue
+    return found
+
+
+def purge_expired(retention_days=RETENTION_DAYS, now=None):
+    """Deletes quarantined runs older than the retention window, including run directories missing
+    from the index; returns the bytes reclaimed as far as the index knows them."""
+    now = time.time() if now is None else now
+    cutoff = now - retention_days * 86400
+    with _index_lock:
+        index = _load_index()
+    expired = {run_id: info for run_id, info in index.items() if info["created"] < cutoff}
+    reclaimed = 0
+    for run_id, info in expired.items():
+        for run_dir in info["run_dirs"]:
+            shutil.rmtree(run_dir, ignore_errors=True)
+        reclaimed += info.get("bytes", 0)
+    for run_dir in _unindexed_run_dirs(index, cutoff):
+        print(f"Removing unindexed quarantine folder {run_dir}")
+        shutil.rmtree(run_dir, ignore_errors=True)
+    if expired:
+        with _index_lock:
+            index = _load_index()
+            for run_id in expired:
+                index.pop(run_id, None)
+            _save_index(index)
+    return reclaimed
+
+
+def start_background_purge(retention_days=RETENTION_DAYS):
+    def purge():
+        try:
+            purge_expired(retention_days)
+        except Exception as e:
+            print(f"Quarantine purge failed: {e}")
+
+    thread = threading.Thread(target=purge, name="QuarantinePurge", daemon=True)
+    thread.start()
+    return thread
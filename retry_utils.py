@@ -0,0 +1,244 @@
+# retry_utils.py
+import contextlib
+import contextvars
+import ctypes
+import json
+import os
+import sys
+import threading
+import time
+
+import psutil
+
+import cleanup_utils
+import path_utils
+
+QUEUE_FILE = "retry_queue.json"
+FIRST_RETRY_SECONDS = 5
+MAX_BACKOFF_SECONDS = 300
+# Files still locked this long after the first failure are left for the next reboot.
+RETRY_WINDOW_SECONDS = 30 * 60
+MOVEFILE_DELAY_UNTIL_REBOOT = 0x4
+
+_current_run = contextvars.ContextVar("sysopt_retry_run", default=None)
+
+
+class MoveFileExBackend:
+    """Windows: registers the file in PendingFileRenameOperations so it is deleted during the next boot."""
+
+    def schedule(self, path):
+        if not ctypes.windll.kernel32.MoveFileExW(path, None, MOVEFILE_DELAY_UNTIL_REBOOT):
+            raise ctypes.WinError()
+
+
+class NextStartBackend:
+    """Elsewhere there is no delete-on-reboot; the queue keeps the file and retries it after the next boot."""
+
+    def schedule(self, path):
+        pass
+
+
+class MemoryRebootBackend:
+    """Records scheduled paths instead of touching the OS; for tests and simulations."""
+
+    def __init__(self):
+        self.scheduled = []
+
+    def schedule(self, path):
+        self.scheduled.append(path)
+
+
+def default_reboot_backend():
+    return MoveFileExBackend() if sys.platform == "win32" else NextStartBackend()
+
+
+class RetryQueue:
+    """Persistent queue of files a cleaner could not delete, retried with exponential backoff.
+
+    Each entry remembers the run that queued it, its size and mtime; a retry skips files that
+    were replaced in the meantime. After RETRY_WINDOW_SECONDS the entry is handed to the reboot
+    backend and kept until the machine has rebooted, then checked once more.
+    """
+
+    def __init__(self, path=None, reboot_backend=None, clock=time.time, boot_time=psutil.boot_time, remove=os.unlink):
+        self.path = path or path_utils.data_file(QUEUE_FILE)
+        self.reboot_backend = reboot_backend or default_reboot_backend()
+        self.clock = clock
+        self.boot_time = boot_time()
+        self.remove = remove
+        self.entries = {}
+        self.runs = {}
+        self._dirty = False
+        self._lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.entries = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            print(f"Could not read the retry queue: {e}")
+            return
+        now = self.clock()
+        for entry in self.entries.values():
+            if entry.get("reboot_boot_time") is not None and entry["reboot_boot_time"] != self.boot_time:
+                # Rebooted since it was scheduled: Windows will have deleted it; elsewhere try again now.
+                entry["reboot_boot_time"] = None
+                entry["next_attempt"] = now
+
+    def _run_stats(self, run_id):
+        return self.runs.setdefault(run_id, {"queued": 0, "recovered_files": 0, "recovered_bytes": 0, "scheduled_reboot": 0})
+
+    def add(self, path, size, mtime=None, run_id=None):
+        now = self.clock()
+        with self._lock:
+            if path in self.entries:
+                return
+            self.entries[path] = {"size": size, "mtime": mtime, "run_id": run_id, "first_failed": now,
+                                  "attempts": 0, "next_attempt": now + FIRST_RETRY_SECONDS, "reboot_boot_time": None}
+            self._run_stats(run_id)["queued"] += 1
+            self._dirty = True
+        self.wakeup.set()
+
+    def flush(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            data = json.dumps(self.entries)
+            self._dirty = False
+        try:
+            path_utils.atomic_write(self.path, data)
+        except OSError as e:
+            print(f"Could not save the retry queue: {e}")
+
+    def _attempt(self, path, entry):
+        """Returns "removed", "gone" or "locked"."""
+        try:
+            if entry["mtime"] is not None and os.stat(path).st_mtime != entry["mtime"]:
+                # Something recreated the file; it is not the one the cleaner chose.
+                return "gone"
+            self.remove(path)
+        except FileNotFoundError:
+            return "gone"
+        except OSError:
+            return "locked"
+        return "removed"
+
+    def retry_due(self):
+        """Retries every entry whose backoff has expired; returns the seconds until the next one is due, or None."""
+        now = self.clock()
+        with self._lock:
+            due = [(path, dict(entry)) for path, entry in self.entries.items()
+                   if entry["reboot_boot_time"] is None and entry["next_attempt"] <= now]
+        outcomes = [(path, entry, self._attempt(path, entry)) for path, entry in due]
+
+        with self._lock:
+            for path, entry, outcome in outcomes:
+                stats = self._run_stats(entry["run_id"])
+                if outcome != "locked":
+                    if outcome == "removed":
+                        stats["recovered_files"] += 1
+                        stats["recovered_bytes"] += entry["size"]
+                    self.entries.pop(path, None)
+                    continue
+                current = self.entries[path]
+                current["attempts"] += 1
+                if now - current["first_failed"] >= RETRY_WINDOW_SECONDS:
+                    try:
+                        self.reboot_backend.schedule(path)
+                    except OSError as e:
+                        print(f"Could not schedule {path} for deletion at reboot: {e}")
+                        self.entries.pop(path, None)
+                        continue
+                    current["reboot_boot_time"] = self.boot_time
+                    stats["scheduled_reboot"] += 1
+                else:
+                    current["next_attempt"] = now + min(FIRST_RETRY_SECONDS * 2 ** current["attempts"], MAX_BACKOFF_SECONDS)
+            if outcomes:
+                self._dirty = True
+            waiting = [entry["next_attempt"] for entry in self.entries.values() if entry["reboot_boot_time"] is None]
+        self.flush()
+        return max(0.0, min(waiting) - now) if waiting else None
+
+    def pending(self, run_id=None):
+        with self._lock:
+            return sum(1 for entry in self.entries.values()
+                       if entry["reboot_boot_time"] is None and (run_id is None or entry["run_id"] == run_id))
+
+    def stats(self, run_id):
+        with self._lock:
+            return dict(self._run_stats(run_id))
+
+
+class RetryReport:
+    """Stands in for a task result: renders the run's retry outcome at the time it is shown,
+    so a report displayed after the first retries already includes what they recovered."""
+
+    def __init__(self, queue, run_id):
+        self.queue = queue
+        self.run_id = run_id
+
+    def __str__(self):
+        stats = self.queue.stats(self.run_id)
+        return (f"{stats['queued']} locked file(s) queued for retry: {stats['recovered_files']} recovered "
+                f"({cleanup_utils.format_size(stats['recovered_bytes'])}), {self.queue.pending(self.run_id)} still retrying, "
+                f"{stats['scheduled_reboot']} left for deletion at reboot.")
+
+
+_queue = None
+_queue_lock = threading.Lock()
+_worker = None
+
+
+def get_queue():
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = RetryQueue()
+        return _queue
+
+
+@contextlib.contextmanager
+def retry_scope(run_id):
+    """Lets cleaners started in this context queue the files they could not delete under run_id."""
+    token = _current_run.set(run_id)
+    try:
+        yield
+    finally:
+        _current_run.reset(token)
+
+
+def current_collector():
+    """An on_failure(path, size, mtime) callback for cleanup_utils, or None outside a retry scope."""
+    run_id = _current_run.get()
+    if run_id is None:
+        return None
+    queue = get_queue()
+    return lambda path, size, mtime=None: queue.add(path, size, mtime, run_id)
+
+
+def start_worker():
+    """Starts the background thread that works through the queue; safe to call repeatedly."""
+    global _worker
+    queue = get_queue()
+    queue.wakeup.set()
+    with _queue_lock:
+        if _worker is not None and _worker.is_alive():
+            return _worker
+
+        def work():
+            while True:
+                queue.wakeup.clear()
+                try:
+                    delay = queue.retry_due()
+                except Exception as e:
+                    print(f"Retrying locked files failed: {e}")
+                    delay = MAX_BACKOFF_SECONDS
+                queue.wakeup.wait(delay)
+
+        _worker = threading.Thread(target=work, name="LockedFileRetry", daemon=True)
+        _worker.start()
+        return _worker
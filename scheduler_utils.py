@@ -0,0 +1,114 @@
+# scheduler_utils.py
+import contextvars
+import os
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+DEFAULT_MAX_WORKERS = 4
+
+
+def uses_resources(*resources):
+    """Declares the resources an optimization touches, as "kind:path" strings.
+
+    Kinds are free-form ("fs", "service", "registry", "power", ...). Two resources
+    conflict when they share a kind and one path contains the other, so "fs:C:\\"
+    conflicts with every file system resource on that drive.
+    """
+    def decorator(func):
+        func.resources = frozenset(resources)
+        return func
+    return decorator
+
+
+def uses_resources_from(resolve):
+    """Like uses_resources, for tasks whose resources are only known when they run:
+    resolve() is called each time the task is scheduled and returns the resource strings."""
+    def decorator(func):
+        func.resources = lambda: frozenset(resolve())
+        return func
+    return decorator
+
+
+def resources_for(func):
+    """Returns the declared resources, or None for undeclared (exclusive) tasks."""
+    resources = getattr(func, "resources", None)
+    return resources() if callable(resources) else resources
+
+
+def _split(resource):
+    kind, _, path = resource.partition(":")
+    path = os.path.normcase(path).replace("\\", "/").rstrip("/")
+    return kind.lower(), path.lower()
+
+
+def _contains(outer, inner):
+    return inner == outer or inner.startswith(outer + "/") or outer == ""
+
+
+def conflicts(resources_a, resources_b):
+    if resources_a is None or resources_b is None:
+        return True
+    for a in resources_a:
+        kind_a, path_a = _split(a)
+        for b in resources_b:
+            kind_b, path_b = _split(b)
+            if kind_a == kind_b and (_contains(path_a, path_b) or _contains(path_b, path_a)):
+                return True
+    return False
+
+
+def run_sequential(tasks, progress_callback):
+    return {name: func(progress_callback) for name, func in tasks.items()}
+
+
+class FailedResult(str):
+    """The result text of a task that failed. Tasks return it (or raise) so callers can tell
+    failures apart without parsing the message."""
+
+
+def _run_task(name, func, progress_callback):
+    try:
+        return func(progress_callback)
+    except Exception as e:
+        return FailedResult(f"Failed: {e}")
+
+
+CANCELLED_RESULT = "Cancelled before it started."
+
+
+def run_scheduled(tasks, progress_callback, max_workers=DEFAULT_MAX_WORKERS, cancel_event=None):
+    """Runs {name: func(progress_callback)} concurrently wherever declared resources allow.
+
+    Conflicting tasks keep their submission order; results come back in that order too.
+    Once cancel_event is set no further task starts. Tasks run in a copy of the caller's
+    context, so cancel scopes and other context variables reach them.
+    """
+    queue = [(name, func, resources_for(func)) for name, func in tasks.items()]
+    results = {name: None for name in tasks}
+    running = {}
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        while queue or running:
+            if cancel_event is not None and cancel_event.is_set():
+                for name, _, _ in queue:
+                    results[name] = CANCELLED_RESULT
+                queue = []
+                if not running:
+                    break
+            blocked = [resources for _, _, resources in running.values()]
+            waiting = []
+            for name, func, resources in queue:
+                # A task also waits behind earlier queued tasks it conflicts with, preserving order.
+                if len(running) < max_workers and not any(conflicts(resources, other) for other in blocked):
+                    future = pool.submit(contextvars.copy_context().run, _run_task, name, func, progress_callback)
+                    running[future] = (name, func, resources)
+                else:
+                    waiting.append((name, func, resources))
+                blocked.append(resources)
+            queue = waiting
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name, _, _ = running.pop(future)
+                results[name] = future.result()
+
+    return results
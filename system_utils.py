@@ -1,16 +1,46 @@
 # system_utils.py
 import os
 import platform
-import shutil
+import re
 import subprocess
 import threading
 import time
 import ctypes
-import winreg
 
 import psutil
-from cpuinfo import get_cpu_info
-import winshell
+
+import cleanup_utils
+import command_utils
+import instrumentation_utils
+import monitor_utils
+import policy_utils
+import progress_utils
+import quarantine_utils
+import retry_utils
+import scheduler_utils
+import throttle_utils
+import watch_utils
+
+SYSTEM_DRIVE = os.environ.get('SystemDrive', 'C:') + os.sep
+VISUAL_EFFECTS_KEY = r"Software\Microsoft\Windows\CurrentVersion\Explorer\VisualEffects"
+BACKGROUND_APPS_KEY = r"Software\Microsoft\Windows\CurrentVersion\BackgroundAccessApplications"
+SERVICE_WAIT_TIMEOUT = 60
+SERVICE_COMMAND_TIMEOUT = 120
+QUICK_COMMAND_TIMEOUT = 30
+DEFRAG_TIMEOUT = 3 * 3600
+USER_HOME = os.path.expanduser('~')
+DUPLICATE_ROOTS = [os.path.join(USER_HOME, name) for name in ("Downloads", "Documents", "Desktop", "Pictures", "Music", "Videos")]
+DUPLICATE_MIN_SIZE = 1024 * 1024
+# Opt-in: the duplicate finder replaces every copy but the first with a hardlink to it.
+HARDLINK_DUPLICATES = os.getenv("SYSOPT_HARDLINK_DUPLICATES", "0") == "1"
+# Opt-in: keep a live index of the temp roots from change notifications instead of walking them.
+WATCH_TEMP_FILES = os.getenv("SYSOPT_WATCH_TEMP", "0") == "1"
+# Opt-in: cleaners move files into a per-run quarantine that can be undone for RETENTION_DAYS.
+QUARANTINE_DELETIONS = os.getenv("SYSOPT_QUARANTINE", "0") == "1"
+# Files a cleaner finds locked are retried in the background, then left for deletion at reboot.
+RETRY_LOCKED_FILES = os.getenv("SYSOPT_RETRY_LOCKED", "1") == "1"
+
+temp_watcher = None
 
 def get_static_info():
     """Fetches static system information without using the WMI Python library."""
@@ -20,17 +50,18 @@ def get_static_info():
         startupinfo = subprocess.STARTUPINFO()
         startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
         command = "wmic path win32_videocontroller get name"
-        result = subprocess.check_output(command, startupinfo=startupinfo, text=True, stderr=subprocess.DEVNULL)
+        result = subprocess.check_output(command, startupinfo=startupinfo, text=True, stderr=subprocess.DEVNULL, timeout=QUICK_COMMAND_TIMEOUT)
         lines = result.strip().split('\n')
         if len(lines) > 1 and lines[1].strip():
             gpu_info = lines[1].strip()
         else:
             gpu_info = "Not Found"
-    except (subprocess.CalledProcessError, FileNotFoundError):
+    except (subprocess.CalledProcessError, subprocess.TimeoutExpired, FileNotFoundError):
         gpu_info = "N/A (WMIC check failed)"
         print("Could not get GPU info via WMIC.")
 
     os_info = f"{platform.system()} {platform.release()} ({platform.version()})"
+    from cpuinfo import get_cpu_info
     cpu_info_raw = get_cpu_info()
     cpu_info = f"{cpu_info_raw.get('brand_raw', 'N/A')} ({psutil.cpu_count(logical=True)} Cores)"
     total_ram = f"{psutil.virtual_memory().total / (1024**3):.2f} GB"
@@ -59,138 +90,402 @@ def get_static_info():
         "disks": disks,
     }
 
-def get_realtime_stats():
-    """Fetches real-time system usage stats."""
+_cpu_meter = monitor_utils.CpuMeter()
+
+def get_realtime_stats(blocking=True):
+    """Fetches real-time system usage stats. Blocking measures CPU usage over one second;
+    otherwise it is the usage since the previous non-blocking call (or since import)."""
     return {
-        "cpu_usage": psutil.cpu_percent(interval=1),
+        "cpu_usage": psutil.cpu_percent(interval=1) if blocking else _cpu_meter.percent(),
         "ram_usage": psutil.virtual_memory().percent,
-        "disk_usage": psutil.disk_usage('/').percent
+        "disk_usage": psutil.disk_usage(monitor_utils.SYSTEM_ROOT).percent
     }
 
-def clean_temp_files(progress_callback):
+def _run_command(args, **kwargs):
+    """Runs a command through command_utils (timeout, cancellation, streamed output) and
+    records its duration on the current instrumentation span."""
+    start = time.perf_counter()
+    returncode = None
+    kwargs.setdefault("creationflags", subprocess.CREATE_NO_WINDOW)
+    try:
+        result = command_utils.run_command(args, **kwargs)
+        returncode = result.returncode
+        return result
+    except subprocess.CalledProcessError as e:
+        returncode = e.returncode
+        raise
+    finally:
+        instrumentation_utils.record_subprocess(" ".join(args), time.perf_counter() - start, returncode)
+
+def _failed(message):
+    """The result of an optimization that failed: marks its span and tells callers apart from success."""
+    instrumentation_utils.record_error(message)
+    return scheduler_utils.FailedResult(message)
+
+def _wait_for_service(name, status, timeout=SERVICE_WAIT_TIMEOUT):
+    """Polls the service manager until the service reaches status ("running"/"stopped")."""
+    deadline = time.monotonic() + timeout
+    service = psutil.win_service_get(name)
+    while service.status() != status:
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"Service {name} did not reach state '{status}' within {timeout}s")
+        time.sleep(0.1)
+
+def _report_clean_progress(results):
+    progress_utils.report(items_done=sum(r["files_removed"] for r in results.values()),
+                          bytes_done=sum(r["bytes_freed"] for r in results.values()))
+    # Blocks here while the background daemon has paused the run.
+    throttle_utils.checkpoint(command_utils.current_cancel_event())
+
+def start_temp_watcher():
+    """Starts live tracking of the temp roots; returns the watcher, or None where unsupported."""
+    global temp_watcher
+    if temp_watcher is None:
+        watcher = watch_utils.TempWatcher(cleanup_utils.default_temp_roots(), policy_utils.load_policy())
+        if watcher.start():
+            temp_watcher = watcher
+    return temp_watcher
+
+def stop_temp_watcher():
+    global temp_watcher
+    if temp_watcher is not None:
+        temp_watcher.stop()
+        temp_watcher = None
+
+def _ready_temp_watcher(roots):
+    """The watcher can stand in for a walk of the default roots once its first index is built,
+    unless a policy_scope overrides the policy it indexed with."""
+    if roots is None and temp_watcher is not None and temp_watcher.ready.is_set() and policy_utils.scoped_policy() is None:
+        return temp_watcher
+    return None
+
+@scheduler_utils.uses_resources(*(f"fs:{root}" for root in cleanup_utils.default_temp_roots()))
+def clean_temp_files(progress_callback, roots=None):
     progress_callback("Cleaning temporary files...")
-    temp_folders = [os.environ.get('TEMP', ''), os.path.join(os.environ.get('windir', ''), 'Temp')]
-    error_count = 0
-    for folder in temp_folders:
-        if folder and os.path.exists(folder):
-            for item in os.listdir(folder):
-                item_path = os.path.join(folder, item)
-                try:
-                    if os.path.isfile(item_path) or os.path.islink(item_path):
-                        os.unlink(item_path)
-                    elif os.path.isdir(item_path):
-                        shutil.rmtree(item_path)
-                except Exception:
-                    error_count += 1
-    time.sleep(1)
-    return f"Temp files cleaned. Could not remove {error_count} locked file(s)."
+    watcher = _ready_temp_watcher(roots)
+    quarantine = quarantine_utils.current_quarantine()
+    if watcher is not None:
+        # Empty folders stay behind here; the next walking cleanup removes them.
+        results = {"indexed": cleanup_utils.clean_files(watcher.candidates(), cancel_event=command_utils.current_cancel_event(),
+                                                        quarantine=quarantine, on_failure=retry_utils.current_collector())}
+    else:
+        results = cleanup_utils.clean_roots(roots or cleanup_utils.default_temp_roots(), cancel_event=command_utils.current_cancel_event(),
+                                            policy=policy_utils.load_policy(), on_progress=_report_clean_progress, quarantine=quarantine,
+                                            on_failure=retry_utils.current_collector())
+    files_removed = sum(r["files_removed"] for r in results.values())
+    bytes_freed = sum(r["bytes_freed"] for r in results.values())
+    error_count = sum(r["failures"] for r in results.values())
+    # Quarantined bytes count as freed: they are, once the quarantine expires.
+    instrumentation_utils.record(bytes_freed=bytes_freed, files_touched=files_removed + error_count)
+    if quarantine is not None:
+        return (f"Temp files quarantined: {files_removed} file(s), {cleanup_utils.format_size(bytes_freed)} "
+                f"(freed after {quarantine_utils.RETENTION_DAYS} days).{quarantine_utils.describe_copy_cost(results.values())} "
+                f"Could not move {error_count} locked file(s).")
+    return (f"Temp files cleaned: {files_removed} file(s), {cleanup_utils.format_size(bytes_freed)} freed. "
+            f"Could not remove {error_count} locked file(s).")
+
+class _SHQUERYRBINFO(ctypes.Structure):
+    _fields_ = [("cbSize", ctypes.c_ulong), ("i64Size", ctypes.c_int64), ("i64NumItems", ctypes.c_int64)]
+
+def _windows_update_cache_path():
+    return os.path.join(os.environ.get('windir', ''), 'SoftwareDistribution')
+
+def scan_temp_files(on_progress=None, budget_bytes=None, roots=None, on_files=None):
+    watcher = _ready_temp_watcher(roots)
+    if watcher is not None:
+        if on_files is not None:
+            on_files([(size, path) for path, size in watcher.candidates()])
+        return watcher.reclaimable()
+    return cleanup_utils.scan_roots(roots or cleanup_utils.default_temp_roots(), budget_bytes=budget_bytes, on_progress=on_progress,
+                                    policy=policy_utils.load_policy(), on_files=on_files)
 
+def scan_windows_update_cache(on_progress=None, budget_bytes=None, on_files=None):
+    return cleanup_utils.scan_roots([_windows_update_cache_path()], budget_bytes=budget_bytes, on_progress=on_progress,
+                                    on_files=on_files)
+
+def scan_recycle_bin(on_progress=None, budget_bytes=None, on_files=None):
+    """Asks the shell for the Recycle Bin totals of all drives instead of walking $Recycle.Bin,
+    so there are no individual files for on_files."""
+    info = _SHQUERYRBINFO()
+    info.cbSize = ctypes.sizeof(info)
+    if ctypes.windll.shell32.SHQueryRecycleBinW(None, ctypes.byref(info)) != 0:
+        raise OSError("SHQueryRecycleBinW failed")
+    if on_progress:
+        on_progress(info.i64NumItems, info.i64Size)
+    return {"items": info.i64NumItems, "bytes": info.i64Size, "complete": True}
+
+@scheduler_utils.uses_resources(f"fs:{_windows_update_cache_path()}", "service:wuauserv")
 def clean_windows_update_cache(progress_callback):
     progress_callback("Cleaning Windows Update cache...")
     try:
-        creation_flags = subprocess.CREATE_NO_WINDOW
-        subprocess.run(['net', 'stop', 'wuauserv'], check=True, capture_output=True, creationflags=creation_flags)
-        update_cache_path = os.path.join(os.environ.get('windir'), 'SoftwareDistribution')
+        _run_command(['net', 'stop', 'wuauserv'], check=True, timeout=SERVICE_COMMAND_TIMEOUT)
+        _wait_for_service('wuauserv', 'stopped')
+        update_cache_path = _windows_update_cache_path()
+        quarantine = quarantine_utils.current_quarantine()
+        note = ""
         if os.path.exists(update_cache_path):
-            shutil.rmtree(update_cache_path, ignore_errors=True)
-            time.sleep(0.5)
-            os.makedirs(update_cache_path, exist_ok=True)
-        subprocess.run(['net', 'start', 'wuauserv'], check=True, capture_output=True, creationflags=creation_flags)
-        time.sleep(2)
-        return "Windows Update cache cleared successfully."
+            totals = cleanup_utils.clean_roots([update_cache_path], cancel_event=command_utils.current_cancel_event(),
+                                               on_progress=_report_clean_progress, quarantine=quarantine,
+                                               on_failure=retry_utils.current_collector())[update_cache_path]
+            instrumentation_utils.record(bytes_freed=totals["bytes_freed"], files_touched=totals["files_removed"] + totals["failures"])
+            if quarantine is not None:
+                note = f" Moved {cleanup_utils.format_size(totals['bytes_freed'])} to quarantine.{quarantine_utils.describe_copy_cost([totals])}"
+        _run_command(['net', 'start', 'wuauserv'], check=True, timeout=SERVICE_COMMAND_TIMEOUT, cancellable=False)
+        _wait_for_service('wuauserv', 'running')
+        return "Windows Update cache cleared successfully." + note
     except Exception as e:
-        subprocess.run(['net', 'start', 'wuauserv'], capture_output=True, creationflags=subprocess.CREATE_NO_WINDOW)
-        return f"Failed to clear Update cache: {e}"
+        # Always bring the service back, even when the run was cancelled.
+        try:
+            _run_command(['net', 'start', 'wuauserv'], timeout=SERVICE_COMMAND_TIMEOUT, cancellable=False)
+        except Exception as restart_error:
+            print(f"Could not restart wuauserv: {restart_error}")
+        return _failed(f"Failed to clear Update cache: {e}")
 
+@scheduler_utils.uses_resources(f"fs:{os.path.join(SYSTEM_DRIVE, '$Recycle.Bin')}", "shell:recyclebin")
 def empty_recycle_bin(progress_callback):
     progress_callback("Emptying Recycle Bin...")
     try:
+        import winshell
         if winshell.recycle_bin().size() == 0:
             return "Recycle Bin is already empty."
+        try:
+            contents = scan_recycle_bin()
+        except OSError:
+            contents = {"items": 0, "bytes": 0}
         winshell.recycle_bin().empty(confirm=False, show_progress=False, sound=False)
-        time.sleep(1)
+        instrumentation_utils.record(bytes_freed=contents["bytes"], files_touched=contents["items"])
         return "Recycle Bin emptied successfully."
     except Exception as e:
-        return f"Failed to empty Recycle Bin: {e}"
+        return _failed(f"Failed to empty Recycle Bin: {e}")
 
+@scheduler_utils.uses_resources("service:Dnscache")
 def clear_dns_cache(progress_callback):
     progress_callback("Clearing DNS cache...")
     try:
-        subprocess.run(['ipconfig', '/flushdns'], check=True, capture_output=True, creationflags=subprocess.CREATE_NO_WINDOW)
-        time.sleep(1)
+        _run_command(['ipconfig', '/flushdns'], check=True, timeout=QUICK_COMMAND_TIMEOUT)
         return "DNS cache flushed successfully."
     except Exception as e:
-        return f"Failed to flush DNS cache: {e}"
+        return _failed(f"Failed to flush DNS cache: {e}")
 
+# Defragmenting the whole system drive conflicts with every cleaner writing to it.
+@scheduler_utils.uses_resources(f"fs:{SYSTEM_DRIVE}")
 def optimize_disk(progress_callback):
     progress_callback("Optimizing system disk (Defrag/TRIM)...")
     try:
-        subprocess.run(['defrag', 'C:', '/O'], check=True, capture_output=True, creationflags=subprocess.CREATE_NO_WINDOW)
-        time.sleep(2)
+        def on_line(line):
+            match = re.search(r"(\d{1,3})\s*%", line)
+            if match:
+                progress_callback(f"Optimizing system disk (Defrag/TRIM)... {match.group(1)}%")
+
+        _run_command(['defrag', 'C:', '/O'], check=True, timeout=DEFRAG_TIMEOUT, on_line=on_line)
         return "System disk optimization complete."
     except Exception as e:
-        return f"Disk optimization failed: {e}"
+        return _failed(f"Disk optimization failed: {e}")
 
+@scheduler_utils.uses_resources("power:scheme")
 def set_high_performance_power_plan(progress_callback):
     progress_callback("Setting power plan to High Performance...")
     try:
         command = ['powercfg', '/l']
-        result = subprocess.run(command, capture_output=True, text=True, check=True, creationflags=subprocess.CREATE_NO_WINDOW)
+        result = _run_command(command, check=True, timeout=QUICK_COMMAND_TIMEOUT)
         for line in result.stdout.splitlines():
             if "high performance" in line.lower():
                 guid = line.split()[3]
-                subprocess.run(['powercfg', '/s', guid], check=True, creationflags=subprocess.CREATE_NO_WINDOW)
-                time.sleep(1)
+                _run_command(['powercfg', '/s', guid], check=True, timeout=QUICK_COMMAND_TIMEOUT)
+                active = _run_command(['powercfg', '/getactivescheme'], check=True, timeout=QUICK_COMMAND_TIMEOUT)
+                if guid.lower() not in active.stdout.lower():
+                    return _failed("Power plan change did not take effect.")
                 return "Power plan set to High Performance."
         return "High Performance plan not found."
     except Exception as e:
-        return f"Failed to set power plan: {e}"
+        return _failed(f"Failed to set power plan: {e}")
 
+@scheduler_utils.uses_resources(f"registry:HKCU\\{VISUAL_EFFECTS_KEY}")
 def adjust_visual_effects(progress_callback):
     progress_callback("Adjusting visual effects for performance...")
     try:
+        import winreg
         key = winreg.HKEY_CURRENT_USER
-        path = r"Software\Microsoft\Windows\CurrentVersion\Explorer\VisualEffects"
-        with winreg.CreateKey(key, path) as reg_key:
+        with winreg.CreateKey(key, VISUAL_EFFECTS_KEY) as reg_key:
             winreg.SetValueEx(reg_key, "VisualFxSetting", 0, winreg.REG_DWORD, 2)
         ctypes.windll.user32.SystemParametersInfoW(0x0057, 0, 0, 0x0002)
-        time.sleep(1)
         return "Visual effects adjusted for performance."
     except Exception as e:
-        return f"Failed to adjust visual effects: {e}"
+        return _failed(f"Failed to adjust visual effects: {e}")
 
+@scheduler_utils.uses_resources(f"registry:HKCU\\{BACKGROUND_APPS_KEY}")
 def disable_background_apps(progress_callback):
     progress_callback("Disabling background apps...")
     try:
+        import winreg
         key = winreg.HKEY_CURRENT_USER
-        path = r"Software\Microsoft\Windows\CurrentVersion\BackgroundAccessApplications"
-        with winreg.CreateKey(key, path) as reg_key:
+        with winreg.CreateKey(key, BACKGROUND_APPS_KEY) as reg_key:
             winreg.SetValueEx(reg_key, "GlobalUserDisabled", 0, winreg.REG_DWORD, 1)
-        time.sleep(1)
         return "Background apps setting disabled."
     except Exception as e:
-        return f"Failed to disable background apps: {e}"
+        return _failed(f"Failed to disable background apps: {e}")
 
-def run_optimizations(selected_optimizations, progress_callback, completion_callback):
+@scheduler_utils.uses_resources(f"fs:{USER_HOME}")
+def find_duplicate_files(progress_callback, roots=None):
+    """Returns a duplicate_utils.DuplicateReport, whose groups the GUI lists for review."""
+    progress_callback("Searching for duplicate files...")
+    import duplicate_utils
+    try:
+        report = duplicate_utils.DuplicateReport(hardlink=HARDLINK_DUPLICATES)
+        cancel_event = command_utils.current_cancel_event()
+        found = duplicate_utils.find_duplicates(roots or DUPLICATE_ROOTS, min_size=DUPLICATE_MIN_SIZE, on_progress=progress_callback,
+                                                cancel_event=cancel_event)
+        try:
+            for size, paths in found:
+                throttle_utils.checkpoint(cancel_event)
+                if cancel_event is not None and cancel_event.is_set():
+                    break
+                linked = duplicate_utils.replace_with_hardlinks(paths) if HARDLINK_DUPLICATES else 0
+                report.add(size, paths, linked)
+                instrumentation_utils.record(files_touched=len(paths), bytes_freed=linked)
+                progress_callback(f"Found {len(report.groups)} duplicate group(s), {cleanup_utils.format_size(report.wasted)} wasted...")
+        finally:
+            # Stops the hashing still queued right away.
+            found.close()
+        report.cancelled = cancel_event is not None and cancel_event.is_set()
+        return report
+    except Exception as e:
+        return _failed(f"Duplicate search failed: {e}")
+
+# Stable keys for the headless CLI, mapped to the labels the GUI shows.
+OPTIMIZATIONS = {
+    "clean-temp": ("Clean Temporary Files", clean_temp_files),
+    "update-cache": ("Clear Windows Update Cache", clean_windows_update_cache),
+    "recycle-bin": ("Empty Recycle Bin", empty_recycle_bin),
+    "dns": ("Clear DNS Cache", clear_dns_cache),
+    "defrag": ("Optimize System Disk (Defrag/TRIM)", optimize_disk),
+    "power-plan": ("Set High Performance Power Plan", set_high_performance_power_plan),
+    "visual-effects": ("Adjust Visual Effects for Performance", adjust_visual_effects),
+    "background-apps": ("Disable Background Apps (Global)", disable_background_apps),
+    "duplicates": ("Find Duplicate Files", find_duplicate_files),
+}
+
+# Long-running optimizations the GUI leaves unchecked by default.
+OPT_IN = {find_duplicate_files}
+
+SCANNERS = {
+    clean_temp_files: scan_temp_files,
+    clean_windows_update_cache: scan_windows_update_cache,
+    empty_recycle_bin: scan_recycle_bin,
+}
+
+# Cleaner threads shared by all plugin cleaners running in parallel; set by load_plugins().
+PLUGIN_WORKER_BUDGET = None
+
+def _plugin_cleaner(plugin):
+    def clean(progress_callback):
+        progress_callback(f"{plugin.label}...")
+        roots = plugin.resolve_roots()
+        if not roots:
+            return "Nothing to clean."
+        cancel_event = command_utils.current_cancel_event()
+        workers = PLUGIN_WORKER_BUDGET.acquire(plugin.workers, cancel_event)
+        if not workers:
+            return scheduler_utils.CANCELLED_RESULT
+        quarantine = quarantine_utils.current_quarantine()
+        try:
+            results = cleanup_utils.clean_roots(roots, max_workers=workers, cancel_event=cancel_event, policy=plugin.policy(),
+                                                on_progress=_report_clean_progress, quarantine=quarantine,
+                                                on_failure=retry_utils.current_collector())
+        finally:
+            PLUGIN_WORKER_BUDGET.release(workers)
+        files_removed = sum(r["files_removed"] for r in results.values())
+        bytes_freed = sum(r["bytes_freed"] for r in results.values())
+        error_count = sum(r["failures"] for r in results.values())
+        instrumentation_utils.record(bytes_freed=bytes_freed, files_touched=files_removed + error_count)
+        if quarantine is not None:
+            return (f"Quarantined {files_removed} file(s), {cleanup_utils.format_size(bytes_freed)}."
+                    f"{quarantine_utils.describe_copy_cost(results.values())} Could not move {error_count} file(s).")
+        return f"Removed {files_removed} file(s), {cleanup_utils.format_size(bytes_freed)} freed. Could not remove {error_count} file(s)."
+
+    # Cleaners of unrelated folders run in parallel; the roots are matched when the run is scheduled.
+    return scheduler_utils.uses_resources_from(lambda: [f"fs:{root}" for root in plugin.resolve_roots()])(clean)
+
+def _plugin_scanner(plugin):
+    def scan(on_progress=None, budget_bytes=None, on_files=None):
+        return cleanup_utils.scan_roots(plugin.resolve_roots(), budget_bytes=budget_bytes, on_progress=on_progress, policy=plugin.policy(),
+                                        on_files=on_files)
+    return scan
+
+_plugins_lock = threading.Lock()
+_plugins_loaded = False
+
+def load_plugins():
+    """Adds the cleaner plugins to OPTIMIZATIONS, SCANNERS and OPT_IN; the GUI, --list/--run, the
+    daemon and the agent call this before reading them. Safe to call repeatedly."""
+    global _plugins_loaded, PLUGIN_WORKER_BUDGET
+    # Imported here: most runs never load plugins, and system_utils should import fast.
+    import plugin_utils
+    with _plugins_lock:
+        if _plugins_loaded:
+            return
+        _plugins_loaded = True
+        PLUGIN_WORKER_BUDGET = plugin_utils.WorkerBudget(cleanup_utils.DEFAULT_MAX_WORKERS)
+        for plugin in plugin_utils.discover(reserved=OPTIMIZATIONS):
+            func = _plugin_cleaner(plugin)
+            OPTIMIZATIONS[plugin.key] = (plugin.label, func)
+            SCANNERS[func] = _plugin_scanner(plugin)
+            if plugin.risk != "low":
+                OPT_IN.add(func)
+
+def resume_locked_file_retries():
+    """Picks up files that earlier sessions left in the retry queue."""
+    if RETRY_LOCKED_FILES and retry_utils.get_queue().pending():
+        retry_utils.start_worker()
+
+def _run_stats(stats):
+    sample = stats() if stats is not None else None
+    return sample if sample is not None else get_realtime_stats(blocking=False)
+
+def run_optimizations(selected_optimizations, progress_callback, completion_callback, cancel_event=None, throttle=None, policy=None,
+                      stats=None):
+    """Runs the optimizations on a background thread and returns it. stats() supplies the usage
+    snapshots taken before and after, e.g. a running MetricsSampler's latest; without it (or
+    before its first tick) they are non-blocking reads."""
     def task():
-        results = {}
-        before_stats = get_realtime_stats()
-        
-        progress_callback("Backing up critical settings...")
-        backup_utils.backup_critical_settings()
-        time.sleep(0.5)
-        
-        for name, func in selected_optimizations.items():
-            results[name] = func(progress_callback)
-        
-        time.sleep(2) 
-        after_stats = get_realtime_stats()
-        
+        with command_utils.cancel_scope(cancel_event), throttle_utils.throttle_scope(throttle), policy_utils.policy_scope(policy):
+            before_stats = _run_stats(stats)
+
+            recorder = instrumentation_utils.RunRecorder()
+            progress_callback("Backing up critical settings...")
+            snapshot = backup_utils.backup_critical_settings(recorder.run_id)
+
+            instrumented = {name: recorder.wrap(name, progress_utils.run_as(name, func)) for name, func in selected_optimizations.items()}
+            quarantine = quarantine_utils.Quarantine(recorder.run_id) if QUARANTINE_DELETIONS else None
+            # Quarantined runs are undone by moving files back, so they never queue deferred deletes.
+            retry_run = recorder.run_id if RETRY_LOCKED_FILES and quarantine is None else None
+            try:
+                with quarantine_utils.quarantine_scope(quarantine), retry_utils.retry_scope(retry_run):
+                    results = scheduler_utils.run_scheduled(instrumented, progress_callback, cancel_event=cancel_event)
+            finally:
+                # The snapshot was journaled when the run began; this appends what changed since.
+                snapshot.commit()
+                if quarantine is not None:
+                    quarantine.commit()
+            recorder.export()
+            if retry_run is not None and retry_utils.get_queue().stats(retry_run)["queued"]:
+                retry_utils.get_queue().flush()
+                retry_utils.start_worker()
+                results["Locked Files"] = retry_utils.RetryReport(retry_utils.get_queue(), retry_run)
+
+            after_stats = _run_stats(stats)
+            import history_utils
+            history_utils.record_run(recorder, results, before_stats, after_stats,
+                                     cancelled=cancel_event is not None and cancel_event.is_set())
+
         completion_callback(before_stats, after_stats, results)
 
     global backup_utils
     import backup_utils
+    if QUARANTINE_DELETIONS:
+        quarantine_utils.start_background_purge()
     
     thread = threading.Thread(target=task)
     thread.daemon = True
-    thread.start()
\ No newline at end of file
+    thread.start()
+    return thread
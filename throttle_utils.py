@@ -0,0 +1,46 @@
+# throttle_utils.py
+import contextlib
+import contextvars
+import threading
+
+_current_throttle = contextvars.ContextVar("sysopt_throttle", default=None)
+
+
+class Throttle:
+    """Pause gate for a background run: cleaners call checkpoint() between batches of work
+    and block there while the daemon has paused the run."""
+
+    def __init__(self):
+        self._running = threading.Event()
+        self._running.set()
+
+    def pause(self):
+        self._running.clear()
+
+    def resume(self):
+        self._running.set()
+
+    @property
+    def paused(self):
+        return not self._running.is_set()
+
+    def checkpoint(self, cancel_event=None):
+        while not self._running.wait(0.5):
+            if cancel_event is not None and cancel_event.is_set():
+                return
+
+
+@contextlib.contextmanager
+def throttle_scope(throttle):
+    token = _current_throttle.set(throttle)
+    try:
+        yield throttle
+    finally:
+        _current_throttle.reset(token)
+
+
+def checkpoint(cancel_event=None):
+    """Blocks while the run in this context is paused; returns at once outside the daemon."""
+    throttle = _current_throttle.get()
+    if throttle is not None:
+        throttle.checkpoint(cancel_event)
@@ -0,0 +1,233 @@
+# timeseries_utils.py
+import mmap
+import os
+import struct
+import threading
+import time
+
+import path_utils
+
+MAGIC = b"SOTS"
+FORMAT_VERSION = 1
+HEADER_SIZE = 4096
+HEADER = struct.Struct("<4sIIIQQ")  # magic, version, record size, capacity, head, count
+SLOT_NAME_SIZE = 64
+MAX_PARTITIONS = 8
+# After the slot names, the header holds the bucket still being averaged into this ring:
+# start, sample count, then the running sums.
+BUCKET_OFFSET = HEADER.size + MAX_PARTITIONS * SLOT_NAME_SIZE
+FIELDS = ("cpu_usage", "ram_usage", "disk_usage")
+
+# (file name, seconds per record, records kept): 6 hours at 1 s, 7 days at 1 min, 1 year at 1 h.
+TIERS = (
+    ("metrics_1s.ring", 1, 6 * 3600),
+    ("metrics_1m.ring", 60, 7 * 24 * 60),
+    ("metrics_1h.ring", 3600, 365 * 24),
+)
+
+
+class RingFile:
+    """Fixed-width (timestamp, values...) records in a memory-mapped circular file."""
+
+    def __init__(self, path, capacity, num_values=len(FIELDS) + MAX_PARTITIONS):
+        self.record = struct.Struct(f"<d{num_values}f")
+        self.bucket_record = struct.Struct(f"<dI{num_values}d")
+        self.capacity = capacity
+        self.path = path
+        size = HEADER_SIZE + self.record.size * capacity
+
+        fd = os.open(path, os.O_RDWR | os.O_CREAT | getattr(os, "O_BINARY", 0))
+        try:
+            existing = os.fstat(fd).st_size
+            if existing != size:
+                os.ftruncate(fd, size)
+            self._mm = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+
+        magic, version, record_size, stored_capacity, self.head, self.count = HEADER.unpack_from(self._mm, 0)
+        if (magic, version, record_size, stored_capacity) != (MAGIC, FORMAT_VERSION, self.record.size, capacity):
+            # New file or an incompatible layout: start over rather than misread old records.
+            self.head = self.count = 0
+            self._mm[:HEADER_SIZE] = bytes(HEADER_SIZE)
+            self._write_header()
+
+    def _write_header(self):
+        HEADER.pack_into(self._mm, 0, MAGIC, FORMAT_VERSION, self.record.size, self.capacity, self.head, self.count)
+
+    def slot_names(self):
+        names = []
+        for i in range(MAX_PARTITIONS):
+            offset = HEADER.size + i * SLOT_NAME_SIZE
+            names.append(self._mm[offset:offset + SLOT_NAME_SIZE].rstrip(b"\0").decode("utf-8", "replace"))
+        return names
+
+    def set_slot_name(self, index, name):
+        offset = HEADER.size + index * SLOT_NAME_SIZE
+        self._mm[offset:offset + SLOT_NAME_SIZE] = name.encode("utf-8")[:SLOT_NAME_SIZE].ljust(SLOT_NAME_SIZE, b"\0")
+
+    def pending_bucket(self):
+        """(start, count, sums) of the bucket saved by save_bucket(), or None."""
+        start, count, *sums = self.bucket_record.unpack_from(self._mm, BUCKET_OFFSET)
+        return (start, count, sums) if count else None
+
+    def save_bucket(self, start, count, sums):
+        self.bucket_record.pack_into(self._mm, BUCKET_OFFSET, start, count, *sums)
+
+    def append(self, timestamp, values):
+        self.record.pack_into(self._mm, HEADER_SIZE + self.head * self.record.size, timestamp, *values)
+        self.head = (self.head + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+        self._write_header()
+
+    def _read(self, logical_index):
+        physical = (self.head - self.count + logical_index) % self.capacity
+        return self.record.unpack_from(self._mm, HEADER_SIZE + physical * self.record.size)
+
+    def _timestamp(self, logical_index):
+        physical = (self.head - self.count + logical_index) % self.capacity
+        return struct.unpack_from("<d", self._mm, HEADER_SIZE + physical * self.record.size)[0]
+
+    def _bisect(self, timestamp):
+        low, high = 0, self.count
+        while low < high:
+            mid = (low + high) // 2
+            if self._timestamp(mid) < timestamp:
+                low = mid + 1
+            else:
+                high = mid
+        return low
+
+    def oldest(self):
+        return self._timestamp(0) if self.count else None
+
+    def between(self, start, end):
+        """Records with start <= timestamp < end, oldest first."""
+        first = self._bisect(start)
+        last = self._bisect(end)
+        return [self._read(i) for i in range(first, last)]
+
+    def flush(self):
+        self._mm.flush()
+
+    def close(self):
+        self._mm.flush()
+        self._mm.close()
+
+
+class _Bucket:
+    def __init__(self, start, num_values, count=0, sums=None):
+        self.start = start
+        self.sums = list(sums) if sums is not None else [0.0] * num_values
+        self.count = count
+
+    def add(self, values):
+        self.sums = [total + value for total, value in zip(self.sums, values)]
+        self.count += 1
+
+    def average(self):
+        return [total / self.count for total in self.sums]
+
+
+class TimeSeriesStore:
+    """Keeps CPU/RAM/disk/per-partition history in 1 s, 1 min and 1 h ring files.
+
+    Samples are the dicts produced by MetricsSampler; coarser tiers are written when a
+    minute or hour bucket closes. The open buckets live in the ring files' headers, so a
+    restart continues them instead of losing the partial minute and hour.
+    """
+
+    def __init__(self, directory=None):
+        directory = directory or path_utils.get_data_dir()
+        self._lock = threading.Lock()
+        self.tiers = []
+        for name, resolution, capacity in TIERS:
+            self.tiers.append((resolution, RingFile(os.path.join(directory, name), capacity)))
+        self._buckets = [None]
+        for _, ring in self.tiers[1:]:
+            pending = ring.pending_bucket()
+            self._buckets.append(_Bucket(pending[0], len(pending[2]), pending[1], pending[2]) if pending else None)
+        self._partitions = [name for name in self.tiers[0][1].slot_names()]
+        self._dropped = set()
+
+    def _partition_slot(self, mountpoint):
+        if mountpoint in self._partitions:
+            return self._partitions.index(mountpoint)
+        if "" in self._partitions:
+            slot = self._partitions.index("")
+            self._partitions[slot] = mountpoint
+            for _, ring in self.tiers:
+                ring.set_slot_name(slot, mountpoint)
+            return slot
+        if mountpoint not in self._dropped:
+            self._dropped.add(mountpoint)
+            print(f"Usage history already tracks {MAX_PARTITIONS} drives; not recording {mountpoint}.")
+        return None
+
+    def add(self, sample):
+        values = [float(sample.get(field, 0.0)) for field in FIELDS] + [0.0] * MAX_PARTITIONS
+        with self._lock:
+            for mountpoint, percent in sample.get("partitions", {}).items():
+                slot = self._partition_slot(mountpoint)
+                if slot is not None:
+                    values[len(FIELDS) + slot] = float(percent)
+            self._add(0, sample["timestamp"], values)
+
+    def _add(self, tier_index, timestamp, values):
+        resolution, ring = self.tiers[tier_index]
+        if tier_index == 0:
+            ring.append(timestamp, values)
+        if tier_index + 1 >= len(self.tiers):
+            return
+        next_resolution = self.tiers[tier_index + 1][0]
+        bucket_start = timestamp - timestamp % next_resolution
+        bucket = self._buckets[tier_index + 1]
+        if bucket is not None and bucket.start != bucket_start:
+            average = bucket.average()
+            self.tiers[tier_index + 1][1].append(bucket.start, average)
+            self._add(tier_index + 1, bucket.start, average)
+            bucket = None
+        if bucket is None:
+            bucket = self._buckets[tier_index + 1] = _Bucket(bucket_start, len(values))
+        bucket.add(values)
+        self.tiers[tier_index + 1][1].save_bucket(bucket.start, bucket.count, bucket.sums)
+
+    def _tier_for(self, start):
+        """The finest tier that still reaches back to start."""
+        for resolution, ring in self.tiers:
+            oldest = ring.oldest()
+            if oldest is not None and oldest <= start:
+                return resolution, ring
+        return self.tiers[-1] if self.tiers[-1][1].count else self.tiers[0]
+
+    def series(self, start, end=None):
+        """Returns [{"timestamp", "cpu_usage", "ram_usage", "disk_usage", "partitions"}] for [start, end)."""
+        end = end or time.time()
+        with self._lock:
+            _, ring = self._tier_for(start)
+            records = ring.between(start, end)
+            partitions = list(self._partitions)
+        series = []
+        for record in records:
+            point = {"timestamp": record[0]}
+            point.update(zip(FIELDS, record[1:1 + len(FIELDS)]))
+            point["partitions"] = {name: value for name, value in zip(partitions, record[1 + len(FIELDS):]) if name}
+            series.append(point)
+        return series
+
+    def window_average(self, start, end=None):
+        """Mean CPU/RAM/disk usage over [start, end), or None when there is no data."""
+        points = self.series(start, end)
+        if not points:
+            return None
+        return {field: sum(p[field] for p in points) / len(points) for field in FIELDS}
+
+    def flush(self):
+        with self._lock:
+            for _, ring in self.tiers:
+                ring.flush()
+
+    def close(self):
+        with self._lock:
+            for _, ring in self.tiers:
+                ring.close()
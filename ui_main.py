@@ -1,7 +1,6 @@
 # ui_main.py
 import customtkinter as ctk
-from tkinter import messagebox
-from PIL import Image
+from tkinter import filedialog, messagebox
 import threading
 import time
 import webbrowser
@@ -9,7 +8,16 @@ import sys
 import os
 
 import system_utils
-import backup_utils
+import cache_utils
+import cleanup_utils
+import duplicate_utils
+import history_utils
+import monitor_utils
+import process_utils
+import progress_utils
+import list_model
+import ui_widgets
+import timeseries_utils
 
 def resource_path(relative_path):
     """ Get absolute path to resource, works for dev and for PyInstaller """
@@ -30,6 +38,27 @@ RED = "#FF5733"
 YELLOW = "#FFC300"
 GREEN = "#00A67E"
 
+REFRESH_INTERVAL_MS = 1000
+# Progress from worker threads is drained on this tick, so the label updates at most 10x/s per task.
+PROGRESS_INTERVAL_MS = 100
+REPORT_WINDOW_S = 15
+SPARKLINE_HEIGHT = 80
+# Label -> seconds of history; ranges beyond a few minutes come from the coarser ring files.
+HISTORY_RANGES = {"5 min": 300, "1 hour": 3600, "1 day": 86400, "1 week": 7 * 86400}
+SCAN_BUDGET_BYTES = 50 * 1024**3
+REVIEW_FILE_LIMIT = 1_000_000
+# Review list sources: (columns, column widths, formatters); sizes come first and paths last.
+REVIEW_SOURCES = {
+    "Large files": (("Size", "Path"), (120, 800), (cleanup_utils.format_size, str)),
+    "Cleanup candidates": (("Size", "Path"), (120, 800), (cleanup_utils.format_size, str)),
+    "Duplicates": (("Size", "Group", "Path"), (120, 70, 730), (cleanup_utils.format_size, str, str)),
+}
+DEFAULT_REVIEW_SOURCE = "Large files"
+FILTER_DELAY_MS = 250
+RUN_HISTORY_WEEKS = 12
+RUN_HISTORY_LIMIT = 50
+
+
 class App(ctk.CTk):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -48,12 +77,26 @@ class App(ctk.CTk):
         self.tab_view.grid(row=1, column=0, sticky="nsew", padx=20, pady=(0, 20))
 
         self.tab_view.add("Dashboard")
+        self.tab_view.add("Disk Analyzer")
+        self.tab_view.add("History")
         self.tab_view.add("About")
         
         self._create_dashboard_tab(self.tab_view.tab("Dashboard"))
+        self._create_disk_analyzer_tab(self.tab_view.tab("Disk Analyzer"))
+        self._create_history_tab(self.tab_view.tab("History"))
         self._create_about_tab(self.tab_view.tab("About"))
 
+        try:
+            self.history = timeseries_utils.TimeSeriesStore()
+        except Exception as e:
+            print(f"Could not open metrics history: {e}")
+            self.history = None
+        self.sampler = monitor_utils.MetricsSampler(store=self.history, processes=process_utils.ProcessSampler())
+        self.sampler.start()
+        self.temp_watcher = system_utils.start_temp_watcher() if system_utils.WATCH_TEMP_FILES else None
+        threading.Thread(target=system_utils.resume_locked_file_retries, daemon=True).start()
         self.update_realtime_stats()
+        self.refresh_run_history()
         self.bind("<FocusIn>", self.handle_focus_in)
 
     def _create_title_bar(self):
@@ -64,6 +107,7 @@ class App(ctk.CTk):
         self.title_bar.bind("<ButtonRelease-1>", self.stop_move)
         self.title_bar.bind("<B1-Motion>", self.do_move)
 
+        from PIL import Image
         logo_image = ctk.CTkImage(Image.open(resource_path("assets/logo.png")), size=(24, 24))
         logo_label = ctk.CTkLabel(self.title_bar, image=logo_image, text="")
         logo_label.pack(side="left", padx=10)
@@ -131,11 +175,27 @@ class App(ctk.CTk):
         self.ram_label = ctk.CTkLabel(parent, text="0%")
         self.ram_label.grid(row=5, column=2, padx=10)
         
-        ctk.CTkLabel(parent, text="Disk Usage (C:)", font=("Roboto", 12)).grid(row=6, column=0, padx=20, sticky="w")
+        ctk.CTkLabel(parent, text=f"Disk Usage ({monitor_utils.SYSTEM_ROOT.rstrip(os.sep) or os.sep})", font=("Roboto", 12)).grid(row=6, column=0, padx=20, sticky="w")
         self.disk_progress = ctk.CTkProgressBar(parent, progress_color=GREEN)
-        self.disk_progress.grid(row=7, column=0, columnspan=2, sticky="ew", padx=20, pady=(0, 20))
+        self.disk_progress.grid(row=7, column=0, columnspan=2, sticky="ew", padx=20, pady=(0, 5))
         self.disk_label = ctk.CTkLabel(parent, text="0%")
         self.disk_label.grid(row=7, column=2, padx=10)
+        self.io_label = ctk.CTkLabel(parent, text="", font=("Consolas", 11), justify="left", anchor="w")
+        self.io_label.grid(row=8, column=0, columnspan=3, sticky="ew", padx=20, pady=(0, 15))
+
+        history_header = ctk.CTkFrame(parent, fg_color="transparent")
+        history_header.grid(row=9, column=0, columnspan=3, sticky="ew", padx=20)
+        ctk.CTkLabel(history_header, text="History (CPU / RAM)", font=("Roboto", 12)).pack(side="left")
+        self.history_range = ctk.StringVar(value="5 min")
+        ctk.CTkSegmentedButton(history_header, values=list(HISTORY_RANGES), variable=self.history_range,
+                               command=lambda _: self.draw_history(force=True)).pack(side="right")
+        self.history_canvas = ctk.CTkCanvas(parent, height=SPARKLINE_HEIGHT, bg=DARK_GRAY, highlightthickness=0)
+        self.history_canvas.grid(row=10, column=0, columnspan=3, sticky="ew", padx=20, pady=(5, 10))
+        self.history_drawn_at = 0
+
+        ctk.CTkLabel(parent, text="Top Processes", font=("Roboto", 12)).grid(row=11, column=0, padx=20, sticky="w")
+        self.top_processes_label = ctk.CTkLabel(parent, text="Fetching...", font=("Consolas", 11), justify="left", anchor="w")
+        self.top_processes_label.grid(row=12, column=0, columnspan=3, sticky="ew", padx=20, pady=(0, 20))
 
     def _create_optimization_panel(self, parent):
         parent.grid_columnconfigure(0, weight=1)
@@ -148,26 +208,21 @@ class App(ctk.CTk):
         title.pack(side="left")
 
         
-        self.optimizations = {
-            "Clean Temporary Files": system_utils.clean_temp_files,
-            "Clear Windows Update Cache": system_utils.clean_windows_update_cache,
-            "Empty Recycle Bin": system_utils.empty_recycle_bin,
-            "Clear DNS Cache": system_utils.clear_dns_cache,
-            "Optimize System Disk (Defrag/TRIM)": system_utils.optimize_disk,
-            "Set High Performance Power Plan": system_utils.set_high_performance_power_plan,
-            "Adjust Visual Effects for Performance": system_utils.adjust_visual_effects,
-            "Disable Background Apps (Global)": system_utils.disable_background_apps,
-        }
-        
+        system_utils.load_plugins()
+        self.optimizations = {label: func for label, func in system_utils.OPTIMIZATIONS.values()}
+
         scroll_frame = ctk.CTkScrollableFrame(parent, fg_color=DARK_GRAY)
         scroll_frame.grid(row=1, column=0, sticky="nsew", padx=20)
         
         self.opt_checkboxes = {}
+        self.opt_checkbox_widgets = {}
+        self.scan_results = {}
         for i, (name, func) in enumerate(self.optimizations.items()):
-            var = ctk.StringVar(value="on")
+            var = ctk.StringVar(value="off" if func in system_utils.OPT_IN else "on")
             cb = ctk.CTkCheckBox(scroll_frame, text=name, variable=var, onvalue="on", offvalue="off", font=("Roboto", 14))
             cb.grid(row=i, column=0, sticky="w", padx=10, pady=8)
             self.opt_checkboxes[name] = var
+            self.opt_checkbox_widgets[name] = cb
 
         button_frame = ctk.CTkFrame(parent, fg_color="transparent")
         button_frame.grid(row=2, column=0, sticky="ew", padx=20, pady=15)
@@ -179,6 +234,240 @@ class App(ctk.CTk):
         restore_btn = ctk.CTkButton(button_frame, text="Restore Settings", command=self.restore_settings, font=("Roboto", 14, "bold"), fg_color=LIGHT_GRAY, hover_color="#454545")
         restore_btn.grid(row=0, column=1, sticky="ew", padx=(5, 0))
 
+        threading.Thread(target=self.scan_reclaimable_space, daemon=True).start()
+
+    def _create_disk_analyzer_tab(self, tab):
+        tab.grid_columnconfigure(0, weight=1)
+        tab.grid_rowconfigure(3, weight=1)
+
+        controls = ctk.CTkFrame(tab, fg_color=MEDIUM_GRAY)
+        controls.grid(row=0, column=0, sticky="ew", pady=(10, 10))
+        controls.grid_columnconfigure(1, weight=1)
+
+        ctk.CTkLabel(controls, text="Folder:", font=("Roboto", 12, "bold")).grid(row=0, column=0, padx=(20, 10), pady=15)
+        self.analyze_root = ctk.StringVar(value=system_utils.SYSTEM_DRIVE)
+        ctk.CTkEntry(controls, textvariable=self.analyze_root).grid(row=0, column=1, sticky="ew", pady=15)
+        self.analyze_btn = ctk.CTkButton(controls, text="Analyze", command=self.run_disk_analysis, font=("Roboto", 14, "bold"), fg_color=ACCENT_COLOR, hover_color="#008a69")
+        self.analyze_btn.grid(row=0, column=2, padx=20, pady=15)
+
+        self.analysis_text = ctk.CTkTextbox(tab, height=160, fg_color=MEDIUM_GRAY, font=("Consolas", 12))
+        self.analysis_text.grid(row=1, column=0, sticky="nsew")
+        self.analysis_text.insert("end", "Choose a folder and press Analyze. Repeat analyses only rescan folders that changed.")
+        self.analysis_text.configure(state="disabled")
+
+        review = ctk.CTkFrame(tab, fg_color="transparent")
+        review.grid(row=2, column=0, sticky="ew", pady=(10, 5))
+        review.grid_columnconfigure(1, weight=1)
+        # One model per source keeps each source's sort, filter and selection when switching.
+        self.review_models = {source: list_model.ListModel(columns, weight_column=0) for source, (columns, _, _) in REVIEW_SOURCES.items()}
+        self.review_model = self.review_models[DEFAULT_REVIEW_SOURCE]
+        self.review_source = ctk.StringVar(value=DEFAULT_REVIEW_SOURCE)
+        ctk.CTkSegmentedButton(review, values=list(REVIEW_SOURCES), variable=self.review_source,
+                               command=self.show_review_source).grid(row=0, column=0, padx=(0, 10))
+        self.review_filter = ctk.StringVar()
+        filter_entry = ctk.CTkEntry(review, textvariable=self.review_filter, placeholder_text="Filter by path")
+        filter_entry.grid(row=0, column=1, sticky="ew")
+        filter_entry.bind("<KeyRelease>", lambda e: self.schedule_review_filter())
+        self.review_filter_job = None
+        for column, (text, command) in enumerate((("All", lambda: self.select_review(True)),
+                                                  ("None", lambda: self.select_review(False)),
+                                                  ("Invert", self.invert_review)), start=2):
+            ctk.CTkButton(review, text=text, width=60, command=command, fg_color=LIGHT_GRAY, hover_color="#454545").grid(row=0, column=column, padx=(5, 0))
+        self.delete_selected_btn = ctk.CTkButton(review, text="Delete Selected", command=self.delete_selected_files, fg_color=LIGHT_GRAY, hover_color=RED)
+        self.delete_selected_btn.grid(row=0, column=5, padx=(5, 0))
+        self.review_summary = ctk.CTkLabel(review, text="", font=("Roboto", 12))
+        self.review_summary.grid(row=1, column=0, columnspan=6, sticky="w", pady=(5, 0))
+
+        _, widths, formatters = REVIEW_SOURCES[DEFAULT_REVIEW_SOURCE]
+        self.review_list = ui_widgets.VirtualList(tab, self.review_model, widths=widths, formatters=formatters,
+                                                  on_change=self.update_review_summary, fg_color=MEDIUM_GRAY)
+        self.review_list.grid(row=3, column=0, sticky="nsew")
+
+    def run_disk_analysis(self):
+        root = self.analyze_root.get()
+        self.analyze_btn.configure(state="disabled")
+        self.show_analysis_text(f"Analyzing {root}...")
+
+        def task():
+            import disk_usage_utils
+            index = disk_usage_utils.DiskIndex()
+            try:
+                stats = index.analyze(root)
+                lines = [f"{root}: {cleanup_utils.format_size(stats['total_size'])} in {stats['directories']} folders "
+                         f"({stats['rescanned']} rescanned, {stats['reused']} unchanged) in {stats['seconds']:.1f}s", "",
+                         "Largest folders:"]
+                lines += [f"  {cleanup_utils.format_size(size):>12}  {path}" for path, size, _ in index.top_directories(root)]
+                text = "\n".join(lines)
+                files = [(size, path) for path, size in index.top_files(root, REVIEW_FILE_LIMIT)]
+            except Exception as e:
+                text = f"Disk analysis failed: {e}"
+                files = []
+            finally:
+                index.close()
+            self.after(0, lambda: self.show_analysis_text(text))
+            self.after(0, lambda: self.show_review_files(files))
+            self.after(0, lambda: self.analyze_btn.configure(state="normal"))
+
+        threading.Thread(target=task, daemon=True).start()
+
+    def show_analysis_text(self, text):
+        self.analysis_text.configure(state="normal")
+        self.analysis_text.delete("1.0", "end")
+        self.analysis_text.insert("end", text)
+        self.analysis_text.configure(state="disabled")
+
+    def show_review_files(self, files, source=DEFAULT_REVIEW_SOURCE):
+        model = self.review_models[source]
+        model.set_rows(files)
+        if model is self.review_model:
+            self.show_review_source(source)
+
+    def show_review_source(self, source):
+        self.review_source.set(source)
+        self.review_model = self.review_models[source]
+        _, widths, formatters = REVIEW_SOURCES[source]
+        # Largest first until the user picks another column; groups of duplicates stay together.
+        sort = (0, True) if self.review_model.sort_column is None else None
+        self.review_list.set_model(self.review_model, widths, formatters, sort=sort)
+        self.apply_review_filter()
+
+    def schedule_review_filter(self):
+        if self.review_filter_job is not None:
+            self.after_cancel(self.review_filter_job)
+        self.review_filter_job = self.after(FILTER_DELAY_MS, self.apply_review_filter)
+
+    def apply_review_filter(self):
+        self.review_filter_job = None
+        # Runs on a worker thread; the list redraws and update_review_summary runs once it is done.
+        path_column = len(self.review_model.columns) - 1
+        self.review_list.filter(list_model.text_predicate(self.review_filter.get(), column=path_column))
+
+    def select_review(self, selected):
+        self.review_model.select_all(selected)
+        self.review_list.refresh()
+        self.update_review_summary()
+
+    def invert_review(self):
+        self.review_model.invert_selection()
+        self.review_list.refresh()
+        self.update_review_summary()
+
+    def update_review_summary(self):
+        model = self.review_model
+        self.review_summary.configure(
+            text=f"{len(model)} of {len(model.rows)} file(s) shown, "
+                 f"{model.selected_count()} selected ({cleanup_utils.format_size(model.selected_weight())})")
+
+    def delete_selected_files(self):
+        model = self.review_model
+        if not model.selected_count():
+            return
+        total = cleanup_utils.format_size(model.selected_weight())
+        selected = model.selected_rows()
+        warning = ""
+        if model is self.review_models["Duplicates"]:
+            unselected_groups = {group for (_, group, _), chosen in zip(model.rows, model.selected) if not chosen}
+            every_copy = len({group for _, group, _ in selected} - unselected_groups)
+            if every_copy:
+                warning = f"\n\nThis removes every copy of {every_copy} duplicate group(s)."
+        if not messagebox.askyesno("Confirm Delete", f"Permanently delete {model.selected_count()} file(s) ({total})?{warning}"):
+            return
+        self.delete_selected_btn.configure(state="disabled")
+
+        def task():
+            failed = set()
+            result = cleanup_utils.clean_files([(row[-1], row[0]) for row in selected],
+                                               on_failure=lambda path, size: failed.add(path))
+            self.after(0, lambda: self.on_selected_files_deleted(model, result, failed))
+
+        threading.Thread(target=task, daemon=True).start()
+
+    def on_selected_files_deleted(self, model, result, failed):
+        # Files that could not be deleted are still on disk, so their rows stay listed.
+        model.remove_selected(keep=lambda row: row[-1] in failed)
+        self.review_list.refresh()
+        self.update_review_summary()
+        self.delete_selected_btn.configure(state="normal")
+        messagebox.showinfo("Delete Complete", f"Deleted {result['files_removed']} file(s), "
+                            f"{cleanup_utils.format_size(result['bytes_freed'])} freed. {result['failures']} could not be removed.")
+
+    def _create_history_tab(self, tab):
+        tab.grid_columnconfigure(0, weight=1)
+        tab.grid_rowconfigure(1, weight=1)
+
+        controls = ctk.CTkFrame(tab, fg_color=MEDIUM_GRAY)
+        controls.grid(row=0, column=0, sticky="ew", pady=(10, 10))
+        controls.grid_columnconfigure(0, weight=1)
+        self.history_status = ctk.CTkLabel(controls, text="", font=("Roboto", 12))
+        self.history_status.grid(row=0, column=0, sticky="w", padx=20, pady=15)
+        ctk.CTkButton(controls, text="Refresh", width=90, command=self.refresh_run_history, fg_color=LIGHT_GRAY, hover_color="#454545").grid(row=0, column=1, padx=(0, 5), pady=15)
+        self.export_buttons = []
+        for column, kind in enumerate(("csv", "pdf"), start=2):
+            button = ctk.CTkButton(controls, text=f"Export {kind.upper()}", width=110, command=lambda kind=kind: self.export_run_history(kind),
+                                   font=("Roboto", 12, "bold"), fg_color=ACCENT_COLOR, hover_color="#008a69")
+            button.grid(row=0, column=column, padx=(0, 20 if kind == "pdf" else 5), pady=15)
+            self.export_buttons.append(button)
+
+        self.history_text = ctk.CTkTextbox(tab, fg_color=MEDIUM_GRAY, font=("Consolas", 12))
+        self.history_text.grid(row=1, column=0, sticky="nsew")
+        self.history_text.configure(state="disabled")
+
+    def refresh_run_history(self):
+        def task():
+            try:
+                history = history_utils.RunHistory()
+                try:
+                    weeks = history.bytes_freed_per_week(time.time() - RUN_HISTORY_WEEKS * history_utils.WEEK_SECONDS)
+                    runs = history.recent_runs(RUN_HISTORY_LIMIT)
+                finally:
+                    history.close()
+            except Exception as e:
+                text = f"Could not read run history: {e}"
+            else:
+                lines = [f"Bytes freed per week (last {RUN_HISTORY_WEEKS}):"]
+                lines += [f"  {time.strftime('%Y-%m-%d', time.gmtime(week))}  {cleanup_utils.format_size(freed or 0):>12}  {count} run(s)"
+                          for week, freed, count in weeks] or ["  No runs yet."]
+                lines += ["", "Recent runs:"]
+                lines += [f"  {time.strftime('%Y-%m-%d %H:%M', time.localtime(started))}  {host:<16} {cleanup_utils.format_size(freed):>12}  "
+                          f"{tasks} task(s) in {finished - started:.0f}s{'  (cancelled)' if cancelled else ''}"
+                          for _, host, started, finished, cancelled, freed, tasks in runs]
+                text = "\n".join(lines)
+            self.after(0, lambda: self.show_history_text(text))
+
+        threading.Thread(target=task, daemon=True).start()
+
+    def show_history_text(self, text):
+        self.history_text.configure(state="normal")
+        self.history_text.delete("1.0", "end")
+        self.history_text.insert("end", text)
+        self.history_text.configure(state="disabled")
+
+    def export_run_history(self, kind):
+        path = filedialog.asksaveasfilename(defaultextension=f".{kind}", filetypes=[(f"{kind.upper()} files", f"*.{kind}")],
+                                            initialfile=f"run_history.{kind}")
+        if not path:
+            return
+        for button in self.export_buttons:
+            button.configure(state="disabled")
+        self.history_status.configure(text=f"Exporting to {os.path.basename(path)}...")
+
+        def on_progress(rows):
+            self.after(0, lambda: self.history_status.configure(text=f"Exporting to {os.path.basename(path)}: {rows} row(s)..."))
+
+        def on_done(rows, error):
+            self.after(0, lambda: self.on_history_exported(path, rows, error))
+
+        history_utils.start_export(kind, path, on_done, on_progress)
+
+    def on_history_exported(self, path, rows, error):
+        for button in self.export_buttons:
+            button.configure(state="normal")
+        if error is not None:
+            self.history_status.configure(text="")
+            messagebox.showerror("Export Failed", f"Could not export the run history: {error}")
+        else:
+            self.history_status.configure(text=f"Exported {rows} row(s) to {path}")
+
     def _create_about_tab(self, tab):
         tab.grid_columnconfigure(0, weight=1)
 
@@ -225,8 +514,10 @@ class App(ctk.CTk):
         ctk.CTkLabel(about_frame, text="© 2024 MC Digital Innovate. All rights reserved.", font=("Roboto", 10), text_color=LIGHT_GRAY).pack(pady=(30, 10))
 
     def load_static_info(self):
-        data = system_utils.get_static_info()
-        self.after(0, lambda: self.update_static_info_ui(data))
+        cache_utils.get_static_info_cached(
+            system_utils.get_static_info,
+            lambda data: self.after(0, lambda: self.update_static_info_ui(data))
+        )
 
     def update_static_info_ui(self, data):
         self.info_labels["os"].configure(text=data["os"])
@@ -234,9 +525,42 @@ class App(ctk.CTk):
         self.info_labels["ram"].configure(text=data["ram"])
         self.info_labels["gpu"].configure(text=data["gpu"])
 
+    def scan_reclaimable_space(self):
+        # The review list shows the largest first anyway; the rest would only cost memory.
+        candidates = list_model.LargestRows(REVIEW_FILE_LIMIT)
+        for name, func in self.optimizations.items():
+            scanner = system_utils.SCANNERS.get(func)
+            if scanner is None:
+                continue
+
+            def on_progress(items, num_bytes, name=name):
+                self.after(0, lambda: self.update_scan_label(name, num_bytes, complete=None))
+
+            try:
+                result = scanner(on_progress=on_progress, budget_bytes=SCAN_BUDGET_BYTES, on_files=candidates.extend)
+            except Exception as e:
+                print(f"Could not scan {name}: {e}")
+                continue
+            self.scan_results[name] = result
+            self.after(0, lambda name=name, result=result: self.update_scan_label(name, result["bytes"], result["complete"]))
+        self.after(0, lambda: self.show_review_files(candidates.rows(), "Cleanup candidates"))
+
+    def update_scan_label(self, name, num_bytes, complete):
+        size = cleanup_utils.format_size(num_bytes)
+        if complete is None:
+            suffix = f"scanning... {size}"
+        elif complete:
+            suffix = f"{size} reclaimable"
+        else:
+            suffix = f"over {size} reclaimable"
+        self.opt_checkbox_widgets[name].configure(text=f"{name}  ({suffix})")
+
     def update_realtime_stats(self):
-        stats = system_utils.get_realtime_stats()
-        
+        stats = self.sampler.latest()
+        if stats is None:
+            self.after(REFRESH_INTERVAL_MS, self.update_realtime_stats)
+            return
+
         cpu = stats['cpu_usage']
         ram = stats['ram_usage']
         disk = stats['disk_usage']
@@ -247,6 +571,7 @@ class App(ctk.CTk):
         self.ram_label.configure(text=f"{ram:.1f}%")
         self.disk_progress.set(disk / 100)
         self.disk_label.configure(text=f"{disk:.1f}%")
+        self.io_label.configure(text=self.format_io(stats))
 
         max_usage = max(cpu, ram, disk)
         if max_usage > 80:
@@ -261,7 +586,62 @@ class App(ctk.CTk):
         self.ram_progress.configure(progress_color=health_color)
         self.disk_progress.configure(progress_color=health_color)
         
-        self.after(2000, self.update_realtime_stats)
+        top = self.sampler.top_processes()
+        if top is not None:
+            # Highlight the culprits while health is Poor.
+            self.top_processes_label.configure(text=process_utils.format_top(top), text_color=RED if max_usage > 80 else TEXT_COLOR)
+
+        self.draw_history()
+        self.update_live_scan()
+        self.after(REFRESH_INTERVAL_MS, self.update_realtime_stats)
+
+    def format_io(self, stats):
+        size = cleanup_utils.format_size
+        others = "  ".join(f"{mountpoint} {percent:.0f}%" for mountpoint, percent in stats["partitions"].items()
+                           if mountpoint != monitor_utils.SYSTEM_ROOT)
+        lines = [
+            f"Disk  R {size(stats['disk_read_bytes_s'])}/s  W {size(stats['disk_write_bytes_s'])}/s  "
+            f"{stats['disk_read_iops'] + stats['disk_write_iops']:.0f} IOPS",
+            f"Net   ↓ {size(stats['net_recv_bytes_s'])}/s  ↑ {size(stats['net_sent_bytes_s'])}/s",
+        ]
+        if others:
+            lines.append(f"Other drives  {others}")
+        return "\n".join(lines)
+
+    def update_live_scan(self):
+        if self.temp_watcher is None or not self.temp_watcher.ready.is_set():
+            return
+        # Computed on the watcher's own thread; checking the policy against every file here would stall the frame.
+        result = self.temp_watcher.latest()
+        if result is None:
+            return
+        name = system_utils.OPTIMIZATIONS["clean-temp"][0]
+        self.scan_results[name] = result
+        self.update_scan_label(name, result["bytes"], result["complete"])
+
+    def draw_history(self, force=False):
+        if self.history is None:
+            return
+        span = HISTORY_RANGES[self.history_range.get()]
+        now = time.time()
+        # Long ranges change slowly; redraw them every 30 s instead of every tick.
+        if not force and span > 300 and now - self.history_drawn_at < 30:
+            return
+        self.history_drawn_at = now
+
+        points = self.history.series(now - span, now)
+        canvas = self.history_canvas
+        canvas.delete("all")
+        width = max(canvas.winfo_width(), 1)
+        if len(points) < 2:
+            return
+        for field, color in (("cpu_usage", ACCENT_COLOR), ("ram_usage", LINK_COLOR)):
+            step = max(1, len(points) // width)
+            coords = []
+            for point in points[::step]:
+                coords.append((point["timestamp"] - (now - span)) / span * width)
+                coords.append(SPARKLINE_HEIGHT - point[field] / 100 * (SPARKLINE_HEIGHT - 2) - 1)
+            canvas.create_line(*coords, fill=color, width=1.5)
 
     def run_optimizations(self):
         selected_opts = {name: self.optimizations[name] for name, var in self.opt_checkboxes.items() if var.get() == "on"}
@@ -270,20 +650,26 @@ class App(ctk.CTk):
             messagebox.showinfo("No Selection", "Please select at least one optimization to apply.")
             return
 
+        self.cancel_event = threading.Event()
         self.show_progress_screen()
+        self.run_started_at = time.time()
+        self.progress_bus = progress_utils.ProgressBus()
         system_utils.run_optimizations(
             selected_opts,
-            self.update_progress,
-            self.on_optimization_complete
+            self.progress_bus,
+            self.progress_bus.complete,
+            cancel_event=self.cancel_event,
+            stats=self.sampler.latest
         )
+        self.after(PROGRESS_INTERVAL_MS, self.pump_progress)
 
     def show_progress_screen(self):
         self.progress_window = ctk.CTkToplevel(self)
         self.progress_window.title("Optimizing...")
-        self.progress_window.geometry("400x150")
+        self.progress_window.geometry("400x200")
         self.progress_window.transient(self)
         self.progress_window.grab_set()
-        self.progress_window.protocol("WM_DELETE_WINDOW", lambda: None)
+        self.progress_window.protocol("WM_DELETE_WINDOW", self.cancel_optimizations)
         
         self.progress_window.grid_columnconfigure(0, weight=1)
         
@@ -293,29 +679,171 @@ class App(ctk.CTk):
         self.progress_bar = ctk.CTkProgressBar(self.progress_window, mode='indeterminate', progress_color=ACCENT_COLOR)
         self.progress_bar.grid(row=2, sticky="ew", padx=20, pady=10)
         self.progress_bar.start()
+        self.cancel_btn = ctk.CTkButton(self.progress_window, text="Cancel", command=self.cancel_optimizations, font=("Roboto", 12, "bold"), fg_color=LIGHT_GRAY, hover_color=RED)
+        self.cancel_btn.grid(row=3, pady=(0, 10))
+
+    def cancel_optimizations(self):
+        if self.cancel_event.is_set():
+            return
+        self.cancel_event.set()
+        self.cancel_btn.configure(state="disabled", text="Cancelling...")
+        self.update_progress("Cancelling: stopping running commands...")
 
     def update_progress(self, message):
         self.progress_label.configure(text=message)
+
+    def pump_progress(self):
+        """Applies worker progress on the Tk thread; workers never touch widgets themselves."""
+        events, completion = self.progress_bus.drain()
+        if events:
+            # Several tasks may run at once; show the one that reported last.
+            self.update_progress(progress_utils.format_event(events[-1]))
+        if completion is not None:
+            self.on_optimization_complete(*completion)
+            return
+        self.after(PROGRESS_INTERVAL_MS, self.pump_progress)
         
     def on_optimization_complete(self, before, after, results):
+        finished_at = time.time()
+        self.cancel_btn.configure(state="disabled")
+        if self.history is None or self.cancel_event.is_set():
+            self.show_optimization_report(before, after, results, "single samples")
+            return
+        # Compare equal windows of history around the run instead of two instantaneous samples.
+        self.update_progress(f"Measuring system usage for {REPORT_WINDOW_S}s after optimization...")
+
+        def report():
+            before_avg = self.history.window_average(self.run_started_at - REPORT_WINDOW_S, self.run_started_at)
+            after_avg = self.history.window_average(finished_at, finished_at + REPORT_WINDOW_S)
+            if before_avg and after_avg:
+                self.show_optimization_report(before_avg, after_avg, results, f"{REPORT_WINDOW_S}s averages")
+            else:
+                self.show_optimization_report(before, after, results, "single samples")
+
+        self.after(REPORT_WINDOW_S * 1000, report)
+
+    def show_optimization_report(self, before, after, results, basis):
         self.progress_window.destroy()
         
         report = "--- Optimization Report ---\n\n"
-        report += "Resource Usage (Before -> After):\n"
+        report += f"Resource Usage (Before -> After, {basis}):\n"
         report += f"  - CPU Usage: {before['cpu_usage']:.1f}% -> {after['cpu_usage']:.1f}%\n"
-        report += f"  - RAM Usage: {before['ram_usage']:.1f}% -> {after['ram_usage']:.1f}%\n\n"
+        report += f"  - RAM Usage: {before['ram_usage']:.1f}% -> {after['ram_usage']:.1f}%\n"
+        report += f"  - Disk Usage: {before['disk_usage']:.1f}% -> {after['disk_usage']:.1f}%\n\n"
+        scanned = {name: self.scan_results[name] for name in results if name in self.scan_results}
+        if scanned:
+            report += "Reclaimable Space (Scanned Before Run):\n"
+            for name, scan in scanned.items():
+                prefix = "" if scan["complete"] else "over "
+                report += f"  - {name}: {prefix}{cleanup_utils.format_size(scan['bytes'])} in {scan['items']} item(s)\n"
+            report += "\n"
         report += "Actions Taken:\n"
         for name, result in results.items():
             report += f"  - {name}: {result}\n"
+            if isinstance(result, duplicate_utils.DuplicateReport) and result.groups:
+                self.review_models["Duplicates"].set_rows(result.rows())
+                self.show_review_source("Duplicates")
+                report += "    The duplicates are listed for review in the Disk Analyzer tab.\n"
         
         messagebox.showinfo("Optimization Complete", report)
+        self.refresh_run_history()
+        threading.Thread(target=self.scan_reclaimable_space, daemon=True).start()
 
     def restore_settings(self):
-        if messagebox.askyesno("Confirm Restore", "Are you sure you want to restore the settings from the last backup? This will revert changes made by the optimizer."):
-            if backup_utils.restore_critical_settings():
-                messagebox.showinfo("Success", "Settings have been successfully restored.")
-            else:
-                messagebox.showerror("Error", "Failed to restore settings. A backup might not exist or is corrupted.")
+        import backup_utils
+        points = backup_utils.restore_points()
+        if not points:
+            messagebox.showinfo("Restore Settings", "No backup found.")
+            self.offer_quarantine_restore()
+            return
+
+        dialog = ctk.CTkToplevel(self)
+        dialog.title("Restore Settings")
+        dialog.geometry("520x170")
+        dialog.transient(self)
+        dialog.grab_set()
+        dialog.grid_columnconfigure(0, weight=1)
+        ctk.CTkLabel(dialog, text="Restore the settings from before this run:", font=("Roboto", 12, "bold")).grid(row=0, column=0, columnspan=2, padx=20, pady=(15, 5), sticky="w")
+        choices = {backup_utils.describe_restore_point(run): run["run_id"] for run in points}
+        choice = ctk.StringVar(value=next(iter(choices)))
+        ctk.CTkOptionMenu(dialog, variable=choice, values=list(choices), fg_color=LIGHT_GRAY, button_color=MEDIUM_GRAY).grid(row=1, column=0, columnspan=2, padx=20, pady=5, sticky="ew")
+
+        def restore():
+            run_id = choices[choice.get()]
+            dialog.destroy()
+            # Writing the power plan and the update service spawns powercfg and sc; keep it off the Tk thread.
+            def task():
+                ok = backup_utils.restore_critical_settings(run_id)
+                self.after(0, lambda: self.on_settings_restored(ok))
+            threading.Thread(target=task, daemon=True).start()
+
+        def cancel():
+            dialog.destroy()
+            self.offer_quarantine_restore()
+
+        ctk.CTkButton(dialog, text="Restore", command=restore, fg_color=ACCENT_COLOR, hover_color="#008a69").grid(row=2, column=0, padx=(20, 5), pady=15, sticky="e")
+        ctk.CTkButton(dialog, text="Cancel", command=cancel, fg_color=LIGHT_GRAY, hover_color="#454545").grid(row=2, column=1, padx=(5, 20), pady=15)
+
+    def on_settings_restored(self, ok):
+        if ok:
+            messagebox.showinfo("Success", "Settings have been successfully restored.")
+        else:
+            messagebox.showerror("Error", "Failed to restore settings. A backup might not exist or is corrupted.")
+        self.offer_quarantine_restore()
+
+    def offer_quarantine_restore(self):
+        import quarantine_utils
+        runs = quarantine_utils.list_runs()
+        if not runs:
+            return
+
+        dialog = ctk.CTkToplevel(self)
+        dialog.title("Restore Files")
+        dialog.geometry("520x200")
+        dialog.transient(self)
+        dialog.grab_set()
+        dialog.grid_columnconfigure(0, weight=1)
+        ctk.CTkLabel(dialog, text="Restore the files quarantined by this run:", font=("Roboto", 12, "bold")).grid(row=0, column=0, columnspan=2, padx=20, pady=(15, 5), sticky="w")
+        choices = {}
+        for run in runs:
+            when = time.strftime("%Y-%m-%d %H:%M", time.localtime(run["created"]))
+            choices[f"{when}  ({run['items']} file(s), {cleanup_utils.format_size(run['bytes'])})"] = run
+        choice = ctk.StringVar(value=next(iter(choices)))
+        menu = ctk.CTkOptionMenu(dialog, variable=choice, values=list(choices), fg_color=LIGHT_GRAY, button_color=MEDIUM_GRAY)
+        menu.grid(row=1, column=0, columnspan=2, padx=20, pady=5, sticky="ew")
+        status = ctk.CTkLabel(dialog, text="", font=("Roboto", 12))
+        status.grid(row=2, column=0, columnspan=2, padx=20, sticky="w")
+        bar = ctk.CTkProgressBar(dialog, progress_color=ACCENT_COLOR)
+        bar.set(0)
+
+        def on_progress(done, total):
+            def show():
+                bar.set(done / total if total else 0)
+                status.configure(text=f"Restoring: {done}/{total} item(s)...")
+            self.after(0, show)
+
+        def on_done(totals):
+            dialog.destroy()
+            messagebox.showinfo("Files Restored", f"Restored {totals['restored']} item(s); "
+                                f"{totals['conflicts']} already existed, {totals['failures']} failed.")
+
+        def restore():
+            run = choices[choice.get()]
+            for widget in (menu, restore_button, cancel_button):
+                widget.configure(state="disabled")
+            dialog.protocol("WM_DELETE_WINDOW", lambda: None)
+            bar.grid(row=3, column=0, columnspan=2, padx=20, pady=5, sticky="ew")
+            status.configure(text="Restoring...")
+            # Moving a large run back can take a while, and across volumes it copies every file.
+            def task():
+                totals = quarantine_utils.restore_run(run["run_id"], on_progress) or {"restored": 0, "conflicts": 0, "failures": 0}
+                self.after(0, lambda: on_done(totals))
+            threading.Thread(target=task, daemon=True).start()
+
+        restore_button = ctk.CTkButton(dialog, text="Restore", command=restore, fg_color=ACCENT_COLOR, hover_color="#008a69")
+        restore_button.grid(row=4, column=0, padx=(20, 5), pady=15, sticky="e")
+        cancel_button = ctk.CTkButton(dialog, text="Cancel", command=dialog.destroy, fg_color=LIGHT_GRAY, hover_color="#454545")
+        cancel_button.grid(row=4, column=1, padx=(5, 20), pady=15)
 
     def start_move(self, event):
         self.x = event.x
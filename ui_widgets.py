@@ -0,0 +1,172 @@
+# ui_widgets.py
+import threading
+import tkinter as tk
+
+import customtkinter as ctk
+
+ROW_HEIGHT = 22
+ROW_COLOR = "#2b2b2b"
+SELECTED_COLOR = "#1f5f4f"
+TEXT_COLOR = "#FFFFFF"
+HEADER_COLOR = "#323232"
+WHEEL_ROWS = 3
+
+
+class VirtualList(ctk.CTkFrame):
+    """Table that draws only the rows currently visible, reading them from a ListModel.
+
+    A fixed pool of canvas items is reused on every scroll, so the widget cost does not
+    depend on the number of rows. Clicking a row toggles its selection; clicking a
+    header sorts by that column, clicking it again reverses the order. Sorting and
+    filtering run on a worker thread; the rows shown stay usable until the result is in.
+    """
+
+    def __init__(self, master, model, widths, formatters=None, on_change=None, font=("Consolas", 12), **kwargs):
+        super().__init__(master, **kwargs)
+        self.on_change = on_change
+        self.font = font
+        self.top = 0
+        self._slots = []
+        self._drawn_version = None
+        self._request = 0
+
+        self.grid_columnconfigure(0, weight=1)
+        self.grid_rowconfigure(1, weight=1)
+
+        self.widths = widths
+        self.formatters = formatters or [str] * len(model.columns)
+        self.header = None
+        self.set_model(model)
+
+        self.canvas = tk.Canvas(self, bg=ROW_COLOR, highlightthickness=0)
+        self.canvas.grid(row=1, column=0, sticky="nsew")
+        self.scrollbar = ctk.CTkScrollbar(self, command=self.yview)
+        self.scrollbar.grid(row=1, column=1, sticky="ns")
+
+        self.canvas.bind("<Configure>", lambda e: self._build_slots())
+        self.canvas.bind("<Button-1>", self._on_click)
+        self.canvas.bind("<MouseWheel>", lambda e: self.scroll(-WHEEL_ROWS if e.delta > 0 else WHEEL_ROWS))
+        self.canvas.bind("<Button-4>", lambda e: self.scroll(-WHEEL_ROWS))
+        self.canvas.bind("<Button-5>", lambda e: self.scroll(WHEEL_ROWS))
+
+    def set_model(self, model, widths=None, formatters=None, sort=None):
+        """Shows another model, e.g. a different kind of result, rebuilding the header for its columns.
+        sort=(column, reverse) is applied by the next filter()."""
+        self.model = model
+        self.widths = widths or self.widths
+        self.formatters = formatters or self.formatters
+        self._sort = sort or (model.sort_column, model.sort_reverse)
+        self._predicate = model.predicate
+        self._request += 1
+        self.top = 0
+        if self.header is not None:
+            self.header.destroy()
+        self.header = ctk.CTkFrame(self, fg_color=HEADER_COLOR, corner_radius=0)
+        self.header.grid(row=0, column=0, columnspan=2, sticky="ew")
+        for column, (name, width) in enumerate(zip(model.columns, self.widths)):
+            ctk.CTkButton(self.header, text=name, width=width, anchor="w", fg_color="transparent", hover_color=ROW_COLOR,
+                          font=(self.font[0], self.font[1], "bold"), command=lambda c=column: self.sort_by(c)).pack(side="left")
+        if self._slots:
+            self._build_slots()
+            self._changed()
+
+    def _build_slots(self):
+        self.canvas.delete("all")
+        width = max(self.canvas.winfo_width(), sum(self.widths))
+        count = self.canvas.winfo_height() // ROW_HEIGHT + 1
+        self._slots = []
+        for slot in range(count):
+            y = slot * ROW_HEIGHT
+            background = self.canvas.create_rectangle(0, y, width, y + ROW_HEIGHT, fill=ROW_COLOR, width=0)
+            texts = []
+            x = 6
+            for column_width in self.widths:
+                texts.append(self.canvas.create_text(x, y + ROW_HEIGHT // 2, anchor="w", fill=TEXT_COLOR, font=self.font))
+                x += column_width
+            self._slots.append((background, texts))
+        self.refresh(force=True)
+
+    def _page_size(self):
+        return max(1, len(self._slots) - 1)
+
+    def refresh(self, force=False):
+        """Redraws the visible rows if the model changed since the last draw."""
+        if not force and self._drawn_version == self.model.version:
+            return
+        self._drawn_version = self.model.version
+        total = len(self.model)
+        self.top = max(0, min(self.top, total - self._page_size()))
+        rows = self.model.visible(self.top, len(self._slots))
+        for slot, (background, texts) in enumerate(self._slots):
+            if slot < len(rows):
+                row, selected = rows[slot]
+                self.canvas.itemconfigure(background, fill=SELECTED_COLOR if selected else ROW_COLOR)
+                for text, value, formatter in zip(texts, row, self.formatters):
+                    self.canvas.itemconfigure(text, text=formatter(value))
+            else:
+                self.canvas.itemconfigure(background, fill=ROW_COLOR)
+                for text in texts:
+                    self.canvas.itemconfigure(text, text="")
+        if total:
+            self.scrollbar.set(self.top / total, min(1.0, (self.top + self._page_size()) / total))
+        else:
+            self.scrollbar.set(0.0, 1.0)
+
+    def scroll(self, rows):
+        self.top = max(0, min(self.top + rows, len(self.model) - self._page_size()))
+        self.refresh(force=True)
+
+    def yview(self, action, amount, unit=None):
+        if action == "moveto":
+            self.top = int(float(amount) * len(self.model))
+            self.refresh(force=True)
+        elif action == "scroll":
+            self.scroll(int(amount) * (self._page_size() if unit == "pages" else 1))
+
+    def sort_by(self, column):
+        current_column, current_reverse = self._sort
+        self._sort = (column, current_column == column and not current_reverse)
+        self._update_view()
+
+    def filter(self, predicate, on_done=None):
+        """Filters the model off the Tk thread; on_done() runs once the new view is shown."""
+        self._predicate = predicate
+        self._update_view(on_done)
+
+    def _update_view(self, on_done=None):
+        # Every request carries the full wanted state, so a newer one simply supersedes older ones.
+        self._request += 1
+        request, model = self._request, self.model
+        column, reverse = self._sort
+        predicate = self._predicate
+
+        def work():
+            plan = model.plan(column, reverse, predicate)
+            try:
+                self.after(0, lambda: finish(plan))
+            except RuntimeError:
+                pass  # The window was closed meanwhile.
+
+        def finish(plan):
+            if request != self._request or model is not self.model:
+                return
+            if not model.apply(plan):
+                # The rows were replaced while planning; plan again on the new ones.
+                self._update_view(on_done)
+                return
+            self._changed()
+            if on_done:
+                on_done()
+
+        threading.Thread(target=work, name="ListPlan", daemon=True).start()
+
+    def _on_click(self, event):
+        position = self.top + event.y // ROW_HEIGHT
+        if position < len(self.model):
+            self.model.toggle(position)
+            self._changed()
+
+    def _changed(self):
+        self.refresh()
+        if self.on_change:
+            self.on_change()
@@ -0,0 +1,395 @@
+# watch_utils.py
+import ctypes
+import ctypes.util
+import os
+import select
+import stat
+import struct
+import sys
+import threading
+import time
+
+import cleanup_utils
+
+# Age rules make files eligible as time passes, so cached totals expire even without events.
+RECLAIMABLE_CACHE_SECONDS = 60
+# The watcher's own thread recomputes the totals at most this often; the UI only reads the result.
+RECLAIMABLE_REFRESH_SECONDS = 2
+POLL_TIMEOUT = 0.5
+
+# inotify(7)
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+INOTIFY_MASK = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE
+                | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR)
+INOTIFY_EVENT = struct.Struct("iIII")  # wd, mask, cookie, name length
+
+# ReadDirectoryChangesW
+FILE_LIST_DIRECTORY = 0x0001
+FILE_SHARE_ALL = 0x00000007
+OPEN_EXISTING = 3
+FILE_FLAG_BACKUP_SEMANTICS = 0x02000000
+FILE_NOTIFY_FILTER = 0x0001 | 0x0002 | 0x0008 | 0x0010 | 0x0040  # file/dir name, size, last write, creation
+FILE_NOTIFY_INFORMATION = struct.Struct("<III")  # next entry offset, action, name length in bytes
+FILE_ACTION_REMOVED = 2
+FILE_ACTION_RENAMED_OLD_NAME = 4
+ERROR_OPERATION_ABORTED = 995
+ERROR_NOTIFY_ENUM_DIR = 1022
+WINDOWS_BUFFER_SIZE = 64 * 1024
+
+
+class _InotifyBackend:
+    """One inotify watch per directory; the index registers directories as it walks them."""
+
+    recursive = False
+
+    def __init__(self, on_change, on_overflow):
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c") or None, use_errno=True)
+        self._fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._on_change = on_change
+        self._on_overflow = on_overflow
+        self._dirs = {}
+        self._lock = threading.Lock()
+
+    def watch_root(self, root):
+        self.watch_directory(root)
+
+    def watch_directory(self, path):
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(path), INOTIFY_MASK)
+        if wd < 0:
+            # Typically ENOSPC once fs.inotify.max_user_watches is exhausted.
+            raise OSError(ctypes.get_errno(), f"inotify_add_watch failed for {path}")
+        with self._lock:
+            self._dirs[wd] = path
+
+    def run(self, stop_event):
+        while not stop_event.is_set():
+            readable, _, _ = select.select([self._fd], [], [], POLL_TIMEOUT)
+            if not readable:
+                continue
+            try:
+                data = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                continue
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = INOTIFY_EVENT.unpack_from(data, offset)
+                name = data[offset + INOTIFY_EVENT.size:offset + INOTIFY_EVENT.size + length].rstrip(b"\0")
+                offset += INOTIFY_EVENT.size + length
+                if mask & IN_Q_OVERFLOW:
+                    self._on_overflow()
+                    continue
+                with self._lock:
+                    directory = self._dirs.pop(wd, None) if mask & IN_IGNORED else self._dirs.get(wd)
+                if directory is None or not name:
+                    continue
+                if mask & IN_ISDIR and mask & IN_MOVED_FROM:
+                    # Watches below a renamed directory keep reporting its old path.
+                    self._on_overflow()
+                removed = bool(mask & (IN_DELETE | IN_MOVED_FROM))
+                self._on_change(os.path.join(directory, os.fsdecode(name)), removed)
+
+    def close(self):
+        os.close(self._fd)
+
+
+class _WindowsBackend:
+    """ReadDirectoryChangesW on each root with bWatchSubtree, one blocking reader thread per root."""
+
+    recursive = True
+
+    def __init__(self, on_change, on_overflow):
+        from ctypes import wintypes
+
+        self._kernel32 = ctypes.WinDLL("kernel32", use_last_error=True)
+        self._kernel32.CreateFileW.restype = wintypes.HANDLE
+        self._kernel32.CreateFileW.argtypes = [wintypes.LPCWSTR, wintypes.DWORD, wintypes.DWORD, wintypes.LPVOID,
+                                              wintypes.DWORD, wintypes.DWORD, wintypes.HANDLE]
+        self._kernel32.ReadDirectoryChangesW.argtypes = [wintypes.HANDLE, wintypes.LPVOID, wintypes.DWORD, wintypes.BOOL,
+                                                        wintypes.DWORD, ctypes.POINTER(wintypes.DWORD), wintypes.LPVOID,
+                                                        wintypes.LPVOID]
+        self._kernel32.CancelIoEx.argtypes = [wintypes.HANDLE, wintypes.LPVOID]
+        self._kernel32.CloseHandle.argtypes = [wintypes.HANDLE]
+        self._wintypes = wintypes
+        self._on_change = on_change
+        self._on_overflow = on_overflow
+        self._handles = {}
+
+    def watch_root(self, root):
+        handle = self._kernel32.CreateFileW(root, FILE_LIST_DIRECTORY, FILE_SHARE_ALL, None, OPEN_EXISTING,
+                                            FILE_FLAG_BACKUP_SEMANTICS, None)
+        if handle in (None, ctypes.c_void_p(-1).value):
+            raise ctypes.WinError(ctypes.get_last_error())
+        self._handles[root] = handle
+
+    def watch_directory(self, path):
+        pass
+
+    def run(self, stop_event):
+        readers = [threading.Thread(target=self._read_root, args=(root, handle, stop_event), daemon=True)
+                   for root, handle in self._handles.items()]
+        for reader in readers:
+            reader.start()
+        stop_event.wait()
+        for handle in self._handles.values():
+            self._kernel32.CancelIoEx(handle, None)
+        for reader in readers:
+            reader.join()
+
+    def _read_root(self, root, handle, stop_event):
+        buffer = ctypes.create_string_buffer(WINDOWS_BUFFER_SIZE)
+        returned = self._wintypes.DWORD()
+        while not stop_event.is_set():
+            ok = self._kernel32.ReadDirectoryChangesW(handle, buffer, len(buffer), True, FILE_NOTIFY_FILTER,
+                                                      ctypes.byref(returned), None, None)
+            if not ok:
+                error = ctypes.get_last_error()
+                if error == ERROR_OPERATION_ABORTED:
+                    return
+                if error != ERROR_NOTIFY_ENUM_DIR:
+                    print(f"Watching {root} failed: {ctypes.WinError(error)}")
+                    return
+                returned.value = 0
+            if returned.value == 0:
+                # The kernel buffer overflowed and the changes were dropped.
+                self._on_overflow()
+                continue
+            data = buffer.raw[:returned.value]
+            offset = 0
+            while True:
+                next_offset, action, length = FILE_NOTIFY_INFORMATION.unpack_from(data, offset)
+                start = offset + FILE_NOTIFY_INFORMATION.size
+                name = data[start:start + length].decode("utf-16-le")
+                removed = action in (FILE_ACTION_REMOVED, FILE_ACTION_RENAMED_OLD_NAME)
+                self._on_change(os.path.join(root, name), removed)
+                if not next_offset:
+                    break
+                offset += next_offset
+
+    def close(self):
+        for handle in self._handles.values():
+            self._kernel32.CloseHandle(handle)
+        self._handles = {}
+
+
+def create_backend(on_change, on_overflow):
+    """Returns the change-notification backend for this platform, or None if there is none."""
+    if sys.platform == "win32":
+        return _WindowsBackend(on_change, on_overflow)
+    if sys.platform.startswith("linux"):
+        return _InotifyBackend(on_change, on_overflow)
+    return None
+
+
+class TempWatcher:
+    """Keeps a live index of the files under the cleaner roots from change notifications.
+
+    After start() the index is filled by one walk; from then on only the notified paths are
+    stat'ed. A dropped-events overflow triggers a fresh walk. reclaimable() and candidates()
+    apply the policy (age, size, per-root caps) at query time; latest() returns the totals a
+    background thread keeps current, for callers that must not do that work themselves.
+    """
+
+    def __init__(self, roots, policy=None):
+        self.roots = [os.path.abspath(root) for root in roots if root and os.path.isdir(root)]
+        self.policy = policy
+        self.ready = threading.Event()
+        self._files = {root: {} for root in self.roots}
+        self._lock = threading.Lock()
+        self._version = 0
+        self._cached = None
+        self._rescan_needed = threading.Event()
+        self._stop_event = threading.Event()
+        self._backend = None
+        self._threads = []
+
+    def start(self):
+        """Starts watching; returns False when this platform has no notification backend."""
+        try:
+            self._backend = create_backend(self._on_change, self._rescan_needed.set)
+        except OSError as e:
+            print(f"File change notifications unavailable: {e}")
+            return False
+        if self._backend is None:
+            return False
+        self._stop_event.clear()
+        self._threads = [
+            threading.Thread(target=self._run_backend, name="TempWatcher", daemon=True),
+            threading.Thread(target=self._maintain, name="TempWatcherScan", daemon=True),
+            threading.Thread(target=self._refresh_totals, name="TempWatcherTotals", daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+        return True
+
+    def stop(self, timeout=None):
+        self._stop_event.set()
+        self._rescan_needed.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+        if self._backend is not None:
+            self._backend.close()
+            self._backend = None
+        self.ready.clear()
+
+    def _run_backend(self):
+        try:
+            for root in self.roots:
+                self._backend.watch_root(root)
+        except OSError as e:
+            print(f"Could not watch temp folders: {e}")
+            return
+        # Watches exist before the first walk, so nothing created during it is missed.
+        self._rescan_needed.set()
+        self._backend.run(self._stop_event)
+
+    def _maintain(self):
+        while not self._stop_event.is_set():
+            self._rescan_needed.wait()
+            if self._stop_event.is_set():
+                return
+            self._rescan_needed.clear()
+            try:
+                for root in self.roots:
+                    self._rescan(root)
+            except OSError as e:
+                print(f"Could not index temp folders: {e}")
+                self.ready.clear()
+                continue
+            self.ready.set()
+
+    def _refresh_totals(self):
+        while not self._stop_event.is_set():
+            if self.ready.wait(POLL_TIMEOUT):
+                self.reclaimable()
+                self._stop_event.wait(RECLAIMABLE_REFRESH_SECONDS)
+
+    def _rescan(self, root):
+        files = {}
+        self._walk(root, root, files)
+        with self._lock:
+            self._files[root] = files
+            self._version += 1
+
+    def _walk(self, root, directory, files):
+        pending = [directory]
+        while pending:
+            path = pending.pop()
+            if not self._backend.recursive and path != root:
+                self._backend.watch_directory(path)
+            try:
+                with os.scandir(path) as it:
+                    for entry in it:
+                        try:
+                            st = entry.stat(follow_symlinks=False)
+                        except OSError:
+                            continue
+                        if stat.S_ISDIR(st.st_mode) and not cleanup_utils._is_link_like(st):
+                            if self._allows_directory(root, entry.path):
+                                pending.append(entry.path)
+                        else:
+                            files[entry.path] = st
+            except OSError:
+                continue
+
+    def _root_of(self, path):
+        for root in self.roots:
+            if path.startswith(root + os.sep):
+                return root
+        return None
+
+    def _allows_directory(self, root, path):
+        if path == root:
+            return True
+        relpath = path[len(root) + 1:]
+        parts = relpath.split(os.sep)
+        if cleanup_utils.QUARANTINE_DIR in parts:
+            return False
+        if self.policy is None:
+            return True
+        return all(self.policy.allows_directory(part, os.sep.join(parts[:i + 1])) for i, part in enumerate(parts))
+
+    def _on_change(self, path, removed):
+        root = self._root_of(path)
+        if root is None or not self._allows_directory(root, os.path.dirname(path)):
+            return
+        st = None
+        if not removed:
+            try:
+                st = os.stat(path, follow_symlinks=False)
+            except OSError:
+                pass
+        if st is not None and stat.S_ISDIR(st.st_mode) and not cleanup_utils._is_link_like(st):
+            # A directory created or moved in arrives as one event; index what it already holds.
+            if self._allows_directory(root, path):
+                files = {}
+                try:
+                    self._walk(root, path, files)
+                except OSError as e:
+                    print(f"Could not watch {path}: {e}")
+                    self.ready.clear()
+                    return
+                with self._lock:
+                    self._files[root].update(files)
+                    self._version += 1
+            return
+        with self._lock:
+            index = self._files[root]
+            if st is not None:
+                index[path] = st
+            elif index.pop(path, None) is None:
+                # Unknown path gone: a directory was deleted or moved away with its contents.
+                prefix = path + os.sep
+                for known in [p for p in index if p.startswith(prefix)]:
+                    del index[known]
+            self._version += 1
+
+    def candidates(self):
+        """Returns [(path, size)] of the indexed files the policy allows deleting now."""
+        now = time.time()
+        result = []
+        with self._lock:
+            snapshot = {root: list(files.items()) for root, files in self._files.items()}
+        for root, files in snapshot.items():
+            budget = self.policy.budget_for(root) if self.policy is not None else None
+            for path, st in files:
+                size = st.st_size if stat.S_ISREG(st.st_mode) else 0
+                if self.policy is not None:
+                    if not self.policy.allows_file(os.path.basename(path), path[len(root) + 1:], st, now):
+                        continue
+                    if not budget.take(size):
+                        continue
+                result.append((path, size))
+        return result
+
+    def reclaimable(self):
+        """Returns {"items", "bytes", "complete"} like cleanup_utils.scan_roots, without a walk."""
+        cached = self._cached
+        if cached is not None and cached[0] == self._version and time.monotonic() - cached[1] < RECLAIMABLE_CACHE_SECONDS:
+            return cached[2]
+        version = self._version
+        candidates = self.candidates()
+        result = {"items": len(candidates), "bytes": sum(size for _, size in candidates), "complete": True}
+        self._cached = (version, time.monotonic(), result)
+        return result
+
+    def latest(self):
+        """Returns the totals last computed by reclaimable(), or None before the first; never applies the policy."""
+        cached = self._cached
+        return cached[2] if cached is not None else None